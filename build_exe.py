@@ -38,6 +38,13 @@ packages = [
 # 添加需要的模块
 includes = [
     "clipboard_db",
+    "clipboard_writer",
+    "clipboard_sweeper",
+    "clipboard_maintenance",
+    "clipboard_transfer",
+    "clipboard_backend",
+    "clipboard_ingest",
+    "clipboard_hashing",
     "clipboard_gui",
     "clipboard_manager_main",
     "clipboard_content_detector"
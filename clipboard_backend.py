@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板访问后端
+读取剪贴板的格式、文本、文件列表、图片和序列号都通过后端进行：
+Windows 上使用 win32clipboard，其他平台（或测试、基准测试）使用确定性的内存剪贴板，
+不依赖 Windows 也能运行完整的剪贴板记录流程
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+try:
+    import win32clipboard
+    WIN32_CLIPBOARD_AVAILABLE = True
+except ImportError:
+    WIN32_CLIPBOARD_AVAILABLE = False
+
+# 标准剪贴板格式ID（与 Windows 的 CF_* 常量相同，内存剪贴板也使用这些ID）
+CF_TEXT = 1
+CF_BITMAP = 2
+CF_METAFILEPICT = 3
+CF_SYLK = 4
+CF_DIF = 5
+CF_TIFF = 6
+CF_OEMTEXT = 7
+CF_DIB = 8
+CF_PALETTE = 9
+CF_PENDATA = 10
+CF_RIFF = 11
+CF_WAVE = 12
+CF_UNICODETEXT = 13
+CF_ENHMETAFILE = 14
+CF_HDROP = 15
+CF_LOCALE = 16
+CF_DIBV5 = 17
+CF_OWNERDISPLAY = 0x0080
+CF_DSPTEXT = 0x0081
+CF_DSPBITMAP = 0x0082
+CF_DSPMETAFILEPICT = 0x0083
+CF_DSPENHMETAFILE = 0x008E
+
+FORMAT_NAMES = {
+    CF_TEXT: "CF_TEXT",
+    CF_BITMAP: "CF_BITMAP",
+    CF_METAFILEPICT: "CF_METAFILEPICT",
+    CF_SYLK: "CF_SYLK",
+    CF_DIF: "CF_DIF",
+    CF_TIFF: "CF_TIFF",
+    CF_OEMTEXT: "CF_OEMTEXT",
+    CF_DIB: "CF_DIB",
+    CF_PALETTE: "CF_PALETTE",
+    CF_PENDATA: "CF_PENDATA",
+    CF_RIFF: "CF_RIFF",
+    CF_WAVE: "CF_WAVE",
+    CF_UNICODETEXT: "CF_UNICODETEXT",
+    CF_ENHMETAFILE: "CF_ENHMETAFILE",
+    CF_HDROP: "CF_HDROP",
+    CF_LOCALE: "CF_LOCALE",
+    CF_DIBV5: "CF_DIBV5",
+    CF_OWNERDISPLAY: "CF_OWNERDISPLAY",
+    CF_DSPTEXT: "CF_DSPTEXT",
+    CF_DSPBITMAP: "CF_DSPBITMAP",
+    CF_DSPMETAFILEPICT: "CF_DSPMETAFILEPICT",
+    CF_DSPENHMETAFILE: "CF_DSPENHMETAFILE",
+}
+
+
+class ClipboardBackend(ABC):
+    """
+    剪贴板后端接口
+    读取数据前先 open()（或使用 opened() 上下文），读取后尽快 close()；
+    get_text()/get_files()/get_image() 在没有对应格式时返回None。
+    子类必须实现 open/close/formats/has_format/get_data，否则不能实例化
+    """
+
+    @abstractmethod
+    def open(self):
+        """打开剪贴板，被其他程序占用时返回False"""
+
+    @abstractmethod
+    def close(self):
+        """关闭剪贴板"""
+
+    @contextmanager
+    def opened(self):
+        """打开剪贴板的上下文，得到是否打开成功，退出时关闭"""
+        if not self.open():
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.close()
+
+    @abstractmethod
+    def formats(self):
+        """剪贴板中所有可用的格式ID（需要先打开剪贴板）"""
+
+    @abstractmethod
+    def has_format(self, format_id):
+        """剪贴板中是否有指定格式"""
+
+    @abstractmethod
+    def get_data(self, format_id):
+        """读取指定格式的原始数据"""
+
+    def get_text(self):
+        """Unicode文本"""
+        return self.get_data(CF_UNICODETEXT) if self.has_format(CF_UNICODETEXT) else None
+
+    def get_files(self):
+        """复制的文件路径元组"""
+        return tuple(self.get_data(CF_HDROP)) if self.has_format(CF_HDROP) else None
+
+    def get_image(self):
+        """位图（DIB格式的字节串）"""
+        return self.get_data(CF_DIB) if self.has_format(CF_DIB) else None
+
+    def sequence_number(self):
+        """
+        剪贴板内容的序列号，内容每变化一次增加，不需要打开剪贴板
+        序列号相同说明内容没有变化；返回0表示不支持
+        """
+        return 0
+
+    def format_name(self, format_id):
+        """格式ID对应的名称"""
+        return FORMAT_NAMES.get(format_id, f"Unknown({format_id})")
+
+
+class Win32ClipboardBackend(ClipboardBackend):
+    """通过 win32clipboard 访问 Windows 剪贴板"""
+
+    def __init__(self):
+        if not WIN32_CLIPBOARD_AVAILABLE:
+            raise RuntimeError("win32clipboard 不可用，请安装 pywin32")
+
+    def open(self):
+        try:
+            win32clipboard.OpenClipboard()
+            return True
+        except Exception as e:
+            # 剪贴板被其他程序占用时会打开失败，属于正常情况
+            if "OpenClipboard" not in str(e):
+                print(f"访问剪贴板时出错: {e}")
+            return False
+
+    def close(self):
+        try:
+            win32clipboard.CloseClipboard()
+        except:
+            pass
+
+    def formats(self):
+        formats = []
+        format_id = 0
+        while True:
+            format_id = win32clipboard.EnumClipboardFormats(format_id)
+            if not format_id:
+                break
+            formats.append(format_id)
+        return formats
+
+    def has_format(self, format_id):
+        return bool(win32clipboard.IsClipboardFormatAvailable(format_id))
+
+    def get_data(self, format_id):
+        return win32clipboard.GetClipboardData(format_id)
+
+    def sequence_number(self):
+        return win32clipboard.GetClipboardSequenceNumber()
+
+    def format_name(self, format_id):
+        if format_id in FORMAT_NAMES:
+            return FORMAT_NAMES[format_id]
+        try:
+            # 注册的自定义格式（如 "HTML Format"、"PNG"）
+            name = win32clipboard.GetClipboardFormatName(format_id)
+            return name if name else f"Unknown({format_id})"
+        except:
+            return f"Unknown({format_id})"
+
+
+class MemoryClipboardBackend(ClipboardBackend):
+    """
+    内存中的剪贴板，用于测试和基准测试
+    set_text()/set_files()/set_image()/set_data() 替换全部内容并使序列号加1；
+    locked=True 时模拟剪贴板被其他程序占用，open() 返回False
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._sequence = 0
+        self._is_open = False
+        self.locked = False
+        # 打开的次数和读取数据的次数，用于检查读取方式
+        self.open_count = 0
+        self.read_count = 0
+
+    def set_data(self, data):
+        """用 {格式ID: 数据} 替换剪贴板内容"""
+        with self._lock:
+            self._data = dict(data)
+            self._sequence += 1
+
+    def set_text(self, text):
+        self.set_data({CF_UNICODETEXT: text})
+
+    def set_files(self, files, text=None):
+        """复制文件；text 不为None时同时放入文本（如资源管理器复制文件时的路径文本）"""
+        data = {CF_HDROP: tuple(files)}
+        if text is not None:
+            data[CF_UNICODETEXT] = text
+        self.set_data(data)
+
+    def set_image(self, dib):
+        self.set_data({CF_DIB: bytes(dib)})
+
+    def clear(self):
+        self.set_data({})
+
+    @property
+    def is_open(self):
+        return self._is_open
+
+    def open(self):
+        with self._lock:
+            if self.locked or self._is_open:
+                return False
+            self._is_open = True
+            self.open_count += 1
+            return True
+
+    def close(self):
+        with self._lock:
+            self._is_open = False
+
+    def _check_open(self):
+        if not self._is_open:
+            raise RuntimeError("剪贴板未打开")
+
+    def formats(self):
+        self._check_open()
+        return sorted(self._data)
+
+    def has_format(self, format_id):
+        self._check_open()
+        return format_id in self._data
+
+    def get_data(self, format_id):
+        self._check_open()
+        if format_id not in self._data:
+            raise KeyError(f"剪贴板中没有格式 {self.format_name(format_id)}")
+        self.read_count += 1
+        return self._data[format_id]
+
+    def sequence_number(self):
+        return self._sequence
+
+
+_default_backend = None
+
+
+def get_default_backend():
+    """
+    程序共用的剪贴板后端：Windows（安装了pywin32）上使用系统剪贴板，否则使用内存剪贴板
+    """
+    global _default_backend
+    if _default_backend is None:
+        if WIN32_CLIPBOARD_AVAILABLE:
+            _default_backend = Win32ClipboardBackend()
+        else:
+            print("提示: win32clipboard 不可用，使用内存剪贴板（不会记录系统剪贴板）")
+            _default_backend = MemoryClipboardBackend()
+    return _default_backend
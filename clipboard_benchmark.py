@@ -0,0 +1,1282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板管理器性能基准测试
+用法：
+    python clipboard_benchmark.py connections [-n 次数]
+    python clipboard_benchmark.py search [--rows 行数] [--verify]
+    python clipboard_benchmark.py search-check
+    python clipboard_benchmark.py paging [--rows 行数]
+    python clipboard_benchmark.py upsert [-n 次数] [--distinct 不同内容数]
+    python clipboard_benchmark.py batch [--files 每次复制的文件数]
+    python clipboard_benchmark.py writer [-n 次数] [--interval 提交间隔毫秒]
+    python clipboard_benchmark.py listing [--rows 行数] [--chars 每条字符数]
+    python clipboard_benchmark.py compression [--clips 条数] [--threshold 压缩阈值字节数]
+    python clipboard_benchmark.py sweeper [--rows 文本记录数] [--files 文件记录数]
+    python clipboard_benchmark.py quota [--rows 文件记录数] [--evict 淘汰记录数]
+    python clipboard_benchmark.py startup [--rows 记录数] [-n 次数]
+    python clipboard_benchmark.py maintenance [--rows 记录数] [--budget 每轮预算毫秒]
+    python clipboard_benchmark.py profiles [--rows 记录数] [--seconds 每种配置的秒数] [--readers 读线程数]
+    python clipboard_benchmark.py changes [--rows 记录数] [--loaded 已加载行数] [-n 次数]
+    python clipboard_benchmark.py transfer [--rows 记录数] [--files 文件数]
+    python clipboard_benchmark.py capture [-n 复制次数] [--files 每次复制的文件数]
+    python clipboard_benchmark.py ingest [--mb 大文件MB数] [-n 之后复制文本的次数] [--workers 处理线程数]
+    python clipboard_benchmark.py copy [--sizes 文件MB数,...]
+    python clipboard_benchmark.py hashing [--sizes 4K,1M,...] [--cold]
+所有测试都在临时目录中的独立数据库上运行，不会影响真实的历史记录
+"""
+
+import argparse
+import contextlib
+import io
+import hashlib
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from clipboard_db import ClipboardDatabase, STORAGE_PROFILES, contains_cjk, format_ts_sql, register_sql_functions
+from clipboard_writer import WriteBehindQueue, DURABILITY_EVENT, DURABILITY_INTERVAL
+from clipboard_sweeper import RetentionSweeper
+from clipboard_maintenance import DatabaseMaintainer
+from clipboard_transfer import export_history, import_history, format_throughput
+from clipboard_backend import MemoryClipboardBackend
+from clipboard_manager_main import ClipboardManager, copy_file_with_md5
+from clipboard_ingest import ORDERING_STRICT, ORDERING_NONE
+from clipboard_hashing import (hash_file, FILE_DIGEST_AVAILABLE, STRATEGY_AUTO, STRATEGY_READ, STRATEGY_READINTO,
+                               STRATEGY_MMAP, STRATEGY_FILE_DIGEST)
+
+
+def measure(func, iterations):
+    """执行func若干次，返回每次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def print_result(name, before_us, after_us):
+    """打印优化前后的对比结果"""
+    speedup = before_us / after_us if after_us else float('inf')
+    print(f"{name:<24} 优化前 {before_us:>10.1f} µs   优化后 {after_us:>10.1f} µs   提升 {speedup:>6.1f}x")
+
+
+def bench_connections(args):
+    """对比每次调用重新建立连接与使用连接管理器的单次调用延迟"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        for i in range(1000):
+            db.save_text_record(f"基准测试文本 {i}")
+
+        # 优化前：与旧实现一致，每次调用都重新连接并在结束时关闭
+        def fresh_settings(_):
+            conn = sqlite3.connect(db.db_path)
+            conn.execute('SELECT max_copy_size, max_copy_count, unlimited_mode, retention_days, auto_start, float_icon, opacity, clipboard_type FROM settings WHERE id = 1').fetchone()
+            conn.close()
+
+        def fresh_statistics(_):
+            conn = sqlite3.connect(db.db_path)
+            conn.execute('SELECT COUNT(*) FROM text_records').fetchone()
+            conn.execute('SELECT COUNT(*), SUM(file_size) FROM file_records').fetchone()
+            conn.close()
+
+        def fresh_save(i):
+            conn = sqlite3.connect(db.db_path)
+            # 索引触发器依赖的SQL函数，每个连接都需要注册
+            register_sql_functions(conn)
+            try:
+                cursor = conn.execute('''
+                    INSERT INTO text_records (preview, timestamp, char_count, byte_count, md5_hash, number)
+                    VALUES (?, datetime('now'), ?, ?, ?, 1)
+                ''', (f"旧实现 {i}", 6, 12, f"old-{i}"))
+                conn.execute("INSERT INTO text_contents (id, content) VALUES (?, ?)", (cursor.lastrowid, f"旧实现 {i}"))
+                conn.commit()
+            finally:
+                conn.close()
+
+        n = args.iterations
+        print(f"每项执行 {n} 次")
+        print_result("get_settings", measure(fresh_settings, n), measure(lambda _: db.get_settings(), n))
+        print_result("get_statistics", measure(fresh_statistics, n), measure(lambda _: db.get_statistics(), n))
+        print_result("save_text_record", measure(fresh_save, n), measure(lambda i: db.save_text_record(f"新实现 {i}"), n))
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# 基准测试使用的常用汉字
+COMMON_HANZI = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+    "十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相"
+    "全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果"
+)
+
+
+def fill_text_records(db, rows, seed=2024):
+    """批量生成类似中文剪贴板内容的文本记录"""
+    rng = random.Random(seed)
+    start_ts = int(time.time()) - rows * 60
+    with db.connections.writer() as conn:
+        cursor = conn.cursor()
+        for i in range(rows):
+            content = "".join(rng.choice(COMMON_HANZI) for _ in range(rng.randint(8, 60)))
+            # 模拟每分钟一条的历史记录
+            ts = start_ts + i * 60
+            db._upsert_text_record(cursor, content, hashlib.md5(f"{i}:{content}".encode('utf-8')).hexdigest(),
+                                   ts, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)))
+
+
+# 搜索一致性检查使用的固定语料：中日韩文本、标点、大小写、长度不足三个字的子串等
+SEARCH_CHECK_TEXTS = (
+    "你好，世界！今天天气很好",
+    "你好世界",
+    "《红楼梦》第一回：甄士隐梦幻识通灵",
+    "会议纪要（2024-03-15）：讨论C++编程规范",
+    "他说\"你好\"然后离开了",
+    "50%折扣，仅限今日",
+    "50元折扣券已过期",
+    "变量名 user_name 和 username 不同",
+    "user-name 和 userXname",
+    "哈哈哈哈哈",
+    "日本語のテキスト、カタカナとひらがな",
+    "한국어 텍스트 검색 테스트",
+    "Mixed 中文 and English 文本 ABC",
+    "mixed 中文 AND english 文本 abc",
+    "罕见字 𠀀𠀁 测试",
+    "😀 表情符号 笑😀",
+    "路径 C:\\Users\\张三\\文档\\报告.docx",
+    "单",
+    "a",
+    "",
+)
+
+SEARCH_CHECK_FILES = (
+    ("C:\\Users\\张三\\文档\\季度报告.docx", "季度报告.docx"),
+    ("D:\\照片\\2024年\\春节_全家福.jpg", "春节_全家福.jpg"),
+    ("E:\\backup\\Report-Final(1).PDF", "Report-Final(1).PDF"),
+    ("C:\\tmp\\《合同》草稿 v2.txt", "《合同》草稿 v2.txt"),
+)
+
+SEARCH_CHECK_KEYWORDS = (
+    # 单字和双字
+    "你", "好", "世界", "好世", "哈", "哈哈", "报", "告", "单", "语", "テ", "カタ", "한", "검색", "𠀀", "𠀀𠀁",
+    # 三个字及以上
+    "你好世", "哈哈哈", "哈哈哈哈哈哈", "红楼梦", "季度报告", "全家福", "日本語の", "텍스트 검",
+    # 包含标点、空格、引号和LIKE通配符
+    "你好，", "，世界", "《红楼梦》", "好\"然", "\"你好\"", "C++编", "50%折扣", "%折", "春节_全", "_全家",
+    "（2024", "中文 and", "张三\\文档", "笑😀", "😀 表",
+    # 大小写
+    "ABC", "abc", "Mixed 中文", "english 文本",
+    # 不包含中日韩字符
+    "user_name", "C++", "Report", "report-final", "docx", "50%", "a",
+    # 没有结果
+    "不存在", "界今", "你好世界今",
+)
+
+
+def check_search_consistency(db):
+    """
+    在固定语料上比较各搜索方式与LIKE的结果集（不分页），返回不一致的描述列表：
+    LIKE 必须与直接的子串匹配一致；substring 必须与LIKE完全一致；auto 对包含中日韩字符的关键词也必须一致；
+    fts 按词前缀匹配，对纯字母数字的关键词只要求结果都被LIKE命中
+    """
+    texts = db.get_text_contents(row[0] for row in db.get_text_records())
+    files = {row[0]: (row[1], row[3]) for row in db.get_file_records()}
+
+    def fold(text):
+        # LIKE 只忽略ASCII字母的大小写
+        return "".join(char.lower() if char.isascii() else char for char in text)
+
+    problems = []
+    for keyword in SEARCH_CHECK_KEYWORDS:
+        # 直接在Python中做子串匹配，确认LIKE本身的结果正确（如 % 和 _ 不作为通配符）
+        reference = {('text', record_id) for record_id, content in texts.items() if fold(keyword) in fold(content)}
+        reference |= {('file', record_id) for record_id, names in files.items()
+                      if any(fold(keyword) in fold(name) for name in names)}
+        for record_type in ("text", "file", "all"):
+            expected = {row[:2] for row in db.search_records(keyword, record_type, mode="like")}
+            if expected != {key for key in reference if record_type in ("all", key[0])}:
+                problems.append(f"{keyword!r} ({record_type}, like): 与直接子串匹配的结果不同")
+            modes = ["substring"]
+            if contains_cjk(keyword):
+                modes.append("auto")
+            for mode in modes:
+                actual = {row[:2] for row in db.search_records(keyword, record_type, mode=mode)}
+                if actual != expected:
+                    problems.append(f"{keyword!r} ({record_type}, {mode}): LIKE {len(expected)} 条, "
+                                    f"{mode} {len(actual)} 条, 缺少 {sorted(expected - actual)}, 多出 {sorted(actual - expected)}")
+            if keyword.isascii() and keyword.isalnum():
+                extra = {row[:2] for row in db.search_records(keyword, record_type, mode="fts")} - expected
+                if extra:
+                    problems.append(f"{keyword!r} ({record_type}, fts): LIKE 未命中 {sorted(extra)}")
+    return problems
+
+
+def bench_search_check(args):
+    """在固定语料上检查子串索引、单字/双字索引和全文索引的结果与LIKE一致，不一致时以状态1退出"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        for content in SEARCH_CHECK_TEXTS:
+            db.save_text_record(content)
+        for i, (original_path, filename) in enumerate(SEARCH_CHECK_FILES):
+            db.save_file_record(original_path, os.path.join(work_dir, filename), filename, 1024 * (i + 1), "documents",
+                                hashlib.md5(original_path.encode('utf-8')).hexdigest())
+        print(f"SQLite {sqlite3.sqlite_version}，三元组索引{'可用' if db.trigram_available else '不可用'}，"
+              f"{len(SEARCH_CHECK_TEXTS)} 条文本、{len(SEARCH_CHECK_FILES)} 条文件记录，{len(SEARCH_CHECK_KEYWORDS)} 个关键词")
+
+        problems = check_search_consistency(db)
+        # 删除和修改后索引由触发器维护，结果仍须一致
+        db.delete_text_record(db.search_records("哈哈", "text", mode="like")[0][1])
+        db.save_text_record("你好，世界！今天天气很好")
+        problems.extend(check_search_consistency(db))
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for problem in problems:
+        print(f"  结果不一致: {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("全部搜索方式的结果与LIKE一致")
+
+
+def bench_search(args):
+    """对比LIKE查询与子串索引在不同长度中文关键词下的搜索延迟"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        start = time.perf_counter()
+        fill_text_records(db, args.rows)
+        print(f"生成 {args.rows} 条记录（含索引维护）耗时 {time.perf_counter() - start:.1f} s")
+
+        rng = random.Random(7)
+        print(f"每种长度 {args.queries} 个随机关键词，每页 {args.limit} 条")
+        for length in (1, 2, 3, 5):
+            keywords = ["".join(rng.choice(COMMON_HANZI) for _ in range(length)) for _ in range(args.queries)]
+            before = measure(lambda i: db.search_records(keywords[i], "text", limit=args.limit, mode="like"), len(keywords))
+            after = measure(lambda i: db.search_records(keywords[i], "text", limit=args.limit, mode="substring"), len(keywords))
+            print_result(f"{length} 字关键词", before, after)
+
+            if args.verify:
+                # 不分页时子串索引的结果集必须与LIKE完全一致
+                for keyword in keywords:
+                    expected = {row[1] for row in db.search_records(keyword, "text", mode="like")}
+                    actual = {row[1] for row in db.search_records(keyword, "text", mode="substring")}
+                    if expected != actual:
+                        print(f"  结果不一致: {keyword!r} LIKE {len(expected)} 条, 子串索引 {len(actual)} 条")
+                        break
+                else:
+                    print("  结果集与LIKE一致")
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_paging(args):
+    """对比 LIMIT/OFFSET 与游标分页在不同页深度下的单页读取延迟"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        fill_text_records(db, args.rows)
+        print(f"共 {args.rows} 条记录，每页 {args.limit} 条")
+
+        for sort_by in ("timestamp", "content", "char_count"):
+            records = db.get_text_records(sort_by=sort_by)
+            for depth in (0.0, 0.5, 0.99):
+                offset = int(len(records) * depth)
+                page_cursor = db.get_page_cursor(records[offset - 1], "text", sort_by) if offset else None
+                before = measure(lambda _: db.get_text_records(limit=args.limit, offset=offset, sort_by=sort_by), args.iterations)
+                after = measure(lambda _: db.get_text_records(limit=args.limit, sort_by=sort_by, after=page_cursor), args.iterations)
+                assert db.get_text_records(limit=args.limit, offset=offset, sort_by=sort_by) == \
+                    db.get_text_records(limit=args.limit, sort_by=sort_by, after=page_cursor)
+                print_result(f"{sort_by} 第{offset}条起", before, after)
+
+        # 合并列表：旧界面读取全部文本和文件记录后在Python中合并排序，时间线一次索引查询取一页
+        def merge_all(_):
+            records = [(r[2], 'text', r[0]) for r in db.get_text_records()]
+            records.extend((r[7], 'file', r[0]) for r in db.get_file_records())
+            records.sort(reverse=True)
+            return records[:args.limit]
+
+        iterations = max(args.iterations // 10, 1)
+        print_result("合并列表首页", measure(merge_all, iterations),
+                     measure(lambda _: db.get_timeline(limit=args.limit), iterations))
+
+        # 过期清理的范围条件：旧实现比较没有索引的时间字符串，现在按ts索引定位
+        with db.connections.reader() as conn:
+            cutoff_ts = conn.execute("SELECT ts FROM text_records ORDER BY ts LIMIT 1 OFFSET ?", (args.rows // 100,)).fetchone()[0]
+            cutoff_str = conn.execute(f"SELECT {format_ts_sql()} FROM (SELECT ? AS ts)", (cutoff_ts,)).fetchone()[0]
+            print_result("过期范围查询",
+                         measure(lambda _: conn.execute("SELECT id FROM text_records WHERE timestamp < ?", (cutoff_str,)).fetchall(), args.iterations),
+                         measure(lambda _: conn.execute("SELECT id FROM text_records WHERE ts < ?", (cutoff_ts,)).fetchall(), args.iterations))
+
+            # 统计信息：旧实现每次刷新都扫描记录表，现在读取触发器维护的计数
+            def count_all(_):
+                conn.execute('SELECT COUNT(*) FROM text_records').fetchone()
+                conn.execute('SELECT COUNT(*), SUM(file_size) FROM file_records').fetchone()
+
+            print_result("统计信息", measure(count_all, args.iterations),
+                         measure(lambda _: db.get_statistics(), args.iterations))
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_upsert(args):
+    """模拟以重复复制为主的操作序列，对比旧的插入/捕获冲突/更新/查询流程与单语句UPSERT"""
+    rng = random.Random(11)
+    # 大部分复制是最近内容的重复：从少量常用内容中按幂律分布抽取
+    trace = [f"常用片段 {int(rng.paretovariate(1.2)) % args.distinct}" for _ in range(args.iterations)]
+    repeats = args.iterations - len(set(trace))
+    print(f"共 {args.iterations} 次复制，其中重复 {repeats} 次（{repeats / args.iterations:.0%}）")
+
+    results = {}
+    for upsert in (False, True):
+        work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+        try:
+            db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+            if not upsert:
+                db.upsert_available = False
+            elif not db.upsert_available:
+                print("当前SQLite不支持UPSERT ... RETURNING，跳过")
+                return
+            # 每次调用单独提交（包含提交的开销）
+            per_call = measure(lambda i: db.save_text_record(trace[i]), len(trace))
+            # 在同一个事务中执行，只比较语句本身的开销
+            with db.connections.writer():
+                in_transaction = measure(lambda i: db.save_text_record(trace[i]), len(trace))
+            results[upsert] = (per_call, in_transaction)
+            db.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print_result("save_text_record", results[False][0], results[True][0])
+    print_result("同一事务内", results[False][1], results[True][1])
+
+
+def bench_batch(args):
+    """对比一次复制多个文件时逐个保存与整组在一个事务中保存的耗时和提交次数"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        # 统计写连接上执行的提交次数
+        commits = []
+        with db.connections.writer() as conn:
+            conn.set_trace_callback(lambda sql: commits.append(sql) if sql.startswith("COMMIT") else None)
+
+        def make_group(i):
+            return [(f"C:/复制{i}/文件{j}.txt", f"/saved/{i}/{j}.txt", f"文件{j}.txt", 1024 * j, "documents",
+                     hashlib.md5(f"{i}:{j}".encode('utf-8')).hexdigest()) for j in range(args.files)]
+
+        rounds = args.iterations
+        before = measure(lambda i: [db.save_file_record(*file_info) for file_info in make_group(i)], rounds)
+        before_commits = len(commits) / rounds
+        commits.clear()
+        after = measure(lambda i: db.save_file_records_many(make_group(rounds + i)), rounds)
+        after_commits = len(commits) / rounds
+
+        print(f"每次复制 {args.files} 个文件，共 {rounds} 次")
+        print_result("保存一次复制", before, after)
+        print(f"每次复制的提交次数: 优化前 {before_commits:.0f}   优化后 {after_commits:.0f}")
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_writer(args):
+    """对比剪贴板事件回调中同步保存与放入后台写入队列的延迟，以及全部写完所需的时间"""
+    trace = [f"剪贴板文本 {i} " + "内容" * 20 for i in range(args.iterations)]
+    configs = [("同步保存", None), ("写入队列(event)", DURABILITY_EVENT), ("写入队列(interval)", DURABILITY_INTERVAL)]
+    results = {}
+    for name, durability in configs:
+        work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+        try:
+            db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+            commits = []
+            with db.connections.writer() as conn:
+                conn.set_trace_callback(lambda sql: commits.append(sql) if sql.startswith("COMMIT") else None)
+
+            start = time.perf_counter()
+            if durability is None:
+                callback = measure(lambda i: db.save_text_record(trace[i]), len(trace))
+            else:
+                queue = WriteBehindQueue(db, durability=durability, interval_ms=args.interval)
+                callback = measure(lambda i: queue.submit_text(trace[i]), len(trace))
+                queue.flush()
+                queue.close()
+            total = (time.perf_counter() - start) * 1000
+            results[name] = callback
+            print(f"{name:<20} 回调延迟 {callback:10.1f} µs   全部写完 {total:8.1f} ms   提交次数 {len(commits)}")
+            db.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print_result("回调延迟(event)", results["同步保存"], results["写入队列(event)"])
+
+
+def bench_listing(args):
+    """对比列表读取完整内容与只读取预览的耗时和内存峰值"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        rng = random.Random(11)
+        with db.connections.writer():
+            for i in range(args.rows):
+                db.save_text_record(f"{i} " + "".join(rng.choice(COMMON_HANZI) for _ in range(args.chars)))
+        print(f"共 {args.rows} 条记录，每条约 {args.chars} 个字符")
+
+        def read_bodies():
+            # 旧实现：列表读取每条记录的完整内容
+            with db.connections.reader() as conn:
+                return conn.execute(f'''
+                    SELECT t.id, c.content, {format_ts_sql('t.ts')}, t.char_count, t.md5_hash, t.number
+                    FROM text_records t JOIN text_contents_plain c ON c.id = t.id ORDER BY t.ts DESC
+                ''').fetchall()
+
+        results = {}
+        for name, func in (("完整内容", read_bodies), ("只读预览", db.get_text_records)):
+            results[name] = measure(lambda _: func(), 5)
+            # 内存峰值单独测量，tracemalloc会拖慢计时
+            tracemalloc.start()
+            rows = func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:<12} {len(rows)} 条   内存峰值 {peak / (1024 * 1024):8.1f} MB")
+            del rows
+        print_result("读取全部记录", results["完整内容"], results["只读预览"])
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def make_clip_corpus(count, seed=13):
+    """生成接近真实使用情况的剪贴板文本：大部分是短文本，少量日志、JSON、源代码和长段中文"""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(COMMON_HANZI) for _ in range(rng.randint(1, 4))) for _ in range(400)]
+    levels = ["INFO", "INFO", "INFO", "DEBUG", "WARN", "ERROR"]
+
+    def chat():
+        return "".join(rng.choice(words) for _ in range(rng.randint(2, 30)))
+
+    def url():
+        return f"https://example.com/{rng.choice(['docs', 'issues', 'wiki'])}/{rng.randint(1, 99999)}?ref=clip"
+
+    def log():
+        lines = []
+        for i in range(rng.randint(50, 400)):
+            lines.append(f"2024-05-{rng.randint(1, 28):02d} 10:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d},{rng.randint(0, 999):03d} "
+                         f"{rng.choice(levels)} [worker-{rng.randint(1, 8)}] request id={rng.randint(10000, 99999)} "
+                         f"path=/api/v1/items/{rng.randint(1, 5000)} status={rng.choice([200, 200, 200, 404, 500])} "
+                         f"elapsed={rng.random() * 100:.2f}ms")
+        return "\n".join(lines)
+
+    def json_text():
+        items = [{"id": rng.randint(1, 10 ** 6), "name": rng.choice(words), "price": round(rng.random() * 1000, 2),
+                  "tags": rng.sample(words, 3), "active": rng.random() < 0.5} for _ in range(rng.randint(20, 200))]
+        return json.dumps({"items": items, "total": len(items)}, ensure_ascii=False, indent=2)
+
+    def code():
+        with open(os.path.abspath(__file__), encoding='utf-8') as f:
+            source = f.read()
+        start = rng.randint(0, len(source) - 2000)
+        return source[start:start + rng.randint(2000, 12000)]
+
+    def prose():
+        return "\n\n".join("，".join(chat() for _ in range(rng.randint(3, 8))) + "。" for _ in range(rng.randint(10, 80)))
+
+    kinds = [(chat, 60), (url, 15), (log, 8), (json_text, 7), (code, 5), (prose, 5)]
+    generators = [func for func, weight in kinds for _ in range(weight)]
+    return [f"{i} {rng.choice(generators)()}" for i in range(count)]
+
+
+def bench_compression(args):
+    """对比不压缩、zlib和lzma压缩的存储空间，以及读取完整内容和搜索的延迟"""
+    corpus = make_clip_corpus(args.clips)
+    raw_total = sum(len(clip.encode('utf-8')) for clip in corpus)
+    large = sum(1 for clip in corpus if len(clip.encode('utf-8')) >= args.threshold)
+    print(f"共 {len(corpus)} 条文本，原始大小 {raw_total / 1024:.1f} KB，其中 {large} 条达到压缩阈值 {args.threshold} 字节")
+
+    rng = random.Random(5)
+    keywords = ["status=500", "worker-3", "price", "def ", COMMON_HANZI[:2]]
+    results = {}
+    for codec in (None, "zlib", "lzma"):
+        work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+        try:
+            db = ClipboardDatabase(os.path.join(work_dir, "bench.db"), compression=codec,
+                                   compress_threshold=args.threshold)
+            start = time.perf_counter()
+            with db.connections.writer():
+                for clip in corpus:
+                    db.save_text_record(clip)
+            write_ms = (time.perf_counter() - start) * 1000
+            with db.connections.writer() as conn:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            stored = sum(item[2] for item in db.get_text_storage_statistics().values())
+            file_size = os.path.getsize(db.db_path)
+
+            records = db.get_text_records()
+            ids = [row[0] for row in records]
+            large_ids = [row[0] for row in records if row[6] >= args.threshold] or ids
+            read_all = measure(lambda i: db.get_text_content(ids[i % len(ids)]), args.reads)
+            read_large = measure(lambda i: db.get_text_content(rng.choice(large_ids)), args.reads)
+            search = measure(lambda i: db.search_records(keywords[i % len(keywords)], limit=30), 50)
+            results[codec] = (stored, read_large)
+            print(f"{codec or '不压缩':<6} 内容 {stored / 1024:9.1f} KB   数据库文件 {file_size / 1024:9.1f} KB   "
+                  f"写入 {write_ms:8.1f} ms   读取 {read_all:7.1f} µs   读取大文本 {read_large:7.1f} µs   搜索 {search:8.1f} µs")
+            db.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    # 压缩用读取时的解码时间换存储空间，这里报告两者的对比
+    for codec in ("zlib", "lzma"):
+        saved = 1 - results[codec][0] / results[None][0]
+        overhead = results[codec][1] - results[None][1]
+        print(f"{codec:<6} 文本内容节省 {saved:6.1%}   每次读取大文本增加 {overhead:7.1f} µs")
+
+
+def bench_sweeper(args):
+    """对比一个事务删除全部过期记录与后台分批清理时，并发保存剪贴板记录的最长等待时间"""
+    def delete_in_one_transaction(db):
+        # 旧实现：一个事务删除全部过期记录，之后在当前线程中逐个删除文件
+        expired_ts = db.get_expired_ts()
+        with db.connections.writer() as conn:
+            conn.execute('DELETE FROM text_records WHERE ts < ?', (expired_ts,))
+            paths = conn.execute('SELECT saved_path FROM file_records WHERE ts < ?', (expired_ts,)).fetchall()
+            conn.execute('DELETE FROM file_records WHERE ts < ?', (expired_ts,))
+        for path, in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete_with_sweeper(db):
+        # 在当前线程中执行一次完整清理以便计时
+        sweeper = RetentionSweeper(db, background=False)
+        sweeper.sweep()
+        sweeper.close()
+
+    results = {}
+    for name, delete in (("一个事务", delete_in_one_transaction), ("分批清理", delete_with_sweeper)):
+        work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+        try:
+            db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+            # 保留1天，除最近一天（1440分钟）外的记录都已过期
+            db.update_settings(retention_days=1)
+            fill_text_records(db, args.rows + 1440)
+            files_dir = os.path.join(work_dir, "files")
+            os.makedirs(files_dir)
+            old_ts = int(time.time()) - 7 * 86400
+            with db.connections.writer() as conn:
+                cursor = conn.cursor()
+                for i in range(args.files):
+                    path = os.path.join(files_dir, f"{i}.txt")
+                    with open(path, "w") as f:
+                        f.write("文件内容")
+                    db._upsert_file_record(cursor, path, path, f"{i}.txt", 12, "documents",
+                                           hashlib.md5(str(i).encode()).hexdigest(), old_ts + i, "")
+
+            # 模拟清理期间持续到达的剪贴板记录，记录每次保存的耗时
+            latencies = []
+            stop = threading.Event()
+
+            def capture():
+                i = 0
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    db.save_text_record(f"清理期间复制的文本 {i}")
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    i += 1
+                    time.sleep(0.002)
+
+            thread = threading.Thread(target=capture)
+            thread.start()
+            time.sleep(0.05)
+            start = time.perf_counter()
+            delete(db)
+            total = (time.perf_counter() - start) * 1000
+            stop.set()
+            thread.join()
+
+            remaining = db.get_statistics()
+            left_files = len(os.listdir(files_dir))
+            latencies.sort()
+            p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+            results[name] = latencies[-1] if latencies else 0
+            print(f"{name:<8} 清理耗时 {total:9.1f} ms   并发保存 {len(latencies):5d} 次   "
+                  f"p99 {p99:8.1f} ms   最长 {results[name]:8.1f} ms   剩余记录 {remaining[:2]} 剩余文件 {left_files}")
+            db.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print_result("保存的最长等待", results["一个事务"] * 1000, results["分批清理"] * 1000)
+
+
+def bench_quota(args):
+    """对比扫描文件记录与读取统计表检查存储配额的延迟，以及不同记录数下淘汰固定数量记录的耗时"""
+    types = ["images", "videos", "documents", "archives", "others"]
+    for rows in (args.rows // 4, args.rows):
+        work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+        try:
+            db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+            rng = random.Random(3)
+            start_ts = int(time.time()) - rows
+            with db.connections.writer() as conn:
+                cursor = conn.cursor()
+                for i in range(rows):
+                    # 不存在的保存路径，只测量数据库中的淘汰开销
+                    db._upsert_file_record(cursor, f"C:/复制/{i}.bin", f"/saved/{i}.bin", f"{i}.bin",
+                                           rng.randint(1, 10 * 1024 * 1024), types[i % len(types)],
+                                           hashlib.md5(str(i).encode()).hexdigest(), start_ts + i, "")
+                cursor.execute("UPDATE file_records SET number = abs(random()) % 20 + 1")
+            db.update_settings(file_type_quotas={"videos": 1024 ** 4})
+
+            def scan_check(_):
+                # 不维护计数时，每次保存后都需要汇总全部文件记录
+                with db.connections.reader() as conn:
+                    conn.execute("SELECT SUM(file_size) FROM file_records").fetchone()
+                    conn.execute("SELECT SUM(file_size) FROM file_records WHERE file_type = 'videos'").fetchone()
+
+            print(f"{rows} 条文件记录")
+            print_result("检查配额", measure(scan_check, 20), measure(lambda _: db.get_quota_excess({"videos"}), 2000))
+
+            for policy in ("lru", "lfu"):
+                # 配额设为当前总大小减去约 evict 条记录的大小
+                stats = db.get_detailed_statistics()
+                average = stats['file_bytes'] // stats['file_count']
+                db.update_settings(quota_bytes=stats['file_bytes'] - average * args.evict, eviction_policy=policy)
+                start = time.perf_counter()
+                evicted = 0
+                while True:
+                    count = db.evict_over_quota_chunk(100)
+                    if not count:
+                        break
+                    evicted += count
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"淘汰({policy})  {evicted} 条   耗时 {elapsed:8.1f} ms   每条 {elapsed / max(evicted, 1) * 1000:7.1f} µs")
+            db.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_startup(args):
+    """对比每次启动都执行全部建表和补字段语句与按结构版本跳过迁移时，创建ClipboardDatabase的耗时"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        fill_text_records(db, args.rows)
+
+        def migrate_all(_):
+            # 旧实现：每次启动都执行所有的 CREATE/ALTER 语句，依靠捕获异常跳过已存在的字段
+            with db.connections.writer() as conn:
+                cursor = conn.cursor()
+                for _, name in ClipboardDatabase.MIGRATIONS:
+                    getattr(db, name)(cursor)
+
+        # 屏蔽每次创建时输出的连接信息
+        with contextlib.redirect_stdout(io.StringIO()):
+            before = measure(migrate_all, args.iterations)
+            after = measure(lambda _: ClipboardDatabase(db.db_path), args.iterations)
+        print(f"{args.rows} 条记录，结构版本 {ClipboardDatabase.SCHEMA_VERSION}")
+        print_result("启动时初始化数据库", before, after)
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_maintenance(args):
+    """模拟长期使用后的数据库（大量删除和去重更新），对比维护前后的文件大小、空闲页、碎片和查询耗时"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        fill_text_records(db, args.rows)
+        # 删除大部分旧记录并重复复制部分记录，造成空闲页和页面不连续
+        with db.connections.writer() as conn:
+            conn.execute("DELETE FROM text_records WHERE id % 4 != 0")
+            conn.execute("UPDATE text_records SET number = number + 1, ts = ts + 60 WHERE id % 8 = 0")
+        fill_text_records(db, args.rows // 4, seed=7)
+
+        def query(_):
+            db.get_text_records(limit=30, sort_by="number")
+            db.search_records("的", limit=30)
+
+        def show(label, metrics):
+            fragmentation = metrics['fragmentation']
+            print(f"{label}  文件 {metrics['file_bytes'] / 1024:9.1f} KB   空闲页 {metrics['freelist_count']:6d} "
+                  f"({metrics['freelist_ratio']:5.1%})   碎片 {'-' if fragmentation is None else f'{fragmentation:.1%}'}")
+
+        before = db.get_storage_metrics(fragmentation=True)
+        before_query = measure(query, 50)
+        show("维护前", before)
+
+        maintainer = DatabaseMaintainer(db, budget_ms=args.budget, background=False)
+        rounds = 0
+        while True:
+            rounds += 1
+            # 一轮预算用完时返回None，下一轮从暂停的位置继续
+            if maintainer.run(force=True) is not None or rounds >= 1000:
+                break
+        after = db.get_storage_metrics(fragmentation=True)
+        after_query = measure(query, 50)
+        show("维护后", after)
+        print(f"共 {rounds} 轮，每轮预算 {args.budget} ms")
+        for row in reversed(db.get_maintenance_log(limit=20)):
+            print(f"  {row[1]:<20} {row[2]:9.1f} ms   页数 {row[3]} -> {row[5]}   空闲页 {row[4]} -> {row[6]}   {row[8]}")
+        print_result("查询（排序分页+搜索）", before_query, after_query)
+
+        # 维护期间有新的剪贴板记录时应立即暂停
+        maintainer = DatabaseMaintainer(db, idle_seconds=0.05, budget_ms=10000, background=False)
+        with db.connections.writer() as conn:
+            conn.execute("DELETE FROM text_records WHERE id % 2 = 0")
+        time.sleep(0.1)
+        timer = threading.Timer(0.01, lambda: db.save_text_record("维护期间复制的文本"))
+        timer.start()
+        start = time.perf_counter()
+        result = maintainer.run()
+        timer.join()
+        print(f"维护期间保存记录: {'已暂停' if result is None else '未暂停'}，运行 {(time.perf_counter() - start) * 1000:.1f} ms")
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_profiles(args):
+    """
+    对比各存储配置在持续写入时的读取延迟：一个线程不断保存剪贴板记录，
+    其他线程模拟界面刷新列表和统计；旧实现为默认的回滚日志和连接参数
+    """
+    # 旧实现的连接参数（只在本测试中临时加入配置表）
+    STORAGE_PROFILES["rollback"] = {
+        "journal_mode": "delete",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -2000,
+        "busy_timeout": 5000,
+        "temp_store": "DEFAULT",
+    }
+    results = {}
+    try:
+        for profile in ("rollback", "durable", "balanced", "fast"):
+            work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+            try:
+                db = ClipboardDatabase(os.path.join(work_dir, "bench.db"), storage_profile=profile)
+                fill_text_records(db, args.rows)
+                stop = threading.Event()
+                writes = []
+                latencies = []
+                errors = []
+
+                def capture():
+                    i = 0
+                    while not stop.is_set():
+                        try:
+                            db.save_text_record(f"持续写入的剪贴板文本 {i} " + "内容" * 200)
+                            writes.append(i)
+                        except sqlite3.OperationalError as e:
+                            errors.append(str(e))
+                        i += 1
+
+                def browse(seed):
+                    rng = random.Random(seed)
+                    while not stop.is_set():
+                        start = time.perf_counter()
+                        try:
+                            db.get_timeline(limit=50, offset=rng.randrange(0, 2000))
+                            db.get_statistics()
+                        except sqlite3.OperationalError as e:
+                            errors.append(str(e))
+                            continue
+                        latencies.append((time.perf_counter() - start) * 1000)
+
+                threads = [threading.Thread(target=capture)]
+                threads += [threading.Thread(target=browse, args=(i,)) for i in range(args.readers)]
+                for thread in threads:
+                    thread.start()
+                time.sleep(args.seconds)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] if latencies else 0
+                p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+                worst = latencies[-1] if latencies else 0
+                results[profile] = p99
+                print(f"{profile:<9} 写入 {len(writes) / args.seconds:7.0f} 条/秒   读取 {len(latencies):6d} 次   "
+                      f"p50 {p50:7.2f} ms   p99 {p99:8.2f} ms   最长 {worst:8.2f} ms   锁定错误 {len(errors)}")
+                db.close()
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        del STORAGE_PROFILES["rollback"]
+    print_result("读取p99（balanced）", results["rollback"] * 1000, results["balanced"] * 1000)
+
+
+def bench_changes(args):
+    """对比界面定时刷新时重新读取已加载的记录与只读取变化的记录：没有变化时和有一条新记录时"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        fill_text_records(db, args.rows)
+
+        # 优化前：与旧实现一致，每次刷新都重新读取与已加载行数相同的记录和统计
+        def reload(_):
+            rows = db.get_timeline(limit=args.loaded)
+            db.get_page_cursor(rows[-1], "timeline", "timestamp")
+            db.get_statistics()
+
+        state = {'version': db.get_data_version(), 'seq': db.get_change_seq()}
+
+        def refresh(_):
+            version = db.get_data_version()
+            if version == state['version']:
+                return
+            changes = db.changes_since(state['seq'])
+            db.get_timeline_positions(changes['inserted'] + changes['updated'])
+            db.get_statistics()
+            state['version'], state['seq'] = version, changes['seq']
+
+        n = args.iterations
+        print(f"{args.rows} 条记录，已加载 {args.loaded} 行，每项执行 {n} 次")
+        print_result("没有变化时刷新", measure(reload, n), measure(refresh, n))
+
+        # 每次刷新之前由其他线程保存一条新记录（模拟剪贴板监控线程）
+        def save_then(func):
+            def run(i):
+                thread = threading.Thread(target=db.save_text_record, args=(f"刷新之间复制的文本 {i} {func.__name__}",))
+                thread.start()
+                thread.join()
+                start = time.perf_counter()
+                func(i)
+                elapsed.append(time.perf_counter() - start)
+            elapsed = []
+            for i in range(n):
+                run(i)
+            return sum(elapsed) / len(elapsed) * 1_000_000
+
+        print_result("有一条新记录时刷新", save_then(reload), save_then(refresh))
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_transfer(args):
+    """导出和导入的吞吐量和内存峰值：记录数增加到4倍时内存峰值应基本不变"""
+    for rows in (args.rows, args.rows * 4):
+        work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+        try:
+            db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+            fill_text_records(db, rows)
+            files_dir = os.path.join(work_dir, "files")
+            os.makedirs(files_dir)
+            files = []
+            for i in range(args.files):
+                path = os.path.join(files_dir, f"{i}.bin")
+                data = os.urandom(64 * 1024)
+                with open(path, "wb") as f:
+                    f.write(data)
+                files.append((path, path, f"{i}.bin", len(data), "other", hashlib.md5(data).hexdigest()))
+            db.save_file_records_many(files)
+
+            archive = os.path.join(work_dir, "backup.zip")
+            tracemalloc.start()
+            stats = export_history(db, archive, "jsonl", include_files=True)
+            export_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"导出 {format_throughput(stats)}，压缩包 {os.path.getsize(archive) / 1024 / 1024:.1f} MB，"
+                  f"内存峰值 {export_peak / 1024 / 1024:.1f} MB")
+
+            target = ClipboardDatabase(os.path.join(work_dir, "restored.db"))
+            tracemalloc.start()
+            stats = import_history(target, archive, os.path.join(work_dir, "restored_files"))
+            import_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"导入 {format_throughput(stats)}，内存峰值 {import_peak / 1024 / 1024:.1f} MB")
+            db.close()
+            target.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_capture(args):
+    """
+    用内存剪贴板运行完整的记录流程（读取快照、处理线程池、后台写入）：
+    每次复制时事件线程的耗时和占用剪贴板的时间，以及内容没有变化时每次轮询的开销
+    """
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    cwd = os.getcwd()
+    try:
+        # 复制的文件保存在当前目录下的 clipboard_files 中
+        os.chdir(work_dir)
+        db = ClipboardDatabase(os.path.join(work_dir, "bench.db"))
+        db.update_settings(unlimited_mode=True)
+        backend = MemoryClipboardBackend()
+        manager = ClipboardManager(db, backend=backend)
+
+        rng = random.Random(5)
+        source_dir = os.path.join(work_dir, "source")
+        os.makedirs(source_dir)
+        latencies = {'text': [], 'files': []}
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            # 约五分之一的复制是一组文件，其余是文本
+            if i % 5 == 4:
+                group = []
+                for j in range(args.files):
+                    path = os.path.join(source_dir, f"{i}_{j}.bin")
+                    with open(path, "wb") as f:
+                        f.write(rng.randbytes(256 * 1024))
+                    group.append(path)
+                backend.set_files(group)
+                kind = 'files'
+            else:
+                backend.set_text("".join(rng.choice(COMMON_HANZI) for _ in range(rng.randint(8, 200))))
+                kind = 'text'
+            event_start = time.perf_counter()
+            manager.process_clipboard_content()
+            latencies[kind].append(time.perf_counter() - event_start)
+        manager.ingest.flush()
+        manager.write_queue.flush()
+        total = time.perf_counter() - start
+
+        metrics = manager.get_capture_metrics()
+        print(f"{args.iterations} 次复制（文件组每组 {args.files} 个文件），全部写完 {total * 1000:.0f} ms，"
+              f"{args.iterations / total:.0f} 次/秒")
+        for kind, values in latencies.items():
+            if values:
+                values.sort()
+                print(f"事件线程({'文本' if kind == 'text' else '文件组'})  平均 {sum(values) / len(values) * 1e6:10.1f} µs   "
+                      f"P99 {values[int(len(values) * 0.99)] * 1e6:10.1f} µs")
+        print(f"占用剪贴板  平均 {metrics['avg_ms'] * 1000:10.1f} µs   P99 {metrics['p99_ms'] * 1000:10.1f} µs   "
+              f"最大 {metrics['max_ms'] * 1000:10.1f} µs")
+
+        # 内容没有变化时的轮询：每次都打开剪贴板读取并比较MD5，与先比较序列号
+        def poll_read(_):
+            manager.previous_sequence = None
+            manager.process_clipboard_content()
+
+        n = args.iterations
+        print_result("无变化时轮询", measure(poll_read, n), measure(lambda _: manager.process_clipboard_content(), n))
+        manager.close()
+        db.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_ingest(args):
+    """
+    复制一个大文件后紧接着复制多条文本：在事件线程中直接处理（优化前）与交给处理线程池时，
+    事件线程被占用的时间，以及之后的文本全部写入数据库所需的时间（按复制顺序提交与处理完成即提交）
+    """
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(work_dir)
+        big_file = os.path.join(work_dir, "big.bin")
+        with open(big_file, "wb") as f:
+            for _ in range(args.mb):
+                f.write(os.urandom(1024 * 1024))
+        texts = [f"大文件之后复制的文本 {i}" for i in range(args.iterations)]
+        print(f"复制 {args.mb} MB 的文件后复制 {args.iterations} 条文本，处理线程 {args.workers} 个")
+
+        for name, ordering in (("事件线程中处理", None), ("线程池(按顺序提交)", ORDERING_STRICT),
+                               ("线程池(完成即提交)", ORDERING_NONE)):
+            run_dir = os.path.join(work_dir, ordering or "inline")
+            os.makedirs(run_dir)
+            os.chdir(run_dir)
+            db = ClipboardDatabase(os.path.join(run_dir, "bench.db"))
+            db.update_settings(unlimited_mode=True)
+            backend = MemoryClipboardBackend()
+            manager = ClipboardManager(db, backend=backend, ingest_workers=args.workers,
+                                       ordering=ordering or ORDERING_STRICT)
+            if ordering is None:
+                # 优化前：读取快照后在事件线程中同步处理
+                def handle():
+                    snapshot = manager.take_snapshot()
+                    if snapshot is not None:
+                        manager.process_snapshot(snapshot)
+            else:
+                handle = manager.process_clipboard_content
+
+            start = time.perf_counter()
+            backend.set_files([big_file])
+            handle()
+            for text in texts:
+                backend.set_text(text)
+                handle()
+            event_time = time.perf_counter() - start
+
+            # 等待之后复制的文本全部写入数据库
+            while db.get_statistics()[0] < len(texts):
+                time.sleep(0.005)
+            texts_time = time.perf_counter() - start
+            manager.ingest.flush()
+            manager.write_queue.flush()
+            total = time.perf_counter() - start
+
+            # 变更日志中第一条新增的记录，按复制顺序提交时应为文件记录
+            with db.connections.reader() as conn:
+                first = conn.execute("SELECT kind FROM change_log ORDER BY seq LIMIT 1").fetchone()[0]
+            metrics = manager.ingest.get_metrics()
+            print(f"{name:<20} 事件线程占用 {event_time * 1000:8.1f} ms   文本全部写入 {texts_time * 1000:8.1f} ms   "
+                  f"全部完成 {total * 1000:8.1f} ms   最大队列长度 {metrics['max_depth']}   最先写入 {first}")
+            manager.close()
+            db.close()
+            os.chdir(work_dir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def drop_file_cache(path):
+    """让系统丢弃文件在页缓存中的内容，模拟第一次读取（只在支持 posix_fadvise 的系统上有效）"""
+    if hasattr(os, "posix_fadvise"):
+        with open(path, "rb") as f:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def bench_copy(args):
+    """对比先计算MD5再复制（读取两遍源文件）与复制的同时计算MD5（读取一遍）的吞吐量"""
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        store = os.path.join(work_dir, "store")
+        os.makedirs(store)
+        sizes = [int(size) for size in args.sizes.split(",")]
+        cached = "（每次读取前丢弃源文件的页缓存）" if hasattr(os, "posix_fadvise") else ""
+        print(f"文件大小 {', '.join(f'{size} MB' for size in sizes)}{cached}")
+        for size in sizes:
+            source = os.path.join(work_dir, f"source_{size}.bin")
+            block = os.urandom(1024 * 1024)
+            with open(source, "wb") as f:
+                for i in range(size):
+                    f.write(block[i % 1024:] + block[:i % 1024])
+
+            # 优化前：按4KB计算MD5，再用 shutil.copy2 复制
+            def hash_then_copy():
+                md5_hash = hash_file(source, strategy=STRATEGY_READ, buffer_size=4096)
+                target = os.path.join(store, f"old_{md5_hash}.bin")
+                shutil.copy2(source, target)
+                return md5_hash, target
+
+            # 优化后：复制到临时文件的同时计算MD5，再改名
+            def copy_and_hash():
+                temp_path, md5_hash, _ = copy_file_with_md5(source, store)
+                target = os.path.join(store, f"new_{md5_hash}.bin")
+                os.replace(temp_path, target)
+                return md5_hash, target
+
+            # 小文件重复多次取最快的一次，减少偶然波动的影响
+            rounds = max(1, min(20, 256 // size))
+            results = {}
+            for name, func in (("先计算MD5再复制", hash_then_copy), ("复制的同时计算MD5", copy_and_hash)):
+                best = None
+                for _ in range(rounds):
+                    drop_file_cache(source)
+                    start = time.perf_counter()
+                    md5_hash, target = func()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                    os.remove(target)
+                results[name] = (md5_hash, best)
+            (old_hash, before), (new_hash, after) = results.values()
+            assert old_hash == new_hash
+            print(f"{size:>6} MB   优化前 {size / before:8.0f} MB/s ({before * 1000:8.1f} ms)   "
+                  f"优化后 {size / after:8.0f} MB/s ({after * 1000:8.1f} ms)   提升 {before / after:5.2f}x")
+            os.remove(source)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parse_size(text):
+    """解析 4K、16M、1G 这样的大小"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    """把字节数格式化为 4K、16M、1G 这样的大小"""
+    for unit, factor in (("G", 1024 ** 3), ("M", 1024 ** 2), ("K", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def bench_hashing(args):
+    """
+    比较不同读取方式和缓冲区大小计算文件MD5的吞吐量（MB/s），用于选择 clipboard_hashing 的默认参数
+    --cold 时每次计算前丢弃文件的页缓存，否则测量文件已在缓存中时的CPU和系统调用开销
+    """
+    strategies = [
+        ("read 4K(旧)", STRATEGY_READ, 4096),
+        ("read 1M", STRATEGY_READ, 1024 * 1024),
+        ("readinto 64K", STRATEGY_READINTO, 64 * 1024),
+        ("readinto 1M", STRATEGY_READINTO, 1024 * 1024),
+        ("readinto 4M", STRATEGY_READINTO, 4 * 1024 * 1024),
+        ("readinto 自适应", STRATEGY_READINTO, None),
+        ("mmap", STRATEGY_MMAP, None),
+        ("auto", STRATEGY_AUTO, None),
+    ]
+    if FILE_DIGEST_AVAILABLE:
+        strategies.insert(-1, ("file_digest", STRATEGY_FILE_DIGEST, None))
+
+    work_dir = tempfile.mkdtemp(prefix="clipboard_bench_")
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(",")]
+        print(f"{'缓存' if not args.cold else '无缓存'}，单位 MB/s")
+        print(f"{'文件大小':<8}" + "".join(f"{name:>16}" for name, _, _ in strategies))
+        for size in sizes:
+            path = os.path.join(work_dir, f"{size}.bin")
+            block = os.urandom(1024 * 1024)
+            with open(path, "wb") as f:
+                remaining = size
+                while remaining:
+                    f.write(block[:min(remaining, len(block))])
+                    remaining -= min(remaining, len(block))
+            expected = hashlib.md5(open(path, "rb").read()).hexdigest() if size <= 256 * 1024 * 1024 else None
+
+            # 每种方式至少重复到约0.2秒（大文件至少一次），取最快的一次
+            row = []
+            for name, strategy, buffer_size in strategies:
+                best = None
+                spent = 0.0
+                rounds = 0
+                while rounds < 3 or (spent < 0.2 and rounds < 1000):
+                    if args.cold:
+                        drop_file_cache(path)
+                    start = time.perf_counter()
+                    digest = hash_file(path, strategy=strategy, buffer_size=buffer_size)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                    spent += elapsed
+                    rounds += 1
+                    if size >= 256 * 1024 * 1024:
+                        break
+                if expected is None:
+                    expected = digest
+                assert digest == expected, name
+                row.append(size / 1024 / 1024 / best)
+            print(f"{format_size(size):<8}" + "".join(f"{value:>16.0f}" for value in row))
+            os.remove(path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="剪贴板管理器性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_connections = subparsers.add_parser("connections", help="连接管理器单次调用延迟")
+    parser_connections.add_argument("-n", "--iterations", type=int, default=500)
+    parser_connections.set_defaults(func=bench_connections)
+
+    parser_search = subparsers.add_parser("search", help="中文子串搜索延迟")
+    parser_search.add_argument("--rows", type=int, default=1000000)
+    parser_search.add_argument("--queries", type=int, default=20)
+    parser_search.add_argument("--limit", type=int, default=30)
+    parser_search.add_argument("--verify", action="store_true", help="校验子串索引与LIKE的结果集一致")
+    parser_search.set_defaults(func=bench_search)
+
+    parser_search_check = subparsers.add_parser("search-check", help="固定语料上各搜索方式与LIKE的结果一致性")
+    parser_search_check.set_defaults(func=bench_search_check)
+
+    parser_paging = subparsers.add_parser("paging", help="深分页读取延迟")
+    parser_paging.add_argument("--rows", type=int, default=200000)
+    parser_paging.add_argument("--limit", type=int, default=30)
+    parser_paging.add_argument("-n", "--iterations", type=int, default=20)
+    parser_paging.set_defaults(func=bench_paging)
+
+    parser_upsert = subparsers.add_parser("upsert", help="重复复制的去重写入延迟")
+    parser_upsert.add_argument("-n", "--iterations", type=int, default=5000)
+    parser_upsert.add_argument("--distinct", type=int, default=200)
+    parser_upsert.set_defaults(func=bench_upsert)
+
+    parser_batch = subparsers.add_parser("batch", help="一次复制多个文件的保存耗时")
+    parser_batch.add_argument("--files", type=int, default=100)
+    parser_batch.add_argument("-n", "--iterations", type=int, default=10)
+    parser_batch.set_defaults(func=bench_batch)
+
+    parser_writer = subparsers.add_parser("writer", help="后台写入队列的回调延迟")
+    parser_writer.add_argument("-n", "--iterations", type=int, default=2000)
+    parser_writer.add_argument("--interval", type=int, default=50)
+    parser_writer.set_defaults(func=bench_writer)
+
+    parser_listing = subparsers.add_parser("listing", help="列表读取的耗时和内存")
+    parser_listing.add_argument("--rows", type=int, default=2000)
+    parser_listing.add_argument("--chars", type=int, default=5000)
+    parser_listing.set_defaults(func=bench_listing)
+
+    parser_compression = subparsers.add_parser("compression", help="大文本压缩的空间和读取延迟")
+    parser_compression.add_argument("--clips", type=int, default=3000)
+    parser_compression.add_argument("--threshold", type=int, default=4096)
+    parser_compression.add_argument("--reads", type=int, default=2000)
+    parser_compression.set_defaults(func=bench_compression)
+
+    parser_sweeper = subparsers.add_parser("sweeper", help="过期清理期间的写入等待时间")
+    parser_sweeper.add_argument("--rows", type=int, default=50000)
+    parser_sweeper.add_argument("--files", type=int, default=2000)
+    parser_sweeper.set_defaults(func=bench_sweeper)
+
+    parser_quota = subparsers.add_parser("quota", help="存储配额检查和淘汰的耗时")
+    parser_quota.add_argument("--rows", type=int, default=200000)
+    parser_quota.add_argument("--evict", type=int, default=1000)
+    parser_quota.set_defaults(func=bench_quota)
+
+    parser_startup = subparsers.add_parser("startup", help="打开已是最新结构的数据库的耗时")
+    parser_startup.add_argument("--rows", type=int, default=20000)
+    parser_startup.add_argument("-n", "--iterations", type=int, default=50)
+    parser_startup.set_defaults(func=bench_startup)
+
+    parser_maintenance = subparsers.add_parser("maintenance", help="空闲维护前后的空间和碎片")
+    parser_maintenance.add_argument("--rows", type=int, default=100000)
+    parser_maintenance.add_argument("--budget", type=int, default=200)
+    parser_maintenance.set_defaults(func=bench_maintenance)
+
+    parser_profiles = subparsers.add_parser("profiles", help="各存储配置在持续写入时的读取延迟")
+    parser_profiles.add_argument("--rows", type=int, default=20000)
+    parser_profiles.add_argument("--seconds", type=float, default=3)
+    parser_profiles.add_argument("--readers", type=int, default=2)
+    parser_profiles.set_defaults(func=bench_profiles)
+
+    parser_changes = subparsers.add_parser("changes", help="界面定时刷新的耗时")
+    parser_changes.add_argument("--rows", type=int, default=50000)
+    parser_changes.add_argument("--loaded", type=int, default=1000)
+    parser_changes.add_argument("-n", "--iterations", type=int, default=200)
+    parser_changes.set_defaults(func=bench_changes)
+
+    parser_transfer = subparsers.add_parser("transfer", help="导出和导入的吞吐量和内存")
+    parser_transfer.add_argument("--rows", type=int, default=5000)
+    parser_transfer.add_argument("--files", type=int, default=200)
+    parser_transfer.set_defaults(func=bench_transfer)
+
+    parser_capture = subparsers.add_parser("capture", help="用内存剪贴板运行完整的记录流程")
+    parser_capture.add_argument("-n", "--iterations", type=int, default=500)
+    parser_capture.add_argument("--files", type=int, default=5)
+    parser_capture.set_defaults(func=bench_capture)
+
+    parser_ingest = subparsers.add_parser("ingest", help="复制大文件时事件线程与处理线程池的对比")
+    parser_ingest.add_argument("--mb", type=int, default=200)
+    parser_ingest.add_argument("-n", "--iterations", type=int, default=50)
+    parser_ingest.add_argument("--workers", type=int, default=2)
+    parser_ingest.set_defaults(func=bench_ingest)
+
+    parser_copy = subparsers.add_parser("copy", help="复制文件时计算MD5的方式")
+    parser_copy.add_argument("--sizes", default="1,16,256,1024,4096")
+    parser_copy.set_defaults(func=bench_copy)
+
+    parser_hashing = subparsers.add_parser("hashing", help="计算文件MD5的读取方式和缓冲区大小")
+    parser_hashing.add_argument("--sizes", default="4K,64K,256K,1M,16M,64M,256M,1G")
+    parser_hashing.add_argument("--cold", action="store_true", help="每次计算前丢弃文件的页缓存")
+    parser_hashing.set_defaults(func=bench_hashing)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,122 +5,67 @@
 功能：检测剪贴板中的内容类型并处理
 """
 
-import win32clipboard
-import win32con
 import os
 import hashlib
 from datetime import datetime
+from clipboard_backend import get_default_backend, CF_TEXT
 from clipboard_db import ClipboardDatabase
 
-def get_clipboard_formats():
+def get_clipboard_formats(backend=None):
     """获取剪贴板中所有可用的格式"""
+    backend = backend if backend is not None else get_default_backend()
     formats = []
     try:
-        win32clipboard.OpenClipboard()
-        format_id = 0
-        while True:
-            format_id = win32clipboard.EnumClipboardFormats(format_id)
-            if not format_id:
-                break
-            formats.append(format_id)
+        with backend.opened() as is_open:
+            if is_open:
+                formats = backend.formats()
     except Exception as e:
         print(f"枚举剪贴板格式时出错: {e}")
-    finally:
-        try:
-            win32clipboard.CloseClipboard()
-        except:
-            pass
     return formats
 
-def format_name(format_id):
+def format_name(format_id, backend=None):
     """获取格式ID对应的名称"""
-    # 常见格式映射
-    format_names = {
-        win32con.CF_TEXT: "CF_TEXT",
-        win32con.CF_BITMAP: "CF_BITMAP",
-        win32con.CF_METAFILEPICT: "CF_METAFILEPICT",
-        win32con.CF_SYLK: "CF_SYLK",
-        win32con.CF_DIF: "CF_DIF",
-        win32con.CF_TIFF: "CF_TIFF",
-        win32con.CF_OEMTEXT: "CF_OEMTEXT",
-        win32con.CF_DIB: "CF_DIB",
-        win32con.CF_PALETTE: "CF_PALETTE",
-        win32con.CF_PENDATA: "CF_PENDATA",
-        win32con.CF_RIFF: "CF_RIFF",
-        win32con.CF_WAVE: "CF_WAVE",
-        win32con.CF_UNICODETEXT: "CF_UNICODETEXT",
-        win32con.CF_ENHMETAFILE: "CF_ENHMETAFILE",
-        win32con.CF_HDROP: "CF_HDROP",
-        win32con.CF_LOCALE: "CF_LOCALE",
-        win32con.CF_DIBV5: "CF_DIBV5",
-        win32con.CF_OWNERDISPLAY: "CF_OWNERDISPLAY",
-        win32con.CF_DSPTEXT: "CF_DSPTEXT",
-        win32con.CF_DSPBITMAP: "CF_DSPBITMAP",
-        win32con.CF_DSPMETAFILEPICT: "CF_DSPMETAFILEPICT",
-        win32con.CF_DSPENHMETAFILE: "CF_DSPENHMETAFILE",
-    }
-    
-    # 尝试注册一些常用格式
-    try:
-        html_format = win32clipboard.RegisterClipboardFormat("HTML Format")
-        format_names[html_format] = "HTML Format"
-    except:
-        pass
-    
-    try:
-        png_format = win32clipboard.RegisterClipboardFormat("PNG")
-        format_names[png_format] = "PNG"
-    except:
-        pass
-    
-    # 返回格式名称
-    if format_id in format_names:
-        return format_names[format_id]
-    else:
-        try:
-            # 尝试获取自定义格式名称
-            name = win32clipboard.GetClipboardFormatName(format_id)
-            return name if name else f"Unknown({format_id})"
-        except:
-            return f"Unknown({format_id})"
+    backend = backend if backend is not None else get_default_backend()
+    return backend.format_name(format_id)
 
-def get_clipboard_content():
-    """获取剪贴板内容"""
+def get_clipboard_content(backend=None):
+    """获取剪贴板内容（读取完成后立即关闭剪贴板）"""
+    backend = backend if backend is not None else get_default_backend()
     content_info = {
         'text': None,
         'files': [],
         'formats': [],
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'sequence': backend.sequence_number()
     }
     
     try:
-        win32clipboard.OpenClipboard()
-        
-        # 获取所有格式
-        formats = get_clipboard_formats()
-        content_info['formats'] = formats
-        
-        # 尝试获取文本内容
-        if win32clipboard.IsClipboardFormatAvailable(win32con.CF_UNICODETEXT):
+        with backend.opened() as is_open:
+            if not is_open:
+                return content_info
+            
+            # 获取所有格式
+            content_info['formats'] = backend.formats()
+            
+            # 尝试获取文本内容
             try:
-                text_content = win32clipboard.GetClipboardData(win32con.CF_UNICODETEXT)
+                text_content = backend.get_text()
                 if text_content and text_content.strip():
                     content_info['text'] = text_content
             except Exception as e:
                 print(f"读取Unicode文本时出错: {e}")
-        
-        if not content_info['text'] and win32clipboard.IsClipboardFormatAvailable(win32con.CF_TEXT):
-            try:
-                text_content = win32clipboard.GetClipboardData(win32con.CF_TEXT)
-                if text_content and text_content.strip():
-                    content_info['text'] = text_content
-            except Exception as e:
-                print(f"读取ANSI文本时出错: {e}")
-        
-        # 尝试获取文件列表
-        if win32clipboard.IsClipboardFormatAvailable(win32con.CF_HDROP):
+            
+            if not content_info['text'] and backend.has_format(CF_TEXT):
+                try:
+                    text_content = backend.get_data(CF_TEXT)
+                    if text_content and text_content.strip():
+                        content_info['text'] = text_content
+                except Exception as e:
+                    print(f"读取ANSI文本时出错: {e}")
+            
+            # 尝试获取文件列表
             try:
-                files = win32clipboard.GetClipboardData(win32con.CF_HDROP)
+                files = backend.get_files()
                 if files:
                     content_info['files'] = list(files)
             except Exception as e:
@@ -128,11 +73,6 @@ def get_clipboard_content():
                 
     except Exception as e:
         print(f"读取剪贴板时出错: {e}")
-    finally:
-        try:
-            win32clipboard.CloseClipboard()
-        except:
-            pass
     
     return content_info
 
@@ -215,7 +155,7 @@ def format_content_display(content_info):
     
     print("-" * 50)
 
-def monitor_clipboard(interval=1, auto_save=False):
+def monitor_clipboard(interval=1, auto_save=False, backend=None):
     """监控剪贴板变化"""
     print("🔍 开始监控剪贴板...")
     print(f"⏱  检测间隔: {interval}秒")
@@ -230,7 +170,7 @@ def monitor_clipboard(interval=1, auto_save=False):
     try:
         while True:
             # 获取当前剪贴板内容
-            content_info = get_clipboard_content()
+            content_info = get_clipboard_content(backend)
             
             # 创建内容唯一标识
             content_key = ""
@@ -5,13 +5,562 @@
 """
 
 import sqlite3
+import functools
 import hashlib
+import heapq
+import itertools
+import lzma
 import os
+import threading
+import zlib
+from contextlib import contextmanager
 from datetime import datetime, timezone
 import time
 
+
+# 数据库存储配置：配置名 -> 每个连接打开时设置的PRAGMA
+# 三种配置都使用WAL日志，读取和写入互不阻塞；区别在于提交时是否等待数据写入磁盘以及内存映射和缓存的大小
+STORAGE_PROFILES = {
+    # 每次提交都等待写入磁盘，断电也不会丢失已提交的记录
+    "durable": {
+        "journal_mode": "wal",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -8192,  # 负数表示KB
+        "busy_timeout": 10000,
+        "temp_store": "DEFAULT",
+    },
+    # 只在检查点时写入磁盘，断电可能丢失最近提交的记录，但不会损坏数据库
+    "balanced": {
+        "journal_mode": "wal",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16384,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+    # 不等待写入磁盘，程序崩溃不丢失记录，操作系统崩溃或断电时可能丢失最近的记录
+    "fast": {
+        "journal_mode": "wal",
+        "synchronous": "OFF",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -65536,
+        "busy_timeout": 2000,
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_STORAGE_PROFILE = "balanced"
+
+
+class ConnectionManager:
+    """
+    数据库连接管理器
+    维护一个长期存在的写连接和一个按线程分配的小型读连接池，
+    并启用语句缓存，避免每次数据库操作都重新建立连接；
+    每个连接按当前的存储配置（STORAGE_PROFILES）设置PRAGMA，切换配置后各连接在下次使用时重新设置
+    """
+    
+    def __init__(self, db_path, max_readers=4, cached_statements=128, profile=DEFAULT_STORAGE_PROFILE):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"未知的存储配置: {profile}")
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.cached_statements = cached_statements
+        self.profile = profile
+        
+        # 连接 -> 已应用的存储配置名
+        self._applied_profiles = {}
+        
+        # 写连接及其锁（同一时间只允许一个线程写入）
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._write_owner = None
+        self._write_depth = 0
+        
+        # 读连接池: 线程ID -> 连接
+        self._readers = {}
+        self._readers_lock = threading.Lock()
+        
+        # 只用于读取 PRAGMA data_version 的专用连接（见 data_version()）
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        
+        # 最近一次保存剪贴板记录的时间（time.monotonic()），后台维护据此判断是否空闲
+        self.last_activity = time.monotonic()
+    
+    def touch(self):
+        """记录一次剪贴板记录的写入"""
+        self.last_activity = time.monotonic()
+    
+    def idle_seconds(self):
+        """距最近一次保存剪贴板记录的秒数"""
+        return time.monotonic() - self.last_activity
+    
+    def set_profile(self, profile):
+        """切换存储配置，写连接和各线程的读连接在下次使用时应用"""
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"未知的存储配置: {profile}")
+        self.profile = profile
+    
+    def _connect(self):
+        """创建新的数据库连接"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=STORAGE_PROFILES[self.profile]["busy_timeout"] / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        register_sql_functions(conn)
+        self._apply_profile(conn)
+        return conn
+    
+    def _apply_profile(self, conn):
+        """按当前存储配置设置连接的PRAGMA（连接不在事务中时调用）"""
+        profile = self.profile
+        if self._applied_profiles.get(conn) == profile or conn.in_transaction:
+            return
+        pragmas = STORAGE_PROFILES[profile]
+        for name in ("busy_timeout", "synchronous", "mmap_size", "cache_size", "temp_store"):
+            conn.execute(f"PRAGMA {name} = {pragmas[name]}")
+        # 日志模式保存在数据库文件中，只需切换一次；切换需要独占数据库，其他进程正在读写时留到下次连接
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != pragmas["journal_mode"]:
+            try:
+                mode = conn.execute(f"PRAGMA journal_mode = {pragmas['journal_mode']}").fetchone()[0]
+                if mode != pragmas["journal_mode"]:
+                    print(f"切换日志模式失败，当前为: {mode}")
+            except sqlite3.OperationalError as e:
+                print(f"切换日志模式失败: {e}")
+        self._applied_profiles[conn] = profile
+    
+    def _close(self, conn):
+        """关闭连接"""
+        self._applied_profiles.pop(conn, None)
+        conn.close()
+    
+    @contextmanager
+    def writer(self):
+        """
+        获取写连接
+        嵌套调用共享同一个事务，只有最外层退出时才提交；出现异常时回滚
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+            if self._write_depth == 0:
+                self._apply_profile(conn)
+            self._write_owner = threading.get_ident()
+            self._write_depth += 1
+            try:
+                yield conn
+                if self._write_depth == 1:
+                    conn.commit()
+            except BaseException:
+                if self._write_depth == 1:
+                    conn.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._write_owner = None
+    
+    @contextmanager
+    def reader(self):
+        """
+        获取当前线程的读连接
+        如果当前线程正持有写连接，则直接复用写连接以便读取未提交的数据
+        """
+        thread_id = threading.get_ident()
+        if self._write_owner == thread_id:
+            yield self._writer
+            return
+        
+        conn = self._get_reader(thread_id)
+        if conn is not None:
+            self._apply_profile(conn)
+            yield conn
+            return
+        
+        # 读连接池已满，使用临时连接
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._close(conn)
+    
+    def _get_reader(self, thread_id):
+        """从读连接池中获取（或创建）当前线程的读连接，池满时返回None"""
+        with self._readers_lock:
+            conn = self._readers.get(thread_id)
+            if conn is not None:
+                return conn
+            
+            if len(self._readers) >= self.max_readers:
+                # 回收已经结束的线程占用的连接
+                alive = {thread.ident for thread in threading.enumerate()}
+                for dead_id in [tid for tid in self._readers if tid not in alive]:
+                    self._close(self._readers.pop(dead_id))
+                if len(self._readers) >= self.max_readers:
+                    return None
+            
+            conn = self._connect()
+            self._readers[thread_id] = conn
+            return conn
+    
+    def data_version(self):
+        """
+        专用连接上的 PRAGMA data_version，其他连接（包括本进程的写连接和其他进程）提交修改后改变
+        data_version 只在同一个连接上比较才有意义：读连接池已满时 reader() 给出的临时连接每次都是新的，
+        当前线程持有写连接时 reader() 给出的写连接看不到自己的提交，所以固定使用一个不做其他操作的连接
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = self._connect()
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def close(self):
+        """关闭所有连接"""
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._close(self._version_conn)
+                self._version_conn = None
+        with self._readers_lock:
+            for conn in self._readers.values():
+                self._close(conn)
+            self._readers.clear()
+        with self._write_lock:
+            if self._writer is not None:
+                self._close(self._writer)
+                self._writer = None
+
+
+# 同一个数据库文件的所有ClipboardDatabase实例共享同一个连接管理器
+_connection_managers = {}
+_connection_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path):
+    """获取指定数据库文件对应的共享连接管理器"""
+    key = os.path.abspath(db_path)
+    with _connection_managers_lock:
+        manager = _connection_managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(key)
+            _connection_managers[key] = manager
+        return manager
+
+
+class SettingsStore:
+    """
+    设置缓存
+    读取设置时直接返回内存中的副本，不访问数据库；设置被修改后刷新缓存，
+    并在修改设置的线程中通知订阅者（订阅者需自行切换到自己的线程，例如GUI线程）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings = None
+        # 每次失效或刷新加1，防止并发加载时把旧值写回缓存
+        self._version = 0
+        self._subscribers = []
+
+    def get(self, loader):
+        """返回缓存的设置副本，缓存为空时用loader从数据库加载"""
+        with self._lock:
+            settings = self._settings
+            version = self._version
+        if settings is None:
+            settings = loader()
+            with self._lock:
+                if self._version == version:
+                    self._settings = settings
+        return dict(settings)
+
+    def invalidate(self):
+        """使缓存失效，下次读取时重新加载"""
+        with self._lock:
+            self._settings = None
+            self._version += 1
+
+    def refresh(self, loader):
+        """重新加载设置，有变化时通知订阅者"""
+        settings = loader()
+        with self._lock:
+            old_settings = self._settings
+            self._settings = settings
+            self._version += 1
+            subscribers = list(self._subscribers)
+
+        if old_settings is None:
+            changed = set(settings)
+        else:
+            changed = {key for key, value in settings.items() if old_settings.get(key) != value}
+        if not changed:
+            return
+
+        for callback in subscribers:
+            try:
+                callback(dict(settings), changed)
+            except Exception as e:
+                print(f"通知设置变化时出错: {e}")
+
+    def subscribe(self, callback):
+        """订阅设置变化，callback(settings, changed_keys)"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """取消订阅设置变化"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+
+# 同一个数据库文件的所有ClipboardDatabase实例共享同一份设置缓存
+_settings_stores = {}
+_settings_stores_lock = threading.Lock()
+
+
+def get_settings_store(db_path):
+    """获取指定数据库文件对应的共享设置缓存"""
+    key = os.path.abspath(db_path)
+    with _settings_stores_lock:
+        store = _settings_stores.get(key)
+        if store is None:
+            store = SettingsStore()
+            _settings_stores[key] = store
+        return store
+
+
+# 时间以UTC纪元秒（ts列）存储，读取时按本地时区格式化为与旧版本一致的字符串
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_ts_sql(column="ts"):
+    """返回将纪元秒列格式化为本地时间字符串的SQL表达式"""
+    return f"strftime('{TIMESTAMP_FORMAT}', {column}, 'unixepoch', 'localtime')"
+
+
+def is_cjk_char(char):
+    """判断单个字符是否为中日韩字符"""
+    code = ord(char)
+    return (0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or
+            0x3040 <= code <= 0x30FF or 0xAC00 <= code <= 0xD7AF or
+            0xF900 <= code <= 0xFAFF or 0x20000 <= code <= 0x2FA1F)
+
+
+def contains_cjk(text):
+    """判断文本中是否包含中日韩字符"""
+    return any(is_cjk_char(char) for char in text)
+
+
+def extract_cjk_grams(text):
+    """
+    提取文本中所有连续中日韩字符的单字和双字片段（去重）
+    用于回答三元组索引无法处理的1-2个字的中文子串查询
+    """
+    grams = set()
+    previous = None
+    for char in text:
+        if is_cjk_char(char):
+            grams.add(char)
+            if previous is not None:
+                grams.add(previous + char)
+            previous = char
+        else:
+            previous = None
+    return grams
+
+
+def cjk_grams_document(*texts):
+    """生成单字/双字倒排索引的文档（以空格分隔的片段），作为SQL函数cjk_grams()注册"""
+    grams = set()
+    for text in texts:
+        if text:
+            grams.update(extract_cjk_grams(text))
+    return " ".join(sorted(grams))
+
+
+# 文本内容的压缩算法：编码名 -> (压缩函数, 解压函数)，编码记录在 text_contents.codec 中，NULL表示未压缩
+TEXT_CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def encode_text(text, codec="zlib", threshold=4096):
+    """
+    按需压缩文本内容，返回 (存储值, 编码)
+    UTF-8字节数小于threshold、codec为None或压缩后没有明显变小（超过原大小的90%）时返回原文和None
+    """
+    if codec is None:
+        return text, None
+    data = text.encode('utf-8')
+    if len(data) < threshold:
+        return text, None
+    compressed = TEXT_CODECS[codec][0](data)
+    if len(compressed) > len(data) * 0.9:
+        return text, None
+    return compressed, codec
+
+
+def decode_text(value, codec):
+    """将存储值还原为文本"""
+    if codec is None or value is None:
+        return value
+    return TEXT_CODECS[codec][1](value).decode('utf-8')
+
+
+def remove_saved_file(path):
+    """删除保存的文件，文件已不存在也视为成功；删除失败时返回False"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"删除文件时出错: {e}")
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def sqlite_search_features():
+    """
+    检测当前SQLite是否支持FTS5全文索引和trigram分词器，返回 (fts5, trigram)
+    在内存数据库中检测，每个进程只检测一次，打开已是最新版本的数据库时不需要查询表结构
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        try:
+            conn.execute("CREATE VIRTUAL TABLE probe_fts USING fts5(content)")
+        except sqlite3.OperationalError:
+            return False, False
+        try:
+            conn.execute("CREATE VIRTUAL TABLE probe_trigram USING fts5(content, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            return True, False
+        return True, True
+    finally:
+        conn.close()
+
+
+def register_sql_functions(conn):
+    """注册触发器和查询中用到的自定义SQL函数"""
+    conn.create_function("cjk_grams", -1, cjk_grams_document, deterministic=True)
+    conn.create_function("decode_text", 2, decode_text, deterministic=True)
+
+
+def make_snippet(text, keyword, width=16):
+    """截取关键词所在位置前后的文本作为摘要"""
+    position = text.lower().find(keyword.lower())
+    if position < 0:
+        return None
+    start = max(position - width, 0)
+    end = min(position + len(keyword) + width, len(text))
+    return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+
+def clip_snippet(snippet, keyword, max_length):
+    """
+    FTS5的snippet()按词截取，单个很长的词（base64、压缩过的代码、长网址）会整段返回；
+    超过max_length个字符时改为截取关键词中第一个出现的词附近的文本，都找不到时截取开头
+    """
+    if snippet is None or len(snippet) <= max_length:
+        return snippet
+    for term in keyword.split():
+        clipped = make_snippet(snippet, term[:max_length], max((max_length - len(term)) // 2, 0))
+        if clipped is not None:
+            return clipped
+    return snippet[:max_length] + "..."
+
+
+def build_fts_query(keyword):
+    """
+    将用户输入的关键词转换为FTS5查询语句
+    每个词都作为带前缀匹配的短语处理，多个词之间为AND关系，避免用户输入被解析为FTS语法
+    """
+    terms = []
+    for term in keyword.split():
+        terms.append('"' + term.replace('"', '""') + '"*')
+    return " ".join(terms)
+
+
 class ClipboardDatabase:
-    def __init__(self, db_path=None):
+    # 分页搜索时参与相关度排序的最新命中记录数
+    SEARCH_RANK_WINDOW = 1000
+    
+    # 各排序字段对应的排序表达式，每个表达式都有 (表达式, id) 复合索引
+    # 内容排序只比较预览（内容的前64个字符），避免为整段文本建立索引
+    TEXT_SORT_KEYS = {
+        "timestamp": "ts",
+        "content": "preview",
+        "char_count": "char_count",
+        "number": "number",
+    }
+    FILE_SORT_KEYS = {
+        "timestamp": "ts",
+        "filename": "filename",
+        "file_size": "file_size",
+        "file_type": "file_type",
+        "number": "number",
+    }
+    
+    # 时间线（文本与文件合并）的排序字段，对应界面上的各列
+    TIMELINE_SORT_KEYS = {
+        "timestamp": "ts",
+        "name": "name",
+        "type": "type",
+        "size": "size",
+        "number": "number",
+    }
+    
+    # 超出存储配额时的淘汰顺序：lru 先淘汰最久没有复制的文件，lfu 先淘汰复制次数最少的文件（次数相同时按时间）
+    # 每种顺序都有对应的索引（按类型的配额在前面加 file_type），淘汰时按索引顺序读取，开销与淘汰的记录数成正比
+    EVICTION_ORDERS = {
+        "lru": "ts, id",
+        "lfu": "number, ts, id",
+    }
+    
+    # 文本预览的字符数，列表只读取预览，完整内容存放在text_contents表中按需读取
+    PREVIEW_LENGTH = 64
+    
+    # 搜索结果摘要的最大字符数
+    SNIPPET_MAX_LENGTH = 120
+    
+    # 读取时由ts列生成timestamp字符串，调用方得到的格式与旧版本相同
+    # 文本记录的第二列为预览而不是完整内容，完整内容通过 get_text_content() 读取
+    TEXT_COLUMNS = f"id, preview, {format_ts_sql()} AS timestamp, char_count, md5_hash, number, byte_count"
+    FILE_COLUMNS = f"id, original_path, saved_path, filename, file_size, file_type, md5_hash, {format_ts_sql()} AS timestamp, number"
+    TIMELINE_COLUMNS = f"kind, record_id, name, type, size, {format_ts_sql()} AS timestamp, number"
+    
+    # 去重写入：md5_hash已存在时更新时间并增加计数，RETURNING返回新插入或已存在记录的ID；
+    # 文本记录同时返回是否为新插入的记录（更新后计数至少为2），只有新记录需要写入内容
+    TEXT_UPSERT_SQL = '''
+        INSERT INTO text_records (preview, timestamp, ts, char_count, byte_count, md5_hash, number)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(md5_hash) WHERE md5_hash IS NOT NULL DO UPDATE
+        SET timestamp = excluded.timestamp, ts = excluded.ts, number = number + 1
+        RETURNING id, number = 1
+    '''
+    FILE_UPSERT_SQL = '''
+        INSERT INTO file_records (original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, ts, number)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(md5_hash) WHERE md5_hash IS NOT NULL DO UPDATE
+        SET original_path = excluded.original_path, timestamp = excluded.timestamp, ts = excluded.ts, number = number + 1
+        RETURNING id
+    '''
+    
+    def __init__(self, db_path=None, compression="zlib", compress_threshold=4096, storage_profile=None):
+        """
+        compression: 文本内容的压缩算法（TEXT_CODECS 中的名称，None表示不压缩）
+        compress_threshold: UTF-8编码后达到该字节数的文本才压缩，较短的文本压缩收益小且读取时需要解码
+        storage_profile: 存储配置（STORAGE_PROFILES 中的名称），None表示使用设置中保存的配置
+        """
+        if compression is not None and compression not in TEXT_CODECS:
+            raise ValueError(f"未知的压缩算法: {compression}")
+        if storage_profile is not None and storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"未知的存储配置: {storage_profile}")
+        
         # 如果没有指定数据库路径，则使用智能路径选择
         if db_path is None:
             db_path = self._get_appropriate_db_path()
@@ -23,7 +572,15 @@ class ClipboardDatabase:
             os.makedirs(db_dir, exist_ok=True)
         
         self.db_path = db_path
+        self.connections = get_connection_manager(db_path)
+        self.settings_store = get_settings_store(db_path)
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.fts_available = False
+        self.trigram_available = False
+        self.upsert_available = False
         self.init_database()
+        self.connections.set_profile(storage_profile or self.get_settings()['storage_profile'])
     
     def _get_appropriate_db_path(self):
         """
@@ -61,25 +618,82 @@ class ClipboardDatabase:
             print(f"测试数据库路径 {db_path} 失败: {e}")
             return False
     
+    # 数据库结构的版本迁移，按 PRAGMA user_version 记录已完成的版本
+    # 每个迁移在一个事务中执行并在同一事务中更新版本号，中途退出时整个迁移回滚，下次启动从该迁移继续；
+    # 新的结构变更追加到列表末尾，不修改已发布的迁移
+    MIGRATIONS = [
+        (1, "_migrate_base_tables"),
+        (2, "_migrate_derived_structures"),
+        (3, "_migrate_maintenance_log"),
+        (4, "_migrate_storage_profile"),
+        (5, "_migrate_change_log"),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+    
     def init_database(self):
-        """初始化数据库"""
+        """初始化数据库：结构已是最新版本时只读取一次版本号"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            print(f"数据库连接成功: {self.db_path}")
+            with self.connections.writer() as conn:
+                print(f"数据库连接成功: {self.db_path}")
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < self.SCHEMA_VERSION:
+                    self._migrate(conn, version)
+                elif version > self.SCHEMA_VERSION:
+                    print(f"数据库由更新版本的程序创建（结构版本 {version}），部分功能可能不可用")
         except sqlite3.OperationalError as e:
             print(f"数据库连接失败: {e}")
             raise
-        cursor = conn.cursor()
         
-        # 创建文本记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS text_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                char_count INTEGER
-            )
-        ''')
+        self.fts_available, self.trigram_available = sqlite_search_features()
+        # 迁移保证md5_hash上有唯一索引，单语句去重写入只取决于SQLite版本
+        self.upsert_available = sqlite3.sqlite_version_info >= (3, 35, 0)
+    
+    def _migrate(self, conn, version):
+        """依次执行版本号大于version的迁移，每个迁移一个事务"""
+        if version == 0 and not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+            # 新建的空数据库在创建表之前启用增量清理，空闲页可以由后台维护分批归还给文件系统；
+            # 切换到WAL时已经写入了文件头，需要VACUUM（没有任何表，很快）才能生效。
+            # 没有版本号的旧数据库可能很大，不在启动时VACUUM，需要时手动执行 python clipboard_maintenance.py convert 转换
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("VACUUM")
+        for target, name in self.MIGRATIONS:
+            if target <= version:
+                continue
+            # 立即获取写锁，同时启动的其他进程等待本进程完成迁移
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 其他进程可能已经完成了这个迁移
+                if conn.execute("PRAGMA user_version").fetchone()[0] < target:
+                    print(f"升级数据库结构到版本 {target}")
+                    getattr(self, name)(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    # 文本记录表：preview为内容的前PREVIEW_LENGTH个字符，byte_count为内容的UTF-8字节数
+    TEXT_RECORDS_SQL = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            preview TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            char_count INTEGER,
+            byte_count INTEGER,
+            md5_hash TEXT,
+            number INTEGER DEFAULT 1,
+            ts INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+    '''
+    
+    def _migrate_base_tables(self, cursor):
+        """
+        版本1：创建记录表和设置表，并把任何旧版本的表结构（包括旧版 clipboard_manager_main 中
+        独立的数据库类创建的表）补齐到同一结构：缺失的字段、重复的md5_hash、时间戳和文本内容表
+        """
+        # 创建文本记录表（只存放元数据和预览）
+        cursor.execute(self.TEXT_RECORDS_SQL.format(table="text_records"))
         
         # 检查并添加 md5_hash 字段（如果不存在）
         try:
@@ -88,6 +702,9 @@ class ClipboardDatabase:
             # 字段已存在，忽略错误
             pass
             
+        # 合并重复的md5_hash，否则无法创建唯一索引
+        self._merge_duplicate_text_records(cursor)
+        
         # 为md5_hash字段添加唯一性索引
         try:
             cursor.execute("CREATE UNIQUE INDEX idx_text_records_md5_hash ON text_records(md5_hash) WHERE md5_hash IS NOT NULL")
@@ -113,7 +730,8 @@ class ClipboardDatabase:
                 file_type TEXT,
                 md5_hash TEXT UNIQUE,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                number INTEGER DEFAULT 1
+                number INTEGER DEFAULT 1,
+                ts INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
             )
         ''')
         
@@ -123,6 +741,25 @@ class ClipboardDatabase:
         except sqlite3.OperationalError:
             # 字段已存在，忽略错误
             pass
+        
+        # 检查并添加 ts 字段（UTC纪元秒，用于排序和过期清理）
+        for table in ("text_records", "file_records"):
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN ts INTEGER")
+            except sqlite3.OperationalError:
+                # 字段已存在，忽略错误
+                pass
+            # 将旧记录的本地时间字符串转换为纪元秒（'utc'修饰符按本地时区换算）
+            cursor.execute(f'''
+                UPDATE {table} SET ts = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+                WHERE ts IS NULL AND timestamp IS NOT NULL
+            ''')
+        
+        # 旧版本的文本内容存放在text_records中，移到text_contents
+        self._split_text_contents(cursor)
+        
+        # 创建文本内容表
+        self._create_text_contents(cursor)
             
         # 创建设置表
         cursor.execute('''
@@ -175,260 +812,1399 @@ class ClipboardDatabase:
             # 字段已存在，忽略错误
             pass
         
-        conn.commit()
-        conn.close()
-    
-    def save_text_record(self, content):
-        """保存文本记录到数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 检查并添加 quota_bytes 字段（保存的文件总大小上限，0表示不限制）
+        try:
+            cursor.execute("ALTER TABLE settings ADD COLUMN quota_bytes INTEGER DEFAULT 0")
+        except sqlite3.OperationalError:
+            # 字段已存在，忽略错误
+            pass
         
-        # 计算文本内容的MD5值
-        md5_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+        # 检查并添加 eviction_policy 字段（超出配额时的淘汰顺序）
+        try:
+            cursor.execute("ALTER TABLE settings ADD COLUMN eviction_policy TEXT DEFAULT 'lru'")
+        except sqlite3.OperationalError:
+            # 字段已存在，忽略错误
+            pass
         
-        # 使用本地时间而不是UTC时间
-        local_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 创建按文件类型的配额表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_type_quotas (
+                file_type TEXT PRIMARY KEY,
+                max_bytes INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
         
-        try:
-            cursor.execute('''
-                INSERT INTO text_records (content, timestamp, char_count, md5_hash, number)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (content, local_time, len(content), md5_hash, 1))
-            
-            record_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return record_id
-        except sqlite3.IntegrityError:
-            # MD5已存在，更新记录并增加计数
-            cursor.execute('''
-                UPDATE text_records 
-                SET timestamp = ?, number = number + 1
-                WHERE md5_hash = ?
-            ''', (local_time, md5_hash))
-            
-            cursor.execute('SELECT id FROM text_records WHERE md5_hash = ?', (md5_hash,))
-            result = cursor.fetchone()
-            record_id = result[0] if result else None
-            conn.commit()
-            conn.close()
-            return record_id
-    
-    def save_file_record(self, original_path, saved_path, filename, file_size, file_type, md5_hash):
-        """保存文件记录到数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 创建复制事件表
+        self._create_copy_events(cursor)
         
-        # 使用本地时间而不是UTC时间
-        local_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 创建待删除文件日志表
+        self._create_pending_file_deletes(cursor)
+    
+    def _migrate_derived_structures(self, cursor):
+        """版本2：创建由触发器维护的统计、排序索引、时间线和搜索索引，并从已有记录回填"""
+        # 创建统计计数表
+        self._create_stats(cursor)
         
-        try:
-            cursor.execute('''
-                INSERT INTO file_records (original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (original_path, saved_path, filename, file_size, file_type, md5_hash, local_time, 1))
-            
-            record_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return record_id
-        except sqlite3.IntegrityError:
-            # MD5已存在，更新记录并增加计数
-            cursor.execute('''
-                UPDATE file_records 
-                SET original_path = ?, timestamp = ?, number = number + 1
-                WHERE md5_hash = ?
-            ''', (original_path, local_time, md5_hash))
-            
-            cursor.execute('SELECT id FROM file_records WHERE md5_hash = ?', (md5_hash,))
-            result = cursor.fetchone()
-            record_id = result[0] if result else None
-            conn.commit()
-            conn.close()
-            return record_id
-
-    def get_text_records(self, limit=None, offset=0, sort_by="timestamp", reverse=True):
-        """获取文本记录，支持排序"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 确定排序方向
-        order = "DESC" if reverse else "ASC"
-        
-        # 确定排序字段
-        if sort_by == "content":
-            sort_field = "content"
-        elif sort_by == "char_count":
-            sort_field = "char_count"
-        elif sort_by == "number":
-            sort_field = "number"
-        else:
-            sort_field = "timestamp"
+        # 创建分页排序索引
+        self._create_sort_indexes(cursor)
         
-        if limit is None:
-            # 获取所有记录
-            cursor.execute(f'''
-                SELECT id, content, timestamp, char_count, md5_hash, number
-                FROM text_records
-                ORDER BY {sort_field} {order}
-            ''')
-        else:
-            # 获取指定数量的记录
-            cursor.execute(f'''
-                SELECT id, content, timestamp, char_count, md5_hash, number
-                FROM text_records
-                ORDER BY {sort_field} {order}
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
+        # 创建合并时间线
+        self._create_timeline(cursor)
         
-        records = cursor.fetchall()
-        conn.close()
-        return records
-    
-    def get_file_records(self, limit=None, offset=0, sort_by="timestamp", reverse=True):
-        """获取文件记录，支持排序"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 确定排序方向
-        order = "DESC" if reverse else "ASC"
-        
-        # 确定排序字段
-        if sort_by == "filename":
-            sort_field = "filename"
-        elif sort_by == "file_size":
-            sort_field = "file_size"
-        elif sort_by == "file_type":
-            sort_field = "file_type"
-        elif sort_by == "number":
-            sort_field = "number"
-        else:
-            sort_field = "timestamp"
+        # 创建全文搜索索引
+        self._create_search_index(cursor)
         
-        if limit is None:
-            # 获取所有记录
+        # 创建子串搜索索引
+        self._create_trigram_index(cursor)
+    
+    def _migrate_maintenance_log(self, cursor):
+        """版本3：创建数据库维护日志表，记录每项维护任务的耗时以及执行前后的空闲页和碎片情况"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_log (
+                id INTEGER PRIMARY KEY,
+                ts INTEGER NOT NULL,
+                task TEXT NOT NULL,
+                duration_ms REAL,
+                page_count_before INTEGER,
+                freelist_before INTEGER,
+                page_count_after INTEGER,
+                freelist_after INTEGER,
+                fragmentation REAL,  -- 执行后B树页面不连续的比例，不支持dbstat时为NULL
+                detail TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_task ON maintenance_log(task, ts)")
+    
+    def _migrate_storage_profile(self, cursor):
+        """版本4：设置表增加存储配置字段"""
+        try:
+            cursor.execute(f"ALTER TABLE settings ADD COLUMN storage_profile TEXT DEFAULT '{DEFAULT_STORAGE_PROFILE}'")
+        except sqlite3.OperationalError:
+            # 字段已存在，忽略错误
+            pass
+    
+    def _migrate_change_log(self, cursor):
+        """
+        版本5：创建变更日志，由时间线上的触发器记录每条记录的插入、更新和删除，
+        seq 单调递增（AUTOINCREMENT，删除旧日志后也不会重复使用），界面据此只刷新变化的记录
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,  -- 'text' 或 'file'
+                record_id INTEGER NOT NULL,
+                op TEXT NOT NULL  -- 'insert'、'update' 或 'delete'
+            )
+        ''')
+        for op, event, row in (("insert", "INSERT", "new"), ("update", "UPDATE", "new"), ("delete", "DELETE", "old")):
             cursor.execute(f'''
-                SELECT id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number
-                FROM file_records
-                ORDER BY {sort_field} {order}
+                CREATE TRIGGER IF NOT EXISTS timeline_change_log_{op} AFTER {event} ON timeline BEGIN
+                    INSERT INTO change_log (kind, record_id, op) VALUES ({row}.kind, {row}.record_id, '{op}');
+                END
             ''')
-        else:
-            # 获取指定数量的记录
-            cursor.execute(f'''
-                SELECT id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number
-                FROM file_records
-                ORDER BY {sort_field} {order}
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
-        
-        records = cursor.fetchall()
-        conn.close()
-        return records
     
-    def get_all_records(self):
-        """获取所有记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def _merge_duplicate_text_records(self, cursor):
+        """
+        合并md5_hash相同的文本记录（唯一索引创建之前的旧版本可能重复保存同一内容）：
+        保留ID最大（最近保存）的记录，复制次数累加，时间取最近的一次
+        """
         cursor.execute('''
-            SELECT 'text' as type, id, content as info, timestamp
+            SELECT md5_hash, MAX(id), SUM(coalesce(number, 1)), MAX(timestamp)
             FROM text_records
-            UNION ALL
-            SELECT 'file' as type, id, filename as info, timestamp
-            FROM file_records
-            ORDER BY timestamp DESC
+            WHERE md5_hash IS NOT NULL
+            GROUP BY md5_hash
+            HAVING COUNT(*) > 1
         ''')
-        
-        records = cursor.fetchall()
-        conn.close()
-        return records
+        duplicates = cursor.fetchall()
+        for md5_hash, keep_id, number, timestamp in duplicates:
+            cursor.execute('UPDATE text_records SET number = ?, timestamp = ? WHERE id = ?', (number, timestamp, keep_id))
+            cursor.execute('DELETE FROM text_records WHERE md5_hash = ? AND id != ?', (md5_hash, keep_id))
+        if duplicates:
+            print(f"合并了 {len(duplicates)} 组重复的文本记录")
     
-    def search_records(self, keyword="", record_type="all"):
-        """搜索记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _create_text_contents(self, cursor):
+        """
+        创建文本内容表，与text_records按id一一对应
+        列表和统计只读取text_records，完整内容只在复制、查看和搜索时读取；文本记录删除时由触发器删除内容
+        较大的内容压缩存储（content为BLOB，codec为压缩算法），text_contents_plain视图返回解码后的文本，
+        全文索引以该视图为外部内容表
+        """
+        cursor.execute("PRAGMA table_info(text_contents)")
+        columns = {row[1] for row in cursor.fetchall()}
+        if columns and 'codec' not in columns:
+            # 旧版本的内容表没有编码列，全文索引和触发器直接读取content，删除后按解码后的内容重建
+            cursor.execute("ALTER TABLE text_contents ADD COLUMN codec TEXT")
+            for index in ('fts', 'trigram', 'grams'):
+                for event in ('ai', 'ad', 'au'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS text_contents_{index}_{event}")
+            for table in ('text_records_fts', 'text_records_trigram'):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
         
-        if record_type == "text":
-            cursor.execute('''
-                SELECT 'text' as type, id, content as info, timestamp
-                FROM text_records
-                WHERE content LIKE ?
-                ORDER BY timestamp DESC
-            ''', (f"%{keyword}%",))
-        elif record_type == "file":
-            cursor.execute('''
-                SELECT 'file' as type, id, filename as info, timestamp
-                FROM file_records
-                WHERE filename LIKE ?
-                ORDER BY timestamp DESC
-            ''', (f"%{keyword}%",))
-        else:  # all
-            cursor.execute('''
-                SELECT 'text' as type, id, content as info, timestamp
-                FROM text_records
-                WHERE content LIKE ?
-                UNION ALL
-                SELECT 'file' as type, id, filename as info, timestamp
-                FROM file_records
-                WHERE filename LIKE ?
-                ORDER BY timestamp DESC
-            ''', (f"%{keyword}%", f"%{keyword}%"))
-        
-        records = cursor.fetchall()
-        conn.close()
-        return records
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS text_contents (
+                id INTEGER PRIMARY KEY,  -- 与 text_records.id 相同
+                content TEXT NOT NULL,   -- 原文，或压缩后的BLOB
+                codec TEXT               -- NULL表示未压缩，否则为 TEXT_CODECS 中的算法名
+            )
+        ''')
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS text_contents_plain AS
+            SELECT id, CASE WHEN codec IS NULL THEN content ELSE decode_text(content, codec) END AS content
+            FROM text_contents
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_contents_ad AFTER DELETE ON text_records BEGIN
+                DELETE FROM text_contents WHERE id = old.id;
+            END
+        ''')
     
-    def get_statistics(self):
-        """获取统计信息"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _create_pending_file_deletes(self, cursor):
+        """
+        创建待删除文件日志表：过期清理在删除文件记录的同一事务中登记其保存的文件，
+        文件在事务之外删除，删除成功后才移出日志，程序中途退出后下次清理会继续删除
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pending_file_deletes (
+                path TEXT PRIMARY KEY
+            ) WITHOUT ROWID
+        ''')
+        # 删除文件前检查是否又有记录引用同一路径（同一天再次复制同一文件时保存路径相同）
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_records_saved_path ON file_records(saved_path)")
+    
+    def _split_text_contents(self, cursor):
+        """
+        迁移旧版本的文本记录：内容移到text_contents，重建不含内容列的text_records并生成预览和字节数
+        表重建后原表上的触发器和索引随之删除，文本搜索索引也一并删除，之后按新的表结构重新创建
+        """
+        cursor.execute("PRAGMA table_info(text_records)")
+        if 'content' not in {row[1] for row in cursor.fetchall()}:
+            return
         
-        # 获取文本记录数量
-        cursor.execute('SELECT COUNT(*) FROM text_records')
-        text_count = cursor.fetchone()[0]
+        self._create_text_contents(cursor)
+        cursor.execute("INSERT OR REPLACE INTO text_contents (id, content) SELECT id, content FROM text_records")
+        cursor.execute(self.TEXT_RECORDS_SQL.format(table="text_records_new"))
+        cursor.execute(f'''
+            INSERT INTO text_records_new (id, preview, timestamp, char_count, byte_count, md5_hash, number, ts)
+            SELECT id, substr(content, 1, {self.PREVIEW_LENGTH}), timestamp, char_count,
+                   length(CAST(content AS BLOB)), md5_hash, number, ts
+            FROM text_records
+        ''')
         
-        # 获取文件记录数量和总大小
-        cursor.execute('SELECT COUNT(*), SUM(file_size) FROM file_records')
-        file_result = cursor.fetchone()
-        file_count = file_result[0]
-        total_size = file_result[1] if file_result[1] else 0
+        # 保留自增序号，已删除记录的ID不会被重新使用
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'text_records'")
+        sequence = cursor.fetchone()
         
-        conn.close()
-        return text_count, file_count, total_size
-    
-    def delete_text_record(self, record_id):
-        """删除文本记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM text_records WHERE id = ?', (record_id,))
-        conn.commit()
-        conn.close()
-    
-    def delete_file_record(self, record_id):
-        """删除文件记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM file_records WHERE id = ?', (record_id,))
-        conn.commit()
-        conn.close()
+        for table in ('text_records_fts', 'text_records_trigram', 'text_records_grams'):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute("DROP TABLE text_records")
+        cursor.execute("ALTER TABLE text_records_new RENAME TO text_records")
+        
+        if sequence is not None:
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'text_records'")
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('text_records', ?)", sequence)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_text_records_md5_hash ON text_records(md5_hash) WHERE md5_hash IS NOT NULL")
     
-    def clear_all_records(self):
-        """清除所有记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM text_records')
-        cursor.execute('DELETE FROM file_records')
-        conn.commit()
-        conn.close()
+    def _create_copy_events(self, cursor):
+        """
+        创建复制事件表：一次复制多个文件（CF_HDROP）记为一个事件，copy_event_files记录事件包含的文件及顺序
+        文件记录删除时由触发器删除对应的关联，事件不再包含任何文件时一并删除
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS copy_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER,
+                timestamp DATETIME,
+                file_count INTEGER,
+                total_size INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS copy_event_files (
+                event_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                file_id INTEGER NOT NULL,
+                PRIMARY KEY (event_id, position)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_copy_event_files_file ON copy_event_files(file_id)")
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_copy_events_ad AFTER DELETE ON file_records BEGIN
+                DELETE FROM copy_event_files WHERE file_id = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS copy_event_files_ad AFTER DELETE ON copy_event_files BEGIN
+                DELETE FROM copy_events
+                WHERE id = old.event_id AND NOT EXISTS (SELECT 1 FROM copy_event_files WHERE event_id = old.event_id);
+            END
+        ''')
     
-    def get_settings(self):
-        """获取设置"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT max_copy_size, max_copy_count, unlimited_mode, retention_days, auto_start, float_icon, opacity, clipboard_type FROM settings WHERE id = 1')
-        result = cursor.fetchone()
-        conn.close()
-        
+    def _create_stats(self, cursor):
+        """
+        创建统计计数表，由触发器在插入、更新、删除时维护，读取统计信息不再扫描记录表
+        scope 为 'text'、'file' 的行是总计（key为空字符串），scope 为 'file_type' 的行按文件类型分类；
+        文本的 bytes 为内容的UTF-8字节数（byte_count列），文件的 bytes 为文件大小
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'")
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, key)
+            ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_stats_ai AFTER INSERT ON text_records BEGIN
+                UPDATE stats SET count = count + 1, bytes = bytes + coalesce(new.byte_count, 0)
+                WHERE scope = 'text' AND key = '';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_stats_au AFTER UPDATE OF byte_count ON text_records BEGIN
+                UPDATE stats SET bytes = bytes - coalesce(old.byte_count, 0) + coalesce(new.byte_count, 0)
+                WHERE scope = 'text' AND key = '';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_stats_ad AFTER DELETE ON text_records BEGIN
+                UPDATE stats SET count = count - 1, bytes = bytes - coalesce(old.byte_count, 0)
+                WHERE scope = 'text' AND key = '';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_stats_ai AFTER INSERT ON file_records BEGIN
+                UPDATE stats SET count = count + 1, bytes = bytes + coalesce(new.file_size, 0)
+                WHERE scope = 'file' AND key = '';
+                INSERT OR IGNORE INTO stats (scope, key) VALUES ('file_type', coalesce(new.file_type, ''));
+                UPDATE stats SET count = count + 1, bytes = bytes + coalesce(new.file_size, 0)
+                WHERE scope = 'file_type' AND key = coalesce(new.file_type, '');
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_stats_au AFTER UPDATE OF file_type, file_size ON file_records BEGIN
+                UPDATE stats SET bytes = bytes - coalesce(old.file_size, 0) + coalesce(new.file_size, 0)
+                WHERE scope = 'file' AND key = '';
+                UPDATE stats SET count = count - 1, bytes = bytes - coalesce(old.file_size, 0)
+                WHERE scope = 'file_type' AND key = coalesce(old.file_type, '');
+                INSERT OR IGNORE INTO stats (scope, key) VALUES ('file_type', coalesce(new.file_type, ''));
+                UPDATE stats SET count = count + 1, bytes = bytes + coalesce(new.file_size, 0)
+                WHERE scope = 'file_type' AND key = coalesce(new.file_type, '');
+                DELETE FROM stats WHERE scope = 'file_type' AND key = coalesce(old.file_type, '') AND count = 0;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_stats_ad AFTER DELETE ON file_records BEGIN
+                UPDATE stats SET count = count - 1, bytes = bytes - coalesce(old.file_size, 0)
+                WHERE scope = 'file' AND key = '';
+                UPDATE stats SET count = count - 1, bytes = bytes - coalesce(old.file_size, 0)
+                WHERE scope = 'file_type' AND key = coalesce(old.file_type, '');
+                DELETE FROM stats WHERE scope = 'file_type' AND key = coalesce(old.file_type, '') AND count = 0;
+            END
+        ''')
+        
+        # 新建统计表时从已有记录统计一次
+        if not exists:
+            self._rebuild_stats(cursor)
+    
+    def _rebuild_stats(self, cursor):
+        """扫描文本和文件记录，重新计算统计计数"""
+        cursor.execute("DELETE FROM stats")
+        cursor.execute('''
+            INSERT INTO stats (scope, key, count, bytes)
+            SELECT 'text', '', COUNT(*), coalesce(SUM(byte_count), 0) FROM text_records
+        ''')
+        cursor.execute('''
+            INSERT INTO stats (scope, key, count, bytes)
+            SELECT 'file', '', COUNT(*), coalesce(SUM(file_size), 0) FROM file_records
+        ''')
+        cursor.execute('''
+            INSERT INTO stats (scope, key, count, bytes)
+            SELECT 'file_type', coalesce(file_type, ''), COUNT(*), coalesce(SUM(file_size), 0)
+            FROM file_records GROUP BY coalesce(file_type, '')
+        ''')
+    
+    def _create_sort_indexes(self, cursor):
+        """为每个排序字段创建 (排序表达式, id) 复合索引，供游标分页和过期清理使用"""
+        for table, sort_keys in (("text_records", self.TEXT_SORT_KEYS), ("file_records", self.FILE_SORT_KEYS)):
+            for sort_by, expression in sort_keys.items():
+                # 删除按timestamp字符串建立的旧索引
+                cursor.execute(f"DROP INDEX IF EXISTS idx_{table}_sort_{sort_by}")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_by_{sort_by} ON {table}({expression}, id)")
+        
+        # 存储配额的淘汰顺序索引（lru的总量淘汰直接使用按时间排序的索引）
+        for policy, order in self.EVICTION_ORDERS.items():
+            if policy != "lru":
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_file_records_evict_{policy} ON file_records({order})")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_file_records_evict_{policy}_by_type ON file_records(file_type, {order})")
+    
+    def _create_timeline(self, cursor):
+        """
+        创建文本与文件记录合并的时间线表，由触发器在插入、更新、删除时同步
+        name 为文本预览或文件名，type 为'文本'或文件类型，size 对文本记为0
+        """
+        cursor.execute("PRAGMA table_info(timeline)")
+        columns = {row[1] for row in cursor.fetchall()}
+        exists = bool(columns)
+        if exists and 'ts' not in columns:
+            # 旧版时间线按timestamp字符串排序，删除后按ts列重建
+            for trigger in ('text_records_timeline_ai', 'text_records_timeline_au', 'text_records_timeline_ad',
+                            'file_records_timeline_ai', 'file_records_timeline_au', 'file_records_timeline_ad'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute("DROP TABLE timeline")
+            exists = False
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS timeline (
+                kind TEXT NOT NULL,  -- 'text' 或 'file'
+                record_id INTEGER NOT NULL,
+                name TEXT,
+                type TEXT,
+                size INTEGER,
+                ts INTEGER,
+                number INTEGER,
+                PRIMARY KEY (kind, record_id)
+            ) WITHOUT ROWID
+        ''')
+        for sort_by, expression in self.TIMELINE_SORT_KEYS.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_timeline_by_{sort_by} ON timeline({expression}, kind, record_id)")
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_timeline_ai AFTER INSERT ON text_records BEGIN
+                INSERT INTO timeline (kind, record_id, name, type, size, ts, number)
+                VALUES ('text', new.id, new.preview, '文本', 0, new.ts, new.number);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_timeline_au AFTER UPDATE OF preview, ts, number ON text_records BEGIN
+                UPDATE timeline SET name = new.preview, ts = new.ts, number = new.number
+                WHERE kind = 'text' AND record_id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_records_timeline_ad AFTER DELETE ON text_records BEGIN
+                DELETE FROM timeline WHERE kind = 'text' AND record_id = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_timeline_ai AFTER INSERT ON file_records BEGIN
+                INSERT INTO timeline (kind, record_id, name, type, size, ts, number)
+                VALUES ('file', new.id, new.filename, new.file_type, new.file_size, new.ts, new.number);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_timeline_au AFTER UPDATE OF filename, file_type, file_size, ts, number ON file_records BEGIN
+                UPDATE timeline SET name = new.filename, type = new.file_type, size = new.file_size,
+                                    ts = new.ts, number = new.number
+                WHERE kind = 'file' AND record_id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_timeline_ad AFTER DELETE ON file_records BEGIN
+                DELETE FROM timeline WHERE kind = 'file' AND record_id = old.id;
+            END
+        ''')
+        
+        # 新建时间线时从已有记录回填
+        if not exists:
+            self._rebuild_timeline(cursor)
+    
+    def _rebuild_timeline(self, cursor):
+        """从文本和文件记录重建时间线"""
+        cursor.execute("DELETE FROM timeline")
+        cursor.execute('''
+            INSERT INTO timeline (kind, record_id, name, type, size, ts, number)
+            SELECT 'text', id, preview, '文本', 0, ts, number FROM text_records
+        ''')
+        cursor.execute('''
+            INSERT INTO timeline (kind, record_id, name, type, size, ts, number)
+            SELECT 'file', id, filename, file_type, file_size, ts, number FROM file_records
+        ''')
+    
+    def _create_search_index(self, cursor):
+        """
+        创建FTS5全文索引（外部内容表，由触发器保持同步）
+        如果SQLite未编译FTS5模块，则搜索回退到LIKE查询
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('text_records_fts', 'file_records_fts')")
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS text_records_fts USING fts5(
+                    content,
+                    content='text_contents_plain',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            ''')
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS file_records_fts USING fts5(
+                    filename,
+                    original_path,
+                    content='file_records',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"全文索引不可用，搜索将使用LIKE查询: {e}")
+            self.fts_available = False
+            return
+        
+        # 文本内容触发器（去重时只更新text_records的时间和次数，不触发索引更新）
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_fts_ai AFTER INSERT ON text_contents BEGIN
+                INSERT INTO text_records_fts(rowid, content) VALUES (new.id, decode_text(new.content, new.codec));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_fts_ad AFTER DELETE ON text_contents BEGIN
+                INSERT INTO text_records_fts(text_records_fts, rowid, content) VALUES ('delete', old.id, decode_text(old.content, old.codec));
+            END
+        ''')
+        # 只改变编码（压缩已有内容）时文本不变，不需要更新索引
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_fts_au AFTER UPDATE OF content ON text_contents
+            WHEN old.codec IS new.codec BEGIN
+                INSERT INTO text_records_fts(text_records_fts, rowid, content) VALUES ('delete', old.id, decode_text(old.content, old.codec));
+                INSERT INTO text_records_fts(rowid, content) VALUES (new.id, decode_text(new.content, new.codec));
+            END
+        ''')
+        
+        # 文件记录触发器
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_fts_ai AFTER INSERT ON file_records BEGIN
+                INSERT INTO file_records_fts(rowid, filename, original_path) VALUES (new.id, new.filename, new.original_path);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_fts_ad AFTER DELETE ON file_records BEGIN
+                INSERT INTO file_records_fts(file_records_fts, rowid, filename, original_path) VALUES ('delete', old.id, old.filename, old.original_path);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_fts_au AFTER UPDATE OF filename, original_path ON file_records BEGIN
+                INSERT INTO file_records_fts(file_records_fts, rowid, filename, original_path) VALUES ('delete', old.id, old.filename, old.original_path);
+                INSERT INTO file_records_fts(rowid, filename, original_path) VALUES (new.id, new.filename, new.original_path);
+            END
+        ''')
+        
+        # 新建的索引需要从已有记录重建
+        if 'text_records_fts' not in existing:
+            cursor.execute("INSERT INTO text_records_fts(text_records_fts) VALUES ('rebuild')")
+        if 'file_records_fts' not in existing:
+            cursor.execute("INSERT INTO file_records_fts(file_records_fts) VALUES ('rebuild')")
+        
+        self.fts_available = True
+    
+    def _create_trigram_index(self, cursor):
+        """
+        创建子串搜索索引
+        三字及以上的查询使用FTS5的trigram分词器，1-2个中日韩字符的查询使用单字/双字倒排索引，
+        两者都不需要扫描全部记录；SQLite版本过低（<3.34）时回退到LIKE查询
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('text_records_trigram', 'file_records_trigram', 'text_records_grams')")
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS text_records_trigram USING fts5(
+                    content,
+                    content='text_contents_plain',
+                    content_rowid='id',
+                    tokenize='trigram'
+                )
+            ''')
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS file_records_trigram USING fts5(
+                    filename,
+                    original_path,
+                    content='file_records',
+                    content_rowid='id',
+                    tokenize='trigram'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"子串索引不可用，中文搜索将使用LIKE查询: {e}")
+            self.trigram_available = False
+            return
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_trigram_ai AFTER INSERT ON text_contents BEGIN
+                INSERT INTO text_records_trigram(rowid, content) VALUES (new.id, decode_text(new.content, new.codec));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_trigram_ad AFTER DELETE ON text_contents BEGIN
+                INSERT INTO text_records_trigram(text_records_trigram, rowid, content) VALUES ('delete', old.id, decode_text(old.content, old.codec));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_trigram_au AFTER UPDATE OF content ON text_contents
+            WHEN old.codec IS new.codec BEGIN
+                INSERT INTO text_records_trigram(text_records_trigram, rowid, content) VALUES ('delete', old.id, decode_text(old.content, old.codec));
+                INSERT INTO text_records_trigram(rowid, content) VALUES (new.id, decode_text(new.content, new.codec));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_trigram_ai AFTER INSERT ON file_records BEGIN
+                INSERT INTO file_records_trigram(rowid, filename, original_path) VALUES (new.id, new.filename, new.original_path);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_trigram_ad AFTER DELETE ON file_records BEGIN
+                INSERT INTO file_records_trigram(file_records_trigram, rowid, filename, original_path) VALUES ('delete', old.id, old.filename, old.original_path);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_trigram_au AFTER UPDATE OF filename, original_path ON file_records BEGIN
+                INSERT INTO file_records_trigram(file_records_trigram, rowid, filename, original_path) VALUES ('delete', old.id, old.filename, old.original_path);
+                INSERT INTO file_records_trigram(rowid, filename, original_path) VALUES (new.id, new.filename, new.original_path);
+            END
+        ''')
+        
+        # 单字/双字倒排索引：只存储记录ID（detail=none），文档内容由cjk_grams()函数生成，
+        # 片段之间以空格分隔，tokenchars保证假名中的标点符号不会把片段拆开
+        for table in ('text_records_grams', 'file_records_grams'):
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                    grams,
+                    content='',
+                    detail=none,
+                    columnsize=0,
+                    tokenize="unicode61 remove_diacritics 0 tokenchars '゛゜゠・'"
+                )
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_grams_ai AFTER INSERT ON text_contents BEGIN
+                INSERT INTO text_records_grams(rowid, grams) VALUES (new.id, cjk_grams(decode_text(new.content, new.codec)));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_grams_ad AFTER DELETE ON text_contents BEGIN
+                INSERT INTO text_records_grams(text_records_grams, rowid, grams) VALUES ('delete', old.id, cjk_grams(decode_text(old.content, old.codec)));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS text_contents_grams_au AFTER UPDATE OF content ON text_contents
+            WHEN old.codec IS new.codec BEGIN
+                INSERT INTO text_records_grams(text_records_grams, rowid, grams) VALUES ('delete', old.id, cjk_grams(decode_text(old.content, old.codec)));
+                INSERT INTO text_records_grams(rowid, grams) VALUES (new.id, cjk_grams(decode_text(new.content, new.codec)));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_grams_ai AFTER INSERT ON file_records BEGIN
+                INSERT INTO file_records_grams(rowid, grams) VALUES (new.id, cjk_grams(new.filename, new.original_path));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_grams_ad AFTER DELETE ON file_records BEGIN
+                INSERT INTO file_records_grams(file_records_grams, rowid, grams) VALUES ('delete', old.id, cjk_grams(old.filename, old.original_path));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_records_grams_au AFTER UPDATE OF filename, original_path ON file_records BEGIN
+                INSERT INTO file_records_grams(file_records_grams, rowid, grams) VALUES ('delete', old.id, cjk_grams(old.filename, old.original_path));
+                INSERT INTO file_records_grams(rowid, grams) VALUES (new.id, cjk_grams(new.filename, new.original_path));
+            END
+        ''')
+        
+        # 新建的索引需要从已有记录重建
+        if 'text_records_trigram' not in existing:
+            cursor.execute("INSERT INTO text_records_trigram(text_records_trigram) VALUES ('rebuild')")
+        if 'file_records_trigram' not in existing:
+            cursor.execute("INSERT INTO file_records_trigram(file_records_trigram) VALUES ('rebuild')")
+        if 'text_records_grams' not in existing:
+            self._rebuild_cjk_grams(cursor)
+        
+        self.trigram_available = True
+    
+    def _rebuild_cjk_grams(self, cursor):
+        """从已有记录重建单字/双字倒排索引"""
+        cursor.execute("INSERT INTO text_records_grams(text_records_grams) VALUES ('delete-all')")
+        cursor.execute("INSERT INTO file_records_grams(file_records_grams) VALUES ('delete-all')")
+        cursor.execute("INSERT INTO text_records_grams(rowid, grams) SELECT id, cjk_grams(content) FROM text_contents_plain")
+        cursor.execute("INSERT INTO file_records_grams(rowid, grams) SELECT id, cjk_grams(filename, original_path) FROM file_records")
+    
+    def rebuild_search_index(self):
+        """按需重建全文索引和子串索引"""
+        with self.connections.writer() as conn:
+            if self.fts_available:
+                conn.execute("INSERT INTO text_records_fts(text_records_fts) VALUES ('rebuild')")
+                conn.execute("INSERT INTO file_records_fts(file_records_fts) VALUES ('rebuild')")
+            if self.trigram_available:
+                conn.execute("INSERT INTO text_records_trigram(text_records_trigram) VALUES ('rebuild')")
+                conn.execute("INSERT INTO file_records_trigram(file_records_trigram) VALUES ('rebuild')")
+                self._rebuild_cjk_grams(conn.cursor())
+    
+    def _current_time(self):
+        """返回 (ts, timestamp)：ts用于排序和过期清理，timestamp保留本地时间字符串供旧版本读取"""
+        now = time.time()
+        return int(now), datetime.fromtimestamp(now).strftime(TIMESTAMP_FORMAT)
+    
+    def _upsert_text_record(self, cursor, content, md5_hash, ts, local_time, byte_count=None):
+        """在调用方的事务中写入一条文本记录（已存在则更新计数），返回记录ID"""
+        record_id, inserted = self._upsert_text_metadata(cursor, content, md5_hash, ts, local_time, byte_count)
+        if inserted:
+            # 内容只在第一次写入时保存，重复复制时只执行一条语句，也不再压缩
+            value, codec = encode_text(content, self.compression, self.compress_threshold)
+            cursor.execute("INSERT OR IGNORE INTO text_contents (id, content, codec) VALUES (?, ?, ?)", (record_id, value, codec))
+        return record_id
+    
+    def _upsert_text_metadata(self, cursor, content, md5_hash, ts, local_time, byte_count):
+        """写入或更新text_records中的元数据，返回 (记录ID, 是否为新插入的记录)"""
+        preview = content[:self.PREVIEW_LENGTH]
+        if byte_count is None:
+            byte_count = len(content.encode('utf-8'))
+        if self.upsert_available:
+            cursor.execute(self.TEXT_UPSERT_SQL, (preview, local_time, ts, len(content), byte_count, md5_hash))
+            record_id, inserted = cursor.fetchone()
+            return record_id, bool(inserted)
+        
+        try:
+            cursor.execute('''
+                INSERT INTO text_records (preview, timestamp, ts, char_count, byte_count, md5_hash, number)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (preview, local_time, ts, len(content), byte_count, md5_hash, 1))
+            return cursor.lastrowid, True
+        except sqlite3.IntegrityError:
+            # MD5已存在，更新记录并增加计数
+            cursor.execute('''
+                UPDATE text_records 
+                SET timestamp = ?, ts = ?, number = number + 1
+                WHERE md5_hash = ?
+            ''', (local_time, ts, md5_hash))
+            
+            cursor.execute('SELECT id FROM text_records WHERE md5_hash = ?', (md5_hash,))
+            result = cursor.fetchone()
+            return (result[0] if result else None), False
+    
+    def _upsert_file_record(self, cursor, original_path, saved_path, filename, file_size, file_type, md5_hash, ts, local_time):
+        """在调用方的事务中写入一条文件记录（已存在则更新原路径和计数），返回记录ID"""
+        if self.upsert_available:
+            cursor.execute(self.FILE_UPSERT_SQL, (original_path, saved_path, filename, file_size, file_type, md5_hash, local_time, ts))
+            return cursor.fetchone()[0]
+        
+        try:
+            cursor.execute('''
+                INSERT INTO file_records (original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, ts, number)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (original_path, saved_path, filename, file_size, file_type, md5_hash, local_time, ts, 1))
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            # MD5已存在，更新记录并增加计数
+            cursor.execute('''
+                UPDATE file_records 
+                SET original_path = ?, timestamp = ?, ts = ?, number = number + 1
+                WHERE md5_hash = ?
+            ''', (original_path, local_time, ts, md5_hash))
+            
+            cursor.execute('SELECT id FROM file_records WHERE md5_hash = ?', (md5_hash,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def save_text_record(self, content):
+        """保存文本记录到数据库"""
+        # 计算文本内容的MD5值
+        encoded = content.encode('utf-8')
+        md5_hash = hashlib.md5(encoded).hexdigest()
+        ts, local_time = self._current_time()
+        self.connections.touch()
+        
+        with self.connections.writer() as conn:
+            return self._upsert_text_record(conn.cursor(), content, md5_hash, ts, local_time, len(encoded))
+    
+    def save_file_record(self, original_path, saved_path, filename, file_size, file_type, md5_hash):
+        """保存文件记录到数据库"""
+        ts, local_time = self._current_time()
+        self.connections.touch()
+        
+        with self.connections.writer() as conn:
+            return self._upsert_file_record(conn.cursor(), original_path, saved_path, filename,
+                                            file_size, file_type, md5_hash, ts, local_time)
+
+    def save_file_records_many(self, files):
+        """
+        在一个事务中保存一次复制的多个文件，并记录为一个复制事件
+        files 为 (original_path, saved_path, filename, file_size, file_type, md5_hash) 的列表，
+        按顺序返回各文件的记录ID（与 save_file_record 的去重规则相同）
+        """
+        files = list(files)
+        if not files:
+            return []
+        ts, local_time = self._current_time()
+        self.connections.touch()
+        
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+            record_ids = [self._upsert_file_record(cursor, *file_info, ts, local_time) for file_info in files]
+            
+            cursor.execute('''
+                INSERT INTO copy_events (ts, timestamp, file_count, total_size)
+                VALUES (?, ?, ?, ?)
+            ''', (ts, local_time, len(files), sum(file_info[3] or 0 for file_info in files)))
+            event_id = cursor.lastrowid
+            cursor.executemany(
+                'INSERT INTO copy_event_files (event_id, position, file_id) VALUES (?, ?, ?)',
+                [(event_id, position, record_id) for position, record_id in enumerate(record_ids) if record_id is not None]
+            )
+            return record_ids
+    
+    def iter_text_records_for_export(self, batch_size=500):
+        """
+        按ID顺序逐条生成全部文本记录 (id, content, md5_hash, ts, number)，content为解压后的完整内容
+        每批一个按主键定位的短查询，不长时间占用读事务，内存占用与记录总数无关
+        """
+        last_id = 0
+        while True:
+            with self.connections.reader() as conn:
+                rows = conn.execute('''
+                    SELECT r.id, c.content, c.codec, r.md5_hash, r.ts, r.number
+                    FROM text_records r LEFT JOIN text_contents c ON c.id = r.id
+                    WHERE r.id > ? ORDER BY r.id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for record_id, content, codec, md5_hash, ts, number in rows:
+                yield record_id, decode_text(content, codec), md5_hash, ts, number
+            last_id = rows[-1][0]
+    
+    def iter_file_records_for_export(self, batch_size=500):
+        """
+        按ID顺序逐条生成全部文件记录
+        (id, original_path, saved_path, filename, file_size, file_type, md5_hash, ts, number)
+        """
+        last_id = 0
+        while True:
+            with self.connections.reader() as conn:
+                rows = conn.execute('''
+                    SELECT id, original_path, saved_path, filename, file_size, file_type, md5_hash, ts, number
+                    FROM file_records WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+    
+    def import_records(self, text_records=(), file_records=()):
+        """
+        在一个事务中导入一批记录，返回 (新增的记录数, 合并的记录数)
+        text_records 为 (content, ts, number) 的列表，md5_hash 由内容计算；
+        file_records 为 (original_path, saved_path, filename, file_size, file_type, md5_hash, ts, number) 的列表
+        md5_hash 已存在时合并为一条记录：时间取较新的一次，复制次数取较大值，重复导入同一份备份不会改变记录
+        """
+        added = merged = 0
+        self.connections.touch()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+            for content, ts, number in text_records:
+                encoded = content.encode('utf-8')
+                md5_hash = hashlib.md5(encoded).hexdigest()
+                local_time = datetime.fromtimestamp(ts).strftime(TIMESTAMP_FORMAT)
+                cursor.execute("SELECT id FROM text_records WHERE md5_hash = ?", (md5_hash,))
+                row = cursor.fetchone()
+                if row is not None:
+                    cursor.execute('''
+                        UPDATE text_records SET ts = MAX(ts, ?), timestamp = CASE WHEN ts < ? THEN ? ELSE timestamp END,
+                                                number = MAX(number, ?)
+                        WHERE id = ?
+                    ''', (ts, ts, local_time, number, row[0]))
+                    merged += 1
+                    continue
+                cursor.execute('''
+                    INSERT INTO text_records (preview, timestamp, ts, char_count, byte_count, md5_hash, number)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (content[:self.PREVIEW_LENGTH], local_time, ts, len(content), len(encoded), md5_hash, number))
+                value, codec = encode_text(content, self.compression, self.compress_threshold)
+                cursor.execute("INSERT INTO text_contents (id, content, codec) VALUES (?, ?, ?)",
+                               (cursor.lastrowid, value, codec))
+                added += 1
+            
+            for original_path, saved_path, filename, file_size, file_type, md5_hash, ts, number in file_records:
+                local_time = datetime.fromtimestamp(ts).strftime(TIMESTAMP_FORMAT)
+                cursor.execute("SELECT id FROM file_records WHERE md5_hash = ?", (md5_hash,))
+                row = cursor.fetchone()
+                if row is not None:
+                    # 已有的记录没有保存的文件时使用导入的文件
+                    cursor.execute('''
+                        UPDATE file_records SET ts = MAX(ts, ?), timestamp = CASE WHEN ts < ? THEN ? ELSE timestamp END,
+                                                number = MAX(number, ?), saved_path = coalesce(saved_path, ?)
+                        WHERE id = ?
+                    ''', (ts, ts, local_time, number, saved_path, row[0]))
+                    merged += 1
+                    continue
+                cursor.execute('''
+                    INSERT INTO file_records (original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, ts, number)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (original_path, saved_path, filename, file_size, file_type, md5_hash, local_time, ts, number))
+                added += 1
+        return added, merged
+    
+    def get_text_content(self, record_id):
+        """读取一条文本记录的完整内容，记录不存在时返回None"""
+        with self.connections.reader() as conn:
+            row = conn.execute("SELECT content, codec FROM text_contents WHERE id = ?", (record_id,)).fetchone()
+        return decode_text(*row) if row else None
+    
+    def get_text_contents(self, record_ids):
+        """批量读取文本记录的完整内容，返回 {记录ID: 内容}，不存在的记录不包含在结果中"""
+        record_ids = list(record_ids)
+        contents = {}
+        with self.connections.reader() as conn:
+            # 分批查询，避免超过SQLite的参数个数限制
+            for start in range(0, len(record_ids), 500):
+                batch = record_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                for record_id, content, codec in conn.execute(
+                        f"SELECT id, content, codec FROM text_contents WHERE id IN ({placeholders})", batch):
+                    contents[record_id] = decode_text(content, codec)
+        return contents
+    
+    def get_file_record(self, record_id):
+        """读取一条文件记录，格式同 get_file_records()，记录不存在时返回None"""
+        with self.connections.reader() as conn:
+            return conn.execute(f"SELECT {self.FILE_COLUMNS} FROM file_records WHERE id = ?", (record_id,)).fetchone()
+    
+    def get_saved_file_path(self, md5_hash):
+        """相同MD5的文件记录的保存路径，没有记录时返回None"""
+        with self.connections.reader() as conn:
+            row = conn.execute("SELECT saved_path FROM file_records WHERE md5_hash = ?", (md5_hash,)).fetchone()
+        return row[0] if row else None
+    
+    def get_copy_event_files(self, file_id):
+        """获取与指定文件在最近一次复制事件中一起复制的所有文件记录（按复制时的顺序）"""
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT f.id, f.original_path, f.saved_path, f.filename, f.file_size, f.file_type, f.md5_hash,
+                       {format_ts_sql('f.ts')} AS timestamp, f.number
+                FROM copy_event_files e
+                JOIN file_records f ON f.id = e.file_id
+                WHERE e.event_id = (SELECT MAX(event_id) FROM copy_event_files WHERE file_id = ?)
+                ORDER BY e.position
+            ''', (file_id,))
+            return cursor.fetchall()
+    
+    def get_text_records(self, limit=None, offset=0, sort_by="timestamp", reverse=True, after=None, before=None):
+        """
+        获取文本记录，支持排序
+        返回 (id, preview, timestamp, char_count, md5_hash, number, byte_count)，只包含预览不读取完整内容，
+        完整内容通过 get_text_content()/get_text_contents() 读取
+        after/before 为 get_page_cursor() 返回的游标，分别获取该记录之后/之前的一页，
+        游标分页的开销与页的深度无关；不传游标时按 limit/offset 分页
+        """
+        sort_expression = self.TEXT_SORT_KEYS.get(sort_by, "ts")
+        return self._get_records_page("text_records", self.TEXT_COLUMNS, sort_expression, ("id",),
+                                      limit, offset, reverse, after, before)
+    
+    def get_file_records(self, limit=None, offset=0, sort_by="timestamp", reverse=True, after=None, before=None):
+        """
+        获取文件记录，支持排序
+        after/before 的用法与 get_text_records() 相同
+        """
+        sort_expression = self.FILE_SORT_KEYS.get(sort_by, "ts")
+        return self._get_records_page("file_records", self.FILE_COLUMNS, sort_expression, ("id",),
+                                      limit, offset, reverse, after, before)
+    
+    def get_timeline(self, limit=None, offset=0, sort_by="timestamp", reverse=True, after=None, before=None):
+        """
+        获取文本与文件合并后的记录列表，一次索引查询完成排序和分页
+        返回 (kind, record_id, name, type, size, timestamp, number)，
+        sort_by 可为 timestamp/name/type/size/number，after/before 为 get_page_cursor(record, "timeline", sort_by) 返回的游标
+        """
+        sort_expression = self.TIMELINE_SORT_KEYS.get(sort_by, "ts")
+        return self._get_records_page("timeline", self.TIMELINE_COLUMNS, sort_expression, ("kind", "record_id"),
+                                      limit, offset, reverse, after, before)
+    
+    def _get_records_page(self, table, columns, sort_expression, key_columns, limit, offset, reverse, after, before):
+        """按 (排序表达式, 主键列) 排序读取一页记录"""
+        # before 需要反向扫描，取到结果后再恢复为原来的顺序
+        backwards = before is not None and after is None
+        descending = reverse != backwards
+        order = "DESC" if descending else "ASC"
+        key_order = ", ".join(f"{column} {order}" for column in key_columns)
+        cursor_value = after if after is not None else before
+        
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            if cursor_value is None:
+                sql = f"SELECT {columns} FROM {table} ORDER BY {sort_expression} {order}, {key_order}"
+                params = []
+                if limit is not None:
+                    sql += " LIMIT ? OFFSET ?"
+                    params.extend([limit, offset])
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            else:
+                segments = self._cursor_segments(sort_expression, key_columns, cursor_value, descending)
+                count = None if limit is None else limit + offset
+                rows = []
+                for where, params, segment_order in segments:
+                    remaining = -1 if count is None else count - len(rows)
+                    if remaining == 0:
+                        break
+                    cursor.execute(f"SELECT {columns} FROM {table} WHERE {where} ORDER BY {segment_order} LIMIT ?",
+                                   params + (remaining,))
+                    rows.extend(cursor.fetchall())
+                rows = rows[offset:]
+        
+        if backwards:
+            rows.reverse()
+        return rows
+    
+    def _cursor_segments(self, sort_expression, key_columns, cursor_value, descending):
+        """
+        按 (排序表达式, 主键列) 排序时排在游标之后的记录，分为几段返回 [(条件, 参数, 排序)]，
+        每段都能在复合索引上直接定位起点：先是与游标排序值相同、主键在游标之后的记录，再是排序值在游标之后的记录；
+        SQLite中NULL最小，降序时排在最后，升序时排在最前。排序值可能为NULL，不能直接比较行值
+        """
+        order = "DESC" if descending else "ASC"
+        compare = "<" if descending else ">"
+        key_sql = ", ".join(key_columns)
+        key_order = ", ".join(f"{column} {order}" for column in key_columns)
+        key_placeholders = ", ".join("?" for _ in key_columns)
+        sort_value, key_values = cursor_value[0], tuple(cursor_value[1:])
+        
+        segments = [(f"{sort_expression} IS ? AND ({key_sql}) {compare} ({key_placeholders})",
+                     (sort_value,) + key_values, key_order)]
+        if sort_value is not None:
+            segments.append((f"{sort_expression} {compare} ?", (sort_value,), f"{sort_expression} {order}, {key_order}"))
+            if descending:
+                segments.append((f"{sort_expression} IS NULL", (), key_order))
+        elif not descending:
+            segments.append((f"{sort_expression} IS NOT NULL", (), f"{sort_expression} {order}, {key_order}"))
+        return segments
+    
+    def get_page_cursor(self, record, record_type="text", sort_by="timestamp"):
+        """
+        根据 get_text_records()/get_file_records()/get_timeline() 返回的记录生成分页游标，
+        record_type 为 "text"、"file" 或 "timeline"
+        用当前页最后一条记录的游标作为 after 获取下一页，第一条记录的游标作为 before 获取上一页
+        """
+        # 时间排序按ts列，返回的timestamp只是格式化后的字符串，游标值需要读取记录的ts
+        if record_type == "timeline":
+            key = (record[0], record[1])
+            positions = {"name": 2, "type": 3, "size": 4, "number": 6}
+            if sort_by in positions:
+                return (record[positions[sort_by]],) + key
+            return (self._lookup_ts("timeline", "kind = ? AND record_id = ?", key, record[5]),) + key
+        
+        if record_type == "text":
+            if sort_by == "content":
+                return (record[1], record[0])
+            positions = {"char_count": 3, "number": 5}
+            if sort_by in positions:
+                return (record[positions[sort_by]], record[0])
+            return (self._lookup_ts("text_records", "id = ?", (record[0],), record[2]), record[0])
+        
+        positions = {"filename": 3, "file_size": 4, "file_type": 5, "number": 8}
+        if sort_by in positions:
+            return (record[positions[sort_by]], record[0])
+        return (self._lookup_ts("file_records", "id = ?", (record[0],), record[7]), record[0])
+    
+    def _lookup_ts(self, table, where, params, timestamp):
+        """读取记录的ts作为游标值；记录已被删除时由本地时间字符串换算"""
+        with self.connections.reader() as conn:
+            row = conn.execute(f"SELECT ts FROM {table} WHERE {where}", params).fetchone()
+            if row is None:
+                row = conn.execute("SELECT CAST(strftime('%s', ?, 'utc') AS INTEGER)", (timestamp,)).fetchone()
+        return row[0]
+    
+    def get_data_version(self):
+        """
+        返回 PRAGMA data_version，本进程的写入和其他进程提交修改后改变，
+        不读取数据库内容；值不变时不需要调用 changes_since()
+        """
+        return self.connections.data_version()
+    
+    def get_change_seq(self):
+        """返回当前的变更序号，在读取记录列表之前获取，之后用 changes_since() 读取列表之后的变化"""
+        with self.connections.reader() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+    
+    def changes_since(self, seq, limit=1000):
+        """
+        返回变更序号seq之后插入、更新和删除的记录：
+        {'seq': 最新的变更序号, 'inserted': [(kind, record_id)], 'updated': [...], 'deleted': [...]}
+        同一条记录的多次变化合并为一次（插入后又删除的记录不返回）；
+        seq之后的日志已被清理或变化超过limit条时返回None，调用方应重新加载整个列表
+        """
+        with self.connections.reader() as conn:
+            rows = conn.execute('''
+                SELECT seq, kind, record_id, op FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (seq, limit + 1)).fetchall()
+            first_seq = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+            if first_seq is None:
+                row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+                first_seq = (row[0] if row else 0) + 1
+        if seq < first_seq - 1 or len(rows) > limit:
+            return None
+        
+        # (kind, record_id) -> [第一次的操作, 最后一次的操作]，字典保持第一次出现的顺序
+        operations = {}
+        for _, kind, record_id, op in rows:
+            operations.setdefault((kind, record_id), [op, op])[1] = op
+        changes = {'seq': rows[-1][0] if rows else seq, 'inserted': [], 'updated': [], 'deleted': []}
+        for key, (first, last) in operations.items():
+            if first == 'insert':
+                if last != 'delete':
+                    changes['inserted'].append(key)
+            elif last == 'delete':
+                changes['deleted'].append(key)
+            else:
+                changes['updated'].append(key)
+        return changes
+    
+    def get_timeline_positions(self, keys, sort_by="timestamp", reverse=True):
+        """
+        读取时间线中指定的记录及其在排序中的位置，返回 [(位置, 游标, 记录)]，按位置排列
+        位置为按该排序排在它之前的记录数，游标同 get_page_cursor()，记录格式同 get_timeline()；
+        已被删除的记录不返回。用于把 changes_since() 返回的变化插入已加载的列表
+        """
+        sort_expression = self.TIMELINE_SORT_KEYS.get(sort_by, "ts")
+        results = []
+        with self.connections.reader() as conn:
+            for kind, record_id in keys:
+                row = conn.execute(f'''
+                    SELECT {sort_expression}, {self.TIMELINE_COLUMNS} FROM timeline WHERE kind = ? AND record_id = ?
+                ''', (kind, record_id)).fetchone()
+                if row is None:
+                    continue
+                cursor = (row[0], kind, record_id)
+                # 排在它之前的记录即反向排序时排在它之后的记录（排序值为NULL时也成立），
+                # 在 (排序表达式, kind, record_id) 索引上分段计数，新记录通常排在前面，计数范围很小
+                position = sum(
+                    conn.execute(f"SELECT COUNT(*) FROM timeline WHERE {where}", params).fetchone()[0]
+                    for where, params, _ in self._cursor_segments(sort_expression, ("kind", "record_id"), cursor, not reverse))
+                results.append((position, cursor, row[1:]))
+        results.sort(key=lambda item: item[0])
+        return results
+    
+    def prune_change_log(self, keep=10000):
+        """只保留最近的keep条变更日志，返回删除的条数"""
+        with self.connections.writer() as conn:
+            cursor = conn.execute('''
+                DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?
+            ''', (keep,))
+            return cursor.rowcount
+    
+    def get_all_records(self):
+        """获取所有记录（文本记录返回预览）"""
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            # 通过时间线索引排序
+            cursor.execute(f'''
+                SELECT kind as type, record_id as id, name as info,
+                       {format_ts_sql()} as timestamp
+                FROM timeline
+                ORDER BY ts DESC, kind DESC, record_id DESC
+            ''')
+            return cursor.fetchall()
+    
+    def search_records(self, keyword="", record_type="all", limit=None, offset=0, mode="auto"):
+        """
+        搜索记录
+        返回 (type, id, info, timestamp, snippet, size, number, file_type)，
+        其中info对文本为预览、对文件为文件名，size对文本为字符数、对文件为文件大小
+        mode:
+            auto      - 关键词包含中日韩字符时按子串搜索，否则按词搜索
+            fts       - 按词（前缀）搜索，按bm25相关度排序
+            substring - 任意子串搜索，结果与LIKE一致
+            like      - 直接使用LIKE查询
+        """
+        if not keyword.strip():
+            return self._search_records_like(keyword, record_type, limit, offset)
+        
+        if mode == "auto":
+            mode = "substring" if contains_cjk(keyword) else "fts"
+        
+        if mode == "fts" and self.fts_available:
+            return self._search_records_fts(build_fts_query(keyword), keyword, 'fts', record_type, limit, offset)
+        
+        if mode == "substring" and self.trigram_available:
+            if len(keyword) >= 3:
+                # 三元组索引：整个关键词作为一个短语，即连续的三元组序列
+                query = '"' + keyword.replace('"', '""') + '"'
+                return self._search_records_fts(query, keyword, 'trigram', record_type, limit, offset)
+            if all(is_cjk_char(char) for char in keyword):
+                return self._search_records_grams(keyword, record_type, limit, offset)
+        
+        return self._search_records_like(keyword, record_type, limit, offset)
+    
+    def _search_records_fts(self, query, keyword, index, record_type, limit, offset):
+        """
+        使用FTS5索引（'fts'全文索引或'trigram'子串索引）搜索，按bm25相关度排序并生成摘要（最多 SNIPPET_MAX_LENGTH 个字符）
+        分页时只在最新的SEARCH_RANK_WINDOW条命中记录中排序，避免常见词命中大量记录时对全部结果计算相关度
+        """
+        count = None if limit is None else limit + offset
+        
+        results = []
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            if record_type in ("text", "all"):
+                results.append(self._search_fts_table(cursor, 'text', index, query, count))
+            if record_type in ("file", "all"):
+                results.append(self._search_fts_table(cursor, 'file', index, query, count))
+        
+        # 合并两个索引的结果（各自已按相关度排序）
+        merged = heapq.merge(*results, key=lambda row: row[-1])
+        if limit is not None:
+            merged = itertools.islice(merged, offset, offset + limit)
+        return [row[:4] + (clip_snippet(row[4], keyword, self.SNIPPET_MAX_LENGTH),) + row[5:-1] for row in merged]
+    
+    def _search_fts_table(self, cursor, kind, index, query, count):
+        """在单个FTS5索引中搜索，返回按相关度排序的记录（最后一列为相关度）"""
+        if kind == 'text':
+            fts_table = f'text_records_{index}'
+            sql = f'''
+                SELECT 'text' as type, t.id, t.preview as info, {format_ts_sql('t.ts')} as timestamp,
+                       snippet({fts_table}, 0, '', '', '...', 16) as snippet,
+                       t.char_count as size, t.number, NULL as file_type, rank
+                FROM {fts_table}
+                JOIN text_records t ON t.id = {fts_table}.rowid
+                WHERE {fts_table} MATCH ?
+            '''
+        else:
+            fts_table = f'file_records_{index}'
+            sql = f'''
+                SELECT 'file' as type, f.id, f.filename as info, {format_ts_sql('f.ts')} as timestamp,
+                       snippet({fts_table}, -1, '', '', '...', 16) as snippet,
+                       f.file_size as size, f.number, f.file_type, rank
+                FROM {fts_table}
+                JOIN file_records f ON f.id = {fts_table}.rowid
+                WHERE {fts_table} MATCH ?
+            '''
+        params = [query]
+        
+        if count is not None:
+            # 确定排序窗口的起点：最新的SEARCH_RANK_WINDOW条命中记录
+            cursor.execute(f'''
+                SELECT MIN(rowid) FROM (
+                    SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?
+                    ORDER BY rowid DESC LIMIT ?
+                )
+            ''', (query, max(count, self.SEARCH_RANK_WINDOW)))
+            floor = cursor.fetchone()[0]
+            if floor is None:
+                return []
+            sql += f" AND {fts_table}.rowid >= ? ORDER BY rank LIMIT ?"
+            params.extend([floor, count])
+        else:
+            sql += " ORDER BY rank"
+        
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    
+    def _search_records_grams(self, keyword, record_type, limit, offset):
+        """使用单字/双字倒排索引搜索1-2个中日韩字符的关键词，按时间倒序返回"""
+        query = '"' + keyword + '"'
+        count = None if limit is None else limit + offset
+        limit_sql = "" if count is None else " LIMIT ?"
+        tail = [] if count is None else [count]
+        
+        rows = []
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            if record_type in ("text", "all"):
+                cursor.execute(f'''
+                    SELECT 'text' as type, t.id, t.preview as info, {format_ts_sql('t.ts')} as timestamp, NULL as snippet,
+                           t.char_count as size, t.number, NULL as file_type, t.ts
+                    FROM text_records_grams g
+                    JOIN text_records t ON t.id = g.rowid
+                    WHERE text_records_grams MATCH ?
+                    ORDER BY g.rowid DESC
+                ''' + limit_sql, [query] + tail)
+                rows.extend(cursor.fetchall())
+            if record_type in ("file", "all"):
+                cursor.execute(f'''
+                    SELECT 'file' as type, f.id, f.filename as info, {format_ts_sql('f.ts')} as timestamp, NULL as snippet,
+                           f.file_size as size, f.number, f.file_type, f.ts
+                    FROM file_records_grams g
+                    JOIN file_records f ON f.id = g.rowid
+                    WHERE file_records_grams MATCH ?
+                    ORDER BY g.rowid DESC
+                ''' + limit_sql, [query] + tail)
+                rows.extend(cursor.fetchall())
+        
+        # 最后一列为ts，仅用于排序
+        rows.sort(key=lambda row: row[-1] or 0, reverse=True)
+        if limit is not None:
+            rows = rows[offset:offset + limit]
+        # 生成命中位置附近的摘要，文本只读取当前页的完整内容；
+        # 不分页时可能命中大量记录，不读取完整内容，只在预览（内容的开头）中生成摘要
+        contents = {} if limit is None else self.get_text_contents(row[1] for row in rows if row[0] == 'text')
+        return [row[:4] + (make_snippet(contents.get(row[1], row[2]) if row[0] == 'text' else row[2], keyword),) + row[5:-1]
+                for row in rows]
+    
+    def _search_records_like(self, keyword, record_type, limit, offset):
+        """使用LIKE模糊匹配搜索（无全文索引或关键词为空时使用），关键词中的 % 和 _ 按普通字符匹配"""
+        pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        # 关键词为空时匹配全部记录，不需要读取文本内容
+        text_condition = "JOIN text_contents_plain c ON c.id = t.id WHERE c.content LIKE ? ESCAPE '\\'" if keyword else "WHERE ? = '%%'"
+        text_sql = f'''
+            SELECT 'text' as type, t.id, t.preview as info, {format_ts_sql('t.ts')} as timestamp, NULL as snippet,
+                   t.char_count as size, t.number, NULL as file_type, t.ts
+            FROM text_records t
+            {text_condition}
+        '''
+        file_sql = f'''
+            SELECT 'file' as type, id, filename as info, {format_ts_sql()} as timestamp, NULL as snippet,
+                   file_size as size, number, file_type, ts
+            FROM file_records
+            WHERE filename LIKE ? ESCAPE '\\' OR original_path LIKE ? ESCAPE '\\'
+        '''
+        
+        if record_type == "text":
+            sql, params = text_sql, [pattern]
+        elif record_type == "file":
+            sql, params = file_sql, [pattern, pattern]
+        else:  # all
+            sql, params = text_sql + " UNION ALL " + file_sql, [pattern, pattern, pattern]
+        
+        sql += " ORDER BY ts DESC"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            # 最后一列为ts，仅用于排序
+            return [row[:-1] for row in cursor.fetchall()]
+    
+    def get_statistics(self):
+        """获取统计信息：(文本记录数, 文件记录数, 文件总大小)，读取触发器维护的计数"""
+        with self.connections.reader() as conn:
+            rows = dict(
+                (scope, (count, size)) for scope, count, size in
+                conn.execute("SELECT scope, count, bytes FROM stats WHERE scope IN ('text', 'file') AND key = ''")
+            )
+        
+        text_count = rows.get('text', (0, 0))[0]
+        file_count, total_size = rows.get('file', (0, 0))
+        return text_count, file_count, total_size
+    
+    def get_detailed_statistics(self):
+        """
+        获取详细统计信息
+        返回字典：text_count, text_bytes, file_count, file_bytes，
+        以及 file_types（文件类型 -> (记录数, 总大小)，按记录数从多到少排列）
+        """
+        with self.connections.reader() as conn:
+            rows = conn.execute("SELECT scope, key, count, bytes FROM stats").fetchall()
+        
+        statistics = {'text_count': 0, 'text_bytes': 0, 'file_count': 0, 'file_bytes': 0, 'file_types': {}}
+        file_types = []
+        for scope, key, count, size in rows:
+            if scope in ('text', 'file'):
+                statistics[f'{scope}_count'] = count
+                statistics[f'{scope}_bytes'] = size
+            elif scope == 'file_type':
+                file_types.append((key, count, size))
+        file_types.sort(key=lambda item: (-item[1], item[0]))
+        statistics['file_types'] = {key: (count, size) for key, count, size in file_types}
+        return statistics
+
+    def get_text_storage_statistics(self):
+        """
+        获取文本内容的存储统计
+        返回 {编码: (记录数, 原始字节数, 存储字节数)}，未压缩的内容编码为None
+        """
+        with self.connections.reader() as conn:
+            rows = conn.execute('''
+                SELECT c.codec, COUNT(*), SUM(r.byte_count),
+                       SUM(CASE WHEN c.codec IS NULL THEN r.byte_count ELSE length(c.content) END)
+                FROM text_contents c
+                JOIN text_records r ON r.id = c.id
+                GROUP BY c.codec
+            ''').fetchall()
+        return {codec: (count, raw_bytes or 0, stored_bytes or 0) for codec, count, raw_bytes, stored_bytes in rows}
+
+    def compress_text_contents(self, codec=None, threshold=None, batch_size=100):
+        """
+        压缩已保存的未压缩文本内容（例如启用压缩之前保存的记录），返回 (压缩的记录数, 节省的字节数)
+        每批记录使用一个短事务，期间不会长时间阻塞剪贴板记录的写入
+        """
+        codec = codec or self.compression
+        threshold = self.compress_threshold if threshold is None else threshold
+        if codec is None:
+            return 0, 0
+
+        compressed_count = 0
+        saved_bytes = 0
+        last_id = 0
+        while True:
+            with self.connections.writer() as conn:
+                rows = conn.execute('''
+                    SELECT c.id, c.content
+                    FROM text_contents c
+                    JOIN text_records r ON r.id = c.id
+                    WHERE c.codec IS NULL AND r.byte_count >= ? AND c.id > ?
+                    ORDER BY c.id
+                    LIMIT ?
+                ''', (threshold, last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                for record_id, content in rows:
+                    value, value_codec = encode_text(content, codec, threshold)
+                    if value_codec is None:
+                        continue
+                    conn.execute("UPDATE text_contents SET content = ?, codec = ? WHERE id = ?",
+                                 (value, value_codec, record_id))
+                    compressed_count += 1
+                    saved_bytes += len(content.encode('utf-8')) - len(value)
+                last_id = rows[-1][0]
+        return compressed_count, saved_bytes
+
+    def delete_text_record(self, record_id):
+        """删除文本记录"""
+        with self.connections.writer() as conn:
+            conn.execute('DELETE FROM text_records WHERE id = ?', (record_id,))
+    
+    def delete_file_record(self, record_id):
+        """删除文件记录"""
+        with self.connections.writer() as conn:
+            conn.execute('DELETE FROM file_records WHERE id = ?', (record_id,))
+    
+    def clear_all_records(self):
+        """清除所有记录"""
+        with self.connections.writer() as conn:
+            conn.execute('DELETE FROM text_records')
+            conn.execute('DELETE FROM file_records')
+    
+    def get_settings(self):
+        """获取设置（读取内存缓存，不访问数据库）"""
+        return self.settings_store.get(self._load_settings)
+    
+    def reload_settings(self):
+        """从数据库重新读取设置并通知订阅者（用于设置在其他地方被修改后）"""
+        self.settings_store.refresh(self._load_settings)
+    
+    def subscribe_settings(self, callback):
+        """订阅设置变化，callback(settings, changed_keys) 在修改设置的线程中调用"""
+        self.settings_store.subscribe(callback)
+    
+    def unsubscribe_settings(self, callback):
+        """取消订阅设置变化"""
+        self.settings_store.unsubscribe(callback)
+    
+    def _load_settings(self):
+        """从数据库读取设置"""
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT max_copy_size, max_copy_count, unlimited_mode, retention_days, auto_start, float_icon, opacity, clipboard_type, quota_bytes, eviction_policy, storage_profile FROM settings WHERE id = 1')
+            result = cursor.fetchone()
+            cursor.execute('SELECT file_type, max_bytes FROM file_type_quotas')
+            file_type_quotas = dict(cursor.fetchall())
+        
         if result:
             return {
                 'max_copy_size': result[0],
@@ -438,7 +2214,11 @@ class ClipboardDatabase:
                 'auto_start': bool(result[4]),
                 'float_icon': bool(result[5]),
                 'opacity': result[6],
-                'clipboard_type': result[7]
+                'clipboard_type': result[7],
+                'quota_bytes': result[8] or 0,
+                'eviction_policy': result[9] or 'lru',
+                'storage_profile': result[10] if result[10] in STORAGE_PROFILES else DEFAULT_STORAGE_PROFILE,
+                'file_type_quotas': file_type_quotas
             }
         else:
             # 返回默认设置
@@ -450,80 +2230,279 @@ class ClipboardDatabase:
                 'auto_start': False,
                 'float_icon': False,
                 'opacity': 15,  # 默认透明度15%
-                'clipboard_type': 'all'  # 默认记录所有类型
+                'clipboard_type': 'all',  # 默认记录所有类型
+                'quota_bytes': 0,  # 不限制保存的文件总大小
+                'eviction_policy': 'lru',
+                'storage_profile': DEFAULT_STORAGE_PROFILE,
+                'file_type_quotas': {}
             }
     
-    def update_settings(self, max_copy_size=None, max_copy_count=None, unlimited_mode=None, retention_days=None, auto_start=None, float_icon=None, opacity=None, clipboard_type=None):
-        """更新设置"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if max_copy_size is not None:
-            cursor.execute('UPDATE settings SET max_copy_size = ? WHERE id = 1', (max_copy_size,))
-        
-        if max_copy_count is not None:
-            cursor.execute('UPDATE settings SET max_copy_count = ? WHERE id = 1', (max_copy_count,))
+    def update_settings(self, max_copy_size=None, max_copy_count=None, unlimited_mode=None, retention_days=None, auto_start=None, float_icon=None, opacity=None, clipboard_type=None,
+                        quota_bytes=None, eviction_policy=None, file_type_quotas=None, storage_profile=None):
+        """
+        更新设置
+        quota_bytes 为保存的文件总大小上限（0表示不限制），eviction_policy 为 EVICTION_ORDERS 中的淘汰顺序，
+        file_type_quotas 为 {文件类型: 大小上限}，替换全部按类型的配额，
+        storage_profile 为 STORAGE_PROFILES 中的存储配置，保存后立即应用到当前的连接
+        """
+        if eviction_policy is not None and eviction_policy not in self.EVICTION_ORDERS:
+            raise ValueError(f"未知的淘汰策略: {eviction_policy}")
+        if storage_profile is not None and storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"未知的存储配置: {storage_profile}")
         
-        if unlimited_mode is not None:
-            cursor.execute('UPDATE settings SET unlimited_mode = ? WHERE id = 1', (int(unlimited_mode),))
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+            
+            if max_copy_size is not None:
+                cursor.execute('UPDATE settings SET max_copy_size = ? WHERE id = 1', (max_copy_size,))
             
-        if retention_days is not None:
-            cursor.execute('UPDATE settings SET retention_days = ? WHERE id = 1', (retention_days,))
+            if max_copy_count is not None:
+                cursor.execute('UPDATE settings SET max_copy_count = ? WHERE id = 1', (max_copy_count,))
             
-        if auto_start is not None:
-            cursor.execute('UPDATE settings SET auto_start = ? WHERE id = 1', (int(auto_start),))
+            if unlimited_mode is not None:
+                cursor.execute('UPDATE settings SET unlimited_mode = ? WHERE id = 1', (int(unlimited_mode),))
+                
+            if retention_days is not None:
+                cursor.execute('UPDATE settings SET retention_days = ? WHERE id = 1', (retention_days,))
+                
+            if auto_start is not None:
+                cursor.execute('UPDATE settings SET auto_start = ? WHERE id = 1', (int(auto_start),))
+                
+            if float_icon is not None:
+                cursor.execute('UPDATE settings SET float_icon = ? WHERE id = 1', (int(float_icon),))
+                
+            if opacity is not None:
+                cursor.execute('UPDATE settings SET opacity = ? WHERE id = 1', (opacity,))
+                
+            if clipboard_type is not None:
+                cursor.execute('UPDATE settings SET clipboard_type = ? WHERE id = 1', (clipboard_type,))
             
-        if float_icon is not None:
-            cursor.execute('UPDATE settings SET float_icon = ? WHERE id = 1', (int(float_icon),))
+            if quota_bytes is not None:
+                cursor.execute('UPDATE settings SET quota_bytes = ? WHERE id = 1', (quota_bytes,))
             
-        if opacity is not None:
-            cursor.execute('UPDATE settings SET opacity = ? WHERE id = 1', (opacity,))
+            if eviction_policy is not None:
+                cursor.execute('UPDATE settings SET eviction_policy = ? WHERE id = 1', (eviction_policy,))
             
-        if clipboard_type is not None:
-            cursor.execute('UPDATE settings SET clipboard_type = ? WHERE id = 1', (clipboard_type,))
+            if file_type_quotas is not None:
+                cursor.execute('DELETE FROM file_type_quotas')
+                cursor.executemany('INSERT INTO file_type_quotas (file_type, max_bytes) VALUES (?, ?)',
+                                   [(file_type, max_bytes) for file_type, max_bytes in file_type_quotas.items() if max_bytes > 0])
+            
+            if storage_profile is not None:
+                cursor.execute('UPDATE settings SET storage_profile = ? WHERE id = 1', (storage_profile,))
         
-        conn.commit()
-        conn.close()
-    
-    def delete_expired_records(self):
-        """删除过期记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if storage_profile is not None:
+            self.connections.set_profile(storage_profile)
         
-        # 获取保留天数设置
-        settings = self.get_settings()
-        retention_days = settings['retention_days']
-        
-        # 如果设置为永久保存（0天）则不删除任何记录
+        # 刷新设置缓存并通知订阅者
+        self.reload_settings()
+    
+    def get_expired_ts(self):
+        """按保留天数设置计算过期时间（纪元秒），永久保存时返回None"""
+        retention_days = self.get_settings()['retention_days']
         if retention_days <= 0:
-            conn.close()
+            return None
+        return int(time.time()) - retention_days * 86400
+    
+    def delete_expired_chunk(self, expired_ts, limit=500):
+        """
+        在一个短事务中删除最多limit条过期文本记录和limit条过期文件记录，返回 (文本记录数, 文件记录数)
+        被删除的文件记录保存的文件登记到pending_file_deletes，由调用方在事务之外删除
+        """
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM text_records WHERE id IN (
+                    SELECT id FROM text_records WHERE ts < ? ORDER BY ts LIMIT ?
+                )
+            ''', (expired_ts, limit))
+            text_count = cursor.rowcount
+            
+            cursor.execute('SELECT id FROM file_records WHERE ts < ? ORDER BY ts LIMIT ?', (expired_ts, limit))
+            file_ids = [row[0] for row in cursor.fetchall()]
+            self._delete_file_records(cursor, file_ids)
+        return text_count, len(file_ids)
+    
+    def _delete_file_records(self, cursor, file_ids):
+        """在调用方的事务中删除文件记录，并将其保存的文件登记到pending_file_deletes"""
+        if not file_ids:
             return
+        placeholders = ", ".join("?" for _ in file_ids)
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO pending_file_deletes (path)
+            SELECT saved_path FROM file_records WHERE id IN ({placeholders}) AND saved_path IS NOT NULL
+        ''', file_ids)
+        cursor.execute(f'DELETE FROM file_records WHERE id IN ({placeholders})', file_ids)
+    
+    def get_quota_excess(self, file_types=None):
+        """
+        返回超出存储配额的字节数 {配额: 超出字节数}，总量配额的键为None，按类型的配额的键为文件类型
+        只读取统计表中对应的行，file_types 为空时检查所有设置了配额的类型
+        """
+        settings = self.get_settings()
+        quotas = settings['file_type_quotas']
+        if file_types is not None:
+            quotas = {file_type: quotas[file_type] for file_type in file_types if file_type in quotas}
         
-        # 计算过期时间
-        from datetime import datetime, timedelta
-        expired_date = datetime.now() - timedelta(days=retention_days)
-        expired_date_str = expired_date.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 删除过期的文本记录
-        cursor.execute('SELECT id FROM text_records WHERE timestamp < ?', (expired_date_str,))
-        text_records_to_delete = cursor.fetchall()
-        
-        cursor.execute('DELETE FROM text_records WHERE timestamp < ?', (expired_date_str,))
-        
-        # 删除过期的文件记录
-        cursor.execute('SELECT saved_path FROM file_records WHERE timestamp < ?', (expired_date_str,))
-        file_paths_to_delete = cursor.fetchall()
-        
-        cursor.execute('DELETE FROM file_records WHERE timestamp < ?', (expired_date_str,))
-        
-        conn.commit()
-        conn.close()
+        excess = {}
+        with self.connections.reader() as conn:
+            if settings['quota_bytes'] > 0:
+                row = conn.execute("SELECT bytes FROM stats WHERE scope = 'file' AND key = ''").fetchone()
+                if row and row[0] > settings['quota_bytes']:
+                    excess[None] = row[0] - settings['quota_bytes']
+            for file_type, max_bytes in quotas.items():
+                row = conn.execute("SELECT bytes FROM stats WHERE scope = 'file_type' AND key = ?", (file_type,)).fetchone()
+                if row and row[0] > max_bytes:
+                    excess[file_type] = row[0] - max_bytes
+        return excess
+    
+    def evict_over_quota_chunk(self, limit=500):
+        """
+        在一个短事务中按淘汰策略删除最多limit条文件记录，使超出的配额回到上限以内，返回删除的记录数
+        每次处理一个超出的配额，调用方重复调用直到返回0；保存的文件登记到pending_file_deletes
+        """
+        order = self.EVICTION_ORDERS[self.get_settings()['eviction_policy']]
+        with self.connections.writer() as conn:
+            # 在写事务中读取统计，超出量与本次删除的记录一致
+            excess = self.get_quota_excess()
+            if not excess:
+                return 0
+            scope, over = next(iter(excess.items()))
+            
+            cursor = conn.cursor()
+            if scope is None:
+                cursor.execute(f'SELECT id, file_size FROM file_records ORDER BY {order} LIMIT ?', (limit,))
+            else:
+                cursor.execute(f'SELECT id, file_size FROM file_records WHERE file_type = ? ORDER BY {order} LIMIT ?',
+                               (scope, limit))
+            # 按淘汰顺序累计大小，只删除到刚好不再超出为止
+            file_ids = []
+            for record_id, file_size in cursor.fetchall():
+                file_ids.append(record_id)
+                over -= file_size or 0
+                if over <= 0:
+                    break
+            self._delete_file_records(cursor, file_ids)
+        return len(file_ids)
+    
+    def take_pending_file_deletes(self, after="", limit=500):
+        """
+        读取路径大于after的一批待删除文件，返回 (仍需删除的路径列表, 下一批的after)
+        路径列表按路径排序；下一批的after为本批扫描到的最后一个路径，日志已扫描完时为None。
+        已经重新被文件记录引用的路径直接移出日志，不删除文件，因此路径列表为空时日志中也可能还有后续的路径
+        """
+        with self.connections.writer() as conn:
+            rows = conn.execute('''
+                SELECT p.path, EXISTS (SELECT 1 FROM file_records f WHERE f.saved_path = p.path)
+                FROM pending_file_deletes p
+                WHERE p.path > ?
+                ORDER BY p.path
+                LIMIT ?
+            ''', (after, limit)).fetchall()
+            referenced = [(path,) for path, in_use in rows if in_use]
+            if referenced:
+                conn.executemany('DELETE FROM pending_file_deletes WHERE path = ?', referenced)
+        next_after = rows[-1][0] if len(rows) == limit else None
+        return [path for path, in_use in rows if not in_use], next_after
+    
+    def finish_pending_file_deletes(self, paths):
+        """将已删除（或已不存在）的文件移出待删除日志"""
+        with self.connections.writer() as conn:
+            conn.executemany('DELETE FROM pending_file_deletes WHERE path = ?', [(path,) for path in paths])
+    
+    def count_pending_file_deletes(self):
+        """待删除文件数"""
+        with self.connections.reader() as conn:
+            return conn.execute('SELECT COUNT(*) FROM pending_file_deletes').fetchone()[0]
+    
+    def delete_expired_records(self):
+        """
+        在当前线程中删除全部过期记录及其保存的文件，返回 (文本记录数, 文件记录数)
+        记录分批在短事务中删除；界面程序使用 clipboard_sweeper.RetentionSweeper 在后台清理
+        """
+        expired_ts = self.get_expired_ts()
+        text_total = file_total = 0
+        # 如果设置为永久保存（0天）则不删除任何记录，只继续删除上次未删完的文件
+        while expired_ts is not None:
+            text_count, file_count = self.delete_expired_chunk(expired_ts)
+            text_total += text_count
+            file_total += file_count
+            if not text_count and not file_count:
+                break
         
         # 删除对应的文件
-        for row in file_paths_to_delete:
-            file_path = row[0]
-            if os.path.exists(file_path):
+        after = ""
+        while after is not None:
+            paths, after = self.take_pending_file_deletes(after)
+            removed = [path for path in paths if remove_saved_file(path)]
+            self.finish_pending_file_deletes(removed)
+        return text_total, file_total
+    
+    def get_storage_metrics(self, fragmentation=False):
+        """
+        获取数据库文件的存储指标：页大小、页数、空闲页数及比例、自动清理模式、日志模式、文件和WAL大小
+        fragmentation=True 时通过dbstat统计B树页面不连续的比例（需要读取所有页面，只在空闲时使用）
+        """
+        with self.connections.reader() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            metrics = {
+                'page_size': page_size,
+                'page_count': page_count,
+                'freelist_count': freelist_count,
+                'freelist_ratio': freelist_count / page_count if page_count else 0.0,
+                'auto_vacuum': auto_vacuum,
+                'journal_mode': journal_mode,
+                'file_bytes': os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+                'wal_bytes': os.path.getsize(self.db_path + "-wal") if os.path.exists(self.db_path + "-wal") else 0,
+                'fragmentation': None,
+            }
+            if fragmentation:
                 try:
-                    os.remove(file_path)
-                except Exception as e:
-                    print(f"删除文件时出错: {e}")
+                    rows = conn.execute("SELECT name, pageno FROM dbstat").fetchall()
+                except sqlite3.OperationalError:
+                    # SQLite未编译dbstat虚拟表
+                    rows = []
+                # dbstat按遍历顺序返回每个B树的页面，相邻两页的页号不连续即为一次跳转
+                jumps = transitions = 0
+                for (name, pageno), (next_name, next_pageno) in zip(rows, rows[1:]):
+                    if name == next_name:
+                        transitions += 1
+                        if next_pageno != pageno + 1:
+                            jumps += 1
+                if rows:
+                    metrics['fragmentation'] = jumps / transitions if transitions else 0.0
+        return metrics
+    
+    def log_maintenance(self, task, duration_ms, before, after, detail=None):
+        """记录一次维护任务，before/after 为执行前后的 get_storage_metrics() 结果"""
+        with self.connections.writer() as conn:
+            conn.execute('''
+                INSERT INTO maintenance_log (ts, task, duration_ms, page_count_before, freelist_before,
+                                             page_count_after, freelist_after, fragmentation, detail)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (int(time.time()), task, duration_ms, before['page_count'], before['freelist_count'],
+                  after['page_count'], after['freelist_count'], after['fragmentation'], detail))
+    
+    def get_maintenance_log(self, task=None, limit=50):
+        """
+        获取最近的维护记录（最新的在前）
+        返回 (timestamp, task, duration_ms, page_count_before, freelist_before, page_count_after, freelist_after, fragmentation, detail)
+        """
+        condition = "WHERE task = ?" if task else "WHERE ? IS NULL"
+        with self.connections.reader() as conn:
+            return conn.execute(f'''
+                SELECT {format_ts_sql()} AS timestamp, task, duration_ms, page_count_before, freelist_before,
+                       page_count_after, freelist_after, fragmentation, detail
+                FROM maintenance_log
+                {condition}
+                ORDER BY ts DESC, id DESC
+                LIMIT ?
+            ''', (task, limit)).fetchall()
+    
+    def close(self):
+        """关闭数据库连接"""
+        self.connections.close()
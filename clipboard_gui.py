@@ -7,12 +7,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import os
-import sqlite3
 import threading
 import shutil
 import sys
 import functools
 from clipboard_db import ClipboardDatabase
+from clipboard_sweeper import RetentionSweeper
+from clipboard_maintenance import DatabaseMaintainer
 
 # 导入系统托盘相关库
 try:
@@ -40,6 +41,10 @@ class ClipboardGUI:
     def __init__(self, root):
         self.root = root
         self.db = ClipboardDatabase()
+        # 按保留天数在后台分批清理过期记录（保留天数改变时立即清理）
+        self.sweeper = RetentionSweeper(self.db)
+        # 空闲时在后台维护数据库
+        self.maintainer = DatabaseMaintainer(self.db)
         self.tray_icon = None
         self.is_hidden = False
         self.update_job = None  # 用于定期更新的作业
@@ -76,6 +81,9 @@ class ClipboardGUI:
         # 更新悬浮图标透明度
         self.update_float_icon_opacity()
 
+        # 订阅设置变化，不再在修改设置后重新查询
+        self.db.subscribe_settings(self.on_settings_changed)
+
         # 开始定期更新
         self.start_auto_update()
 
@@ -348,6 +356,18 @@ class ClipboardGUI:
         self.sort_column = "时间"  # 默认排序列
         self.sort_reverse = True   # 默认倒序(最新的在前面)
 
+        # 初始化分页参数
+        self.page_size = 200              # 每次从时间线读取的记录数
+        self.loaded_count = 0             # 当前已加载的记录数
+        self.page_cursor = None           # 最后一条已加载记录的分页游标
+        self.has_more_records = False     # 是否还有未加载的记录
+        self.next_page_pending = False    # 是否已安排加载下一页
+        self.timeline_items = {}          # (kind, record_id) -> 列表中的行
+        self.change_seq = 0               # 已应用到列表的变更序号
+        self.data_version = None          # 上次刷新时的 data_version
+        self.search_results = []          # 已加载的搜索结果
+        self.search_has_more = False      # 是否还有未加载的搜索结果
+
         # 配置记录标签页的网格权重
         self.records_frame.columnconfigure(0, weight=1)
         self.records_frame.rowconfigure(0, weight=0)  # 搜索框行不扩展
@@ -394,7 +414,9 @@ class ClipboardGUI:
         # 添加垂直滚动条,取消横向滚动条
         records_scrollbar_y = ttk.Scrollbar(
             tree_frame, orient=tk.VERTICAL, command=self.records_tree.yview, style='Vertical.TScrollbar')
-        self.records_tree.configure(yscrollcommand=records_scrollbar_y.set)
+        self.records_scrollbar_y = records_scrollbar_y
+        # 滚动到底部时自动加载下一页
+        self.records_tree.configure(yscrollcommand=self.on_records_scroll)
 
         # 布局
         self.records_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -430,8 +452,8 @@ class ClipboardGUI:
         # 更新列标题显示排序方向
         self.update_sort_indicators()
 
-        # 重新加载记录
-        self.load_records()
+        # 按新的排序重新读取第一页
+        self.load_all_records(keep_loaded=False)
 
     def update_sort_indicators(self):
         """更新列标题的排序指示器"""
@@ -771,19 +793,12 @@ class ClipboardGUI:
                 clipboard_type=clipboard_type
             )
 
-            # 如果设置了自定义天数,检查并删除过期记录
-            if retention_days > 0:
-                self.db.delete_expired_records()
-
             # 设置开机自启
             self.set_auto_start(auto_start)
 
-            # 处理悬浮图标
+            # 处理悬浮图标（透明度和设置显示由设置变化通知更新）
             self.handle_float_icon(float_icon)
 
-            # 更新悬浮图标透明度
-            self.update_float_icon_opacity()
-
             messagebox.showinfo("提示", "设置已保存")
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字")
@@ -802,22 +817,24 @@ class ClipboardGUI:
             clipboard_type='all'  # 默认记录所有类型
         )
 
-        # 更新界面显示
-        self.unlimited_var.set(False)
-        self.size_var.set("300")
-        self.count_var.set("100")
-        self.retention_var.set("permanent")
-        self.days_entry.config(state="disabled")
-        self.autostart_var.set(False)
-        self.float_icon_var.set(False)
-        self.opacity_var.set("15")
-        self.clipboard_type_var.set("all")
-
-        # 更新悬浮图标透明度
-        self.update_float_icon_opacity()
+        # 更新界面显示（设置未变化时不会收到通知，这里直接读取缓存）
+        self.load_settings_display()
 
         messagebox.showinfo("提示", "已恢复默认设置")
 
+    def on_settings_changed(self, settings, changed):
+        """设置变化通知（可能在其他线程中调用），切换到GUI线程处理"""
+        self.root.after(0, self.apply_settings_change, changed)
+
+    def apply_settings_change(self, changed):
+        """在GUI线程中应用变化的设置"""
+        try:
+            self.load_settings_display()
+            if 'opacity' in changed:
+                self.update_float_icon_opacity()
+        except Exception as e:
+            print(f"应用设置变化时出错: {e}")
+
     def update_statistics_display(self):
         """更新统计信息显示"""
         # 获取统计信息
@@ -835,68 +852,134 @@ class ClipboardGUI:
         """加载所有记录"""
         self.load_all_records()
 
-    def load_all_records(self):
-        """加载所有记录"""
+    def load_all_records(self, keep_loaded=True):
+        """
+        加载记录
+        从时间线按当前排序读取第一页（定时刷新时读取与已加载行数相同的记录，保持滚动位置），
+        其余记录在滚动到底部时由load_next_page继续加载
+        """
         # 清空现有记录
         for item in self.records_tree.get_children():
             self.records_tree.delete(item)
+        self.timeline_items = {}
 
-        # 确定数据库排序字段
-        db_sort_field = self.get_db_sort_field(self.sort_column)
+        # 确定时间线排序字段
+        self.timeline_sort_field = self.get_timeline_sort_field(self.sort_column)
+        count = max(self.loaded_count, self.page_size) if keep_loaded else self.page_size
 
-        # 加载所有记录(包括文本和文件)
-        text_records = self.db.get_text_records(
-            sort_by=db_sort_field, reverse=self.sort_reverse)
-        file_records = self.db.get_file_records(
-            sort_by=db_sort_field, reverse=self.sort_reverse)
-
-        # 创建一个包含所有记录的列表
-        all_records = []
+        # 在读取列表之前记录变更序号，读取期间的变化会在下次刷新时再应用一次
+        self.data_version = self.db.get_data_version()
+        self.change_seq = self.db.get_change_seq()
+        records = self.db.get_timeline(
+            limit=count, sort_by=self.timeline_sort_field, reverse=self.sort_reverse)
+        self.loaded_count = 0
+        self.insert_timeline_records(records)
+        self.has_more_records = len(records) == count
 
-        # 添加文本记录
-        for record in text_records:
-            # 记录格式:(id, content, timestamp, char_count, md5_hash, number)
-            record_id, content, timestamp, char_count, md5_hash, number = record
-            content_preview = self.sanitize_text_for_display(content, 50)
-            all_records.append((content_preview, "文本", "-",
-                               timestamp, str(number), "text", record_id))
+        # 更新统计信息显示
+        self.update_statistics_display()
 
-        # 添加文件记录
-        for record in file_records:
-            # 记录格式:(id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number)
-            record_id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number = record
-            size_str = self.format_file_size(file_size)
+    def insert_timeline_records(self, records):
+        """将时间线记录追加到列表末尾"""
+        for record in records:
+            self.insert_timeline_record(record)
+
+        self.loaded_count += len(records)
+        if records:
+            self.page_cursor = self.db.get_page_cursor(
+                records[-1], "timeline", self.timeline_sort_field)
+
+    def insert_timeline_record(self, record, index=tk.END):
+        """将一条时间线记录插入列表的指定位置"""
+        # 记录格式:(kind, record_id, name, type, size, timestamp, number)
+        kind, record_id, name, record_type, size, timestamp, number = record
+        if kind == 'text':
+            content_preview = self.sanitize_text_for_display(name or "", 50)
+            item = self.records_tree.insert("", index, values=(
+                content_preview, "文本", "-", timestamp, str(number)), tags=("text", record_id))
+        else:
             # 获取文件后缀作为类型显示
-            file_extension = file_type if file_type else "未知"
-            all_records.append(
-                (filename, file_extension, size_str, timestamp, str(number), "file", record_id))
-
-        # 显示记录
-        for record in all_records:
-            if record[5] == 'text':  # 文本记录
-                self.records_tree.insert("", tk.END, values=(
-                    record[0], record[1], record[2], record[3], record[4]), tags=("text", record[6]))
-            else:  # 文件记录
-                self.records_tree.insert("", tk.END, values=(
-                    record[0], record[1], record[2], record[3], record[4]), tags=("file", record[6]))
-
-        # 更新统计信息显示
+            file_extension = record_type if record_type else "未知"
+            size_str = self.format_file_size(size or 0)
+            item = self.records_tree.insert("", index, values=(
+                name, file_extension, size_str, timestamp, str(number)), tags=("file", record_id))
+        self.timeline_items[(kind, record_id)] = item
+
+    def refresh_records(self):
+        """
+        定时刷新：只更新变化的记录，数据库没有被修改时只比较一次 data_version；
+        变化太多或无法确定位置时重新加载整个列表
+        """
+        # 正在显示搜索结果时不刷新，清空搜索框后会重新加载
+        if self.search_entry.get().strip():
+            return
+        data_version = self.db.get_data_version()
+        if data_version == self.data_version:
+            return
+        changes = self.db.changes_since(self.change_seq)
+        if changes is None or not self.apply_timeline_changes(changes):
+            self.load_all_records()
+            return
+        self.data_version = data_version
+        self.change_seq = changes['seq']
         self.update_statistics_display()
 
-    def get_db_sort_field(self, column_name):
-        """将界面列名转换为数据库字段名"""
+    def apply_timeline_changes(self, changes):
+        """删除变化了的行，再把新增和更新的记录插入排序后的位置；无法比较排序位置时返回False"""
+        changed = set(changes['inserted']) | set(changes['updated']) | set(changes['deleted'])
+        for key in changed:
+            item = self.timeline_items.pop(key, None)
+            if item is not None:
+                # 在界面上删除记录时已经移除了这一行
+                if self.records_tree.exists(item):
+                    self.records_tree.delete(item)
+                self.loaded_count -= 1
+
+        positions = self.db.get_timeline_positions(
+            changes['inserted'] + changes['updated'], self.timeline_sort_field, self.sort_reverse)
+        for position, cursor, record in positions:
+            if self.has_more_records and self.page_cursor is not None:
+                if cursor[0] is None or self.page_cursor[0] is None:
+                    return False
+                # 排在已加载范围之后的记录留给load_next_page按游标读取
+                if (cursor < self.page_cursor) if self.sort_reverse else (cursor > self.page_cursor):
+                    continue
+            self.insert_timeline_record(record, min(position, self.loaded_count))
+            self.loaded_count += 1
+        return True
+
+    def get_timeline_sort_field(self, column_name):
+        """将界面列名转换为时间线排序字段"""
         column_mapping = {
-            "名称或内容": "content",
-            "类型": "file_type",
-            "大小": "file_size",
+            "名称或内容": "name",
+            "类型": "type",
+            "大小": "size",
             "时间": "timestamp",
             "次数": "number"
         }
         return column_mapping.get(column_name, "timestamp")
 
     def load_next_page(self):
-        """加载下一页记录(已废弃)"""
-        pass
+        """从上次的位置继续加载下一页记录"""
+        self.next_page_pending = False
+        if not self.has_more_records:
+            return
+        records = self.db.get_timeline(
+            limit=self.page_size, sort_by=self.timeline_sort_field,
+            reverse=self.sort_reverse, after=self.page_cursor)
+        self.has_more_records = len(records) == self.page_size
+        self.insert_timeline_records(records)
+
+    def on_records_scroll(self, first, last):
+        """记录列表滚动时更新滚动条，滚动到底部时加载下一页（或下一页搜索结果）"""
+        self.records_scrollbar_y.set(first, last)
+        if float(last) >= 1.0 and not self.next_page_pending:
+            if self.has_more_records:
+                self.next_page_pending = True
+                self.root.after_idle(self.load_next_page)
+            elif self.search_has_more:
+                self.next_page_pending = True
+                self.root.after_idle(self.load_next_search_page)
 
     def on_mouse_wheel(self, event):
         """处理鼠标滚轮事件"""
@@ -914,17 +997,38 @@ class ClipboardGUI:
         # 默认搜索全部类型
         record_type = "all"
 
-        # 清空现有记录
+        # 清空现有记录，搜索结果与时间线一样按页加载，滚动到底部时再读取下一页
         for item in self.records_tree.get_children():
             self.records_tree.delete(item)
+        self.has_more_records = False
 
-        # 搜索记录
+        # 每次输入都会搜索，只读取第一页，避免对全部命中记录计算相关度和生成摘要
         records = self.db.search_records(
-            keyword=keyword, record_type=record_type)
+            keyword=keyword, record_type=record_type, limit=self.page_size)
+        self.search_results = records
+        self.search_has_more = len(records) == self.page_size
 
         # 对搜索结果进行排序
         self.sort_search_results(records)
 
+    def load_next_search_page(self):
+        """加载下一页搜索结果，与已加载的结果一起重新排序显示"""
+        self.next_page_pending = False
+        keyword = self.search_entry.get()
+        if not self.search_has_more or not keyword.strip():
+            return
+        records = self.db.search_records(
+            keyword=keyword, record_type="all", limit=self.page_size, offset=len(self.search_results))
+        self.search_has_more = len(records) == self.page_size
+        self.search_results.extend(records)
+
+        # 重新显示后保持滚动位置
+        first = self.records_tree.yview()[0]
+        for item in self.records_tree.get_children():
+            self.records_tree.delete(item)
+        self.sort_search_results(self.search_results)
+        self.records_tree.yview_moveto(first)
+
     def on_search_input(self, event):
         """处理搜索输入事件，实现实时搜索"""
         # 获取输入内容
@@ -935,6 +1039,8 @@ class ClipboardGUI:
             self.search_records()
         else:
             # 如果搜索框为空，则显示所有记录
+            self.search_results = []
+            self.search_has_more = False
             self.load_records()
 
     def sort_search_results(self, records):
@@ -943,36 +1049,18 @@ class ClipboardGUI:
         all_records = []
 
         for record in records:
-            if record[0] == 'text':
+            # 记录格式:(type, id, info, timestamp, snippet, size, number, file_type)
+            record_type, record_id, info, timestamp, snippet, size, number, file_type = record
+            if record_type == 'text':
                 # 文本记录
-                content_preview = self.sanitize_text_for_display(record[2], 50)
-                # 获取该记录的number值
-                conn = sqlite3.connect(self.db.db_path)
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT number FROM text_records WHERE id = ?', (record[1],))
-                result = cursor.fetchone()
-                number = str(result[0]) if result else "1"
-                conn.close()
+                content_preview = self.sanitize_text_for_display(info, 50)
                 all_records.append(
-                    (content_preview, "文本", "-", record[3], number, "text", record[1]))
+                    (content_preview, "文本", "-", timestamp, str(number or 1), "text", record_id))
             else:
-                # 文件记录(需要从数据库获取完整信息)
-                conn = sqlite3.connect(self.db.db_path)
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT file_size, number FROM file_records WHERE id = ?', (record[1],))
-                file_info = cursor.fetchone()
-                conn.close()
-
-                if file_info:
-                    file_size, number = file_info
-                    size_str = self.format_file_size(file_size)
-                    all_records.append(
-                        (record[2], "文件", size_str, record[3], str(number), "file", record[1]))
-                else:
-                    all_records.append(
-                        (record[2], "文件", "-", record[3], "1", "file", record[1]))
+                # 文件记录
+                size_str = self.format_file_size(size) if size is not None else "-"
+                all_records.append(
+                    (info, "文件", size_str, timestamp, str(number or 1), "file", record_id))
 
         # 根据当前排序列进行排序
         try:
@@ -1041,15 +1129,9 @@ class ClipboardGUI:
 
                 if record_type == "text":
                     # 从数据库获取完整文本内容
-                    conn = sqlite3.connect(self.db.db_path)
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'SELECT content FROM text_records WHERE id = ?', (record_id,))
-                    result = cursor.fetchone()
-                    conn.close()
-
-                    if result:
-                        full_text = result[0]
+                    full_text = self.db.get_text_content(record_id)
+
+                    if full_text is not None:
                         self.root.clipboard_clear()
                         self.root.clipboard_append(full_text)
                         # 显示提示信息
@@ -1102,17 +1184,10 @@ class ClipboardGUI:
                     print("开始处理文本记录...")
                     # 从数据库获取完整文本内容
                     try:
-                        conn = sqlite3.connect(self.db.db_path)
-                        cursor = conn.cursor()
-                        print(f"执行SQL查询: SELECT content FROM text_records WHERE id = {record_id}")
-                        cursor.execute(
-                            'SELECT content FROM text_records WHERE id = ?', (record_id,))
-                        result = cursor.fetchone()
-                        conn.close()
-                        print(f"数据库查询结果: {result}")
-
-                        if result:
-                            full_text = result[0]
+                        print(f"读取文本内容: ID = {record_id}")
+                        full_text = self.db.get_text_content(record_id)
+
+                        if full_text is not None:
                             print(f"原始文本内容长度: {len(full_text)} 字符")
                             self.root.clipboard_clear()
                             self.root.clipboard_append(full_text)
@@ -1187,15 +1262,9 @@ class ClipboardGUI:
 
                 if record_type == "text":
                     # 从数据库获取完整文本内容
-                    conn = sqlite3.connect(self.db.db_path)
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'SELECT id, content FROM text_records WHERE id = ?', (record_id,))
-                    result = cursor.fetchone()
-                    conn.close()
-
-                    if result:
-                        record_id, full_text = result
+                    full_text = self.db.get_text_content(record_id)
+
+                    if full_text is not None:
                         # 创建新窗口显示完整内容
                         text_window = tk.Toplevel(self.root)
                         text_window.title(f"文本记录详情 - ID: {record_id}")
@@ -1212,16 +1281,11 @@ class ClipboardGUI:
                         text_area.config(state=tk.DISABLED)
                 else:
                     # 对于文件类型,打开文件位置
-                    conn = sqlite3.connect(self.db.db_path)
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'SELECT saved_path FROM file_records WHERE id = ?', (record_id,))
-                    result = cursor.fetchone()
-                    conn.close()
-
-                    if result and os.path.exists(result[0]):
+                    record = self.db.get_file_record(record_id)
+
+                    if record and os.path.exists(record[2]):
                         import subprocess
-                        subprocess.run(['explorer', '/select,', result[0]])
+                        subprocess.run(['explorer', '/select,', record[2]])
                     else:
                         messagebox.showwarning("警告", "文件不存在")
 
@@ -1443,10 +1507,6 @@ class ClipboardGUI:
                         auto_start=auto_start
                     )
 
-                    # 如果设置了自定义天数,检查并删除过期记录
-                    if retention_days > 0:
-                        self.db.delete_expired_records()
-
                     # 设置开机自启
                     self.set_auto_start(auto_start)
 
@@ -1864,17 +1924,17 @@ class ClipboardGUI:
 
     def copy_record_from_float_panel(self, index):
         """从悬浮面板复制指定索引的记录"""
-        # 获取完整内容
+        # 获取最近的记录（文本记录只包含预览）
         text_records = self.db.get_text_records(15)
         file_records = self.db.get_file_records(15)
 
         # 合并记录并按时间排序
         all_records = []
         for record in text_records:
-            all_records.append(("text", record[1], record[2]))  # 类型, 内容, 时间
+            all_records.append(("text", record[1], record[2], record[0]))  # 类型, 预览, 时间, ID
 
         for record in file_records:
-            all_records.append(("file", record[3], record[7]))  # 类型, 文件名, 时间
+            all_records.append(("file", record[3], record[7], record[0]))  # 类型, 文件名, 时间, ID
 
         # 按时间排序(最新的在前面)
         all_records.sort(key=lambda x: x[2], reverse=True)
@@ -1883,9 +1943,12 @@ class ClipboardGUI:
         all_records = all_records[:15]
 
         if index < len(all_records):
-            record_type, full_content, timestamp = all_records[index]
+            record_type, full_content, timestamp, record_id = all_records[index]
             if record_type == "text":
                 # 复制完整文本内容
+                full_content = self.db.get_text_content(record_id)
+                if full_content is None:
+                    return
                 self.root.clipboard_clear()
                 self.root.clipboard_append(full_content)
             else:
@@ -1914,17 +1977,10 @@ class ClipboardGUI:
                 print("开始处理文本记录...")
                 # 从数据库获取完整文本内容
                 try:
-                    conn = sqlite3.connect(self.db.db_path)
-                    cursor = conn.cursor()
-                    print(f"执行SQL查询: SELECT content FROM text_records WHERE id = {record_id}")
-                    cursor.execute(
-                        'SELECT content FROM text_records WHERE id = ?', (record_id,))
-                    result = cursor.fetchone()
-                    conn.close()
-                    print(f"数据库查询结果: {result}")
-
-                    if result:
-                        full_text = result[0]
+                    print(f"读取文本内容: ID = {record_id}")
+                    full_text = self.db.get_text_content(record_id)
+
+                    if full_text is not None:
                         print(f"原始文本内容长度: {len(full_text)} 字符")
                         self.root.clipboard_clear()
                         self.root.clipboard_append(full_text)
@@ -2277,9 +2333,9 @@ class ClipboardGUI:
         # 只在没有用户操作进行时才更新
         # 当窗口有焦点时不更新,避免干扰用户操作
         if not self.user_action_in_progress and not self.has_focus:
-            # 如果窗口显示,更新所有记录
+            # 如果窗口显示,只更新变化的记录
             if not self.is_hidden:
-                self.load_records()
+                self.refresh_records()
             else:
                 # 如果窗口隐藏,只更新统计数据
                 self.update_statistics_display()
@@ -2297,11 +2353,14 @@ class ClipboardGUI:
         self.root.deiconify()  # 显示窗口
         self.root.lift()  # 将窗口置于顶层
         self.is_hidden = False
-        self.load_records()  # 显示时立即刷新
+        self.refresh_records()  # 显示时立即刷新
 
     def quit_application(self):
         """退出应用程序"""
         self.stop_auto_update()  # 停止自动更新
+        self.db.unsubscribe_settings(self.on_settings_changed)
+        self.sweeper.close()
+        self.maintainer.close()
         if self.tray_icon:
             self.tray_icon.stop()
         self.root.quit()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件哈希计算
+按文件大小选择读取缓冲区和读取方式：小文件一次读完，较大的文件用复用的缓冲区 readinto()，
+大文件用mmap映射后整体计算；也可以指定 hashlib.file_digest 或其他方式，便于基准测试比较
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+
+# 计算方式
+STRATEGY_AUTO = "auto"                # 按文件大小自动选择
+STRATEGY_READ = "read"                # 每次 read() 得到新的字节串
+STRATEGY_READINTO = "readinto"        # 读入复用的缓冲区，不产生新的字节串
+STRATEGY_MMAP = "mmap"                # 映射整个文件后计算
+STRATEGY_FILE_DIGEST = "file_digest"  # hashlib.file_digest（Python 3.11+）
+STRATEGIES = (STRATEGY_AUTO, STRATEGY_READ, STRATEGY_READINTO, STRATEGY_MMAP, STRATEGY_FILE_DIGEST)
+
+FILE_DIGEST_AVAILABLE = hasattr(hashlib, "file_digest")
+
+# 缓冲区大小的上下限：文件越大缓冲区越大，减少系统调用次数；缓冲区按线程复用
+MIN_BUFFER_SIZE = 64 * 1024
+MAX_BUFFER_SIZE = 4 * 1024 * 1024
+# 不超过该大小的文件一次读完
+SMALL_FILE_SIZE = 256 * 1024
+# 达到该大小的文件用mmap（见 clipboard_benchmark.py hashing 的测量结果）
+MMAP_MIN_SIZE = 64 * 1024 * 1024
+
+_local = threading.local()
+
+
+def choose_buffer_size(file_size):
+    """按文件大小选择缓冲区大小：约为文件的1/16，取2的幂并限制在 MIN_BUFFER_SIZE 到 MAX_BUFFER_SIZE 之间"""
+    size = MIN_BUFFER_SIZE
+    while size < MAX_BUFFER_SIZE and size * 16 < file_size:
+        size *= 2
+    return size
+
+
+def get_buffer(size):
+    """当前线程复用的缓冲区（至少size字节），返回 (bytearray, memoryview)"""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _local.buffer = buffer
+        _local.view = memoryview(buffer)
+    return buffer, _local.view
+
+
+def choose_strategy(file_size):
+    """自动选择时使用的计算方式"""
+    if file_size <= SMALL_FILE_SIZE:
+        return STRATEGY_READ
+    if file_size >= MMAP_MIN_SIZE:
+        return STRATEGY_MMAP
+    return STRATEGY_READINTO
+
+
+def update_from_file(hasher, f, buffer_size, dst=None):
+    """
+    用复用的缓冲区从文件对象f读取剩余内容并更新hasher，返回读取的字节数
+    dst 不为None时同时把读到的内容写入dst（复制文件时只读取一遍）
+    """
+    _, view = get_buffer(buffer_size)
+    view = view[:buffer_size]
+    total = 0
+    while True:
+        count = f.readinto(view)
+        if not count:
+            return total
+        chunk = view[:count]
+        hasher.update(chunk)
+        if dst is not None:
+            dst.write(chunk)
+        total += count
+
+
+def hash_file(file_path, algorithm="md5", strategy=STRATEGY_AUTO, buffer_size=None):
+    """
+    计算文件的哈希值（十六进制字符串）
+    buffer_size 为None时按文件大小选择；mmap 不可用（如空文件）时改用 readinto；出错时抛出 OSError
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未知的计算方式: {strategy}")
+    hasher = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if strategy == STRATEGY_AUTO:
+            strategy = choose_strategy(file_size)
+            if strategy == STRATEGY_READ and buffer_size is None:
+                # 小文件一次读完
+                buffer_size = file_size + 1
+        if buffer_size is None:
+            buffer_size = choose_buffer_size(file_size)
+
+        if strategy == STRATEGY_FILE_DIGEST and FILE_DIGEST_AVAILABLE:
+            return hashlib.file_digest(f, algorithm).hexdigest()
+
+        if strategy == STRATEGY_MMAP and file_size:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher.update(mapped)
+                return hasher.hexdigest()
+            except (OSError, ValueError, OverflowError):
+                # 地址空间不足等情况下改用 readinto
+                f.seek(0)
+                hasher = hashlib.new(algorithm)
+
+        if strategy == STRATEGY_READ:
+            for chunk in iter(lambda: f.read(buffer_size), b""):
+                hasher.update(chunk)
+        else:
+            update_from_file(hasher, f, buffer_size)
+    return hasher.hexdigest()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板快照处理线程池
+剪贴板事件线程只读取快照并放入队列，计算MD5、复制文件等耗时的处理由工作线程完成，
+复制大文件时不会耽误检测之后的剪贴板变化
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+
+# 提交顺序
+ORDERING_STRICT = "strict"  # 按复制的顺序提交给写入队列（处理仍并行进行）
+ORDERING_NONE = "none"      # 处理完成即提交，小的复制不必等待之前的大文件
+
+
+class IngestPool:
+    """
+    剪贴板快照处理线程池
+    submit() 把快照放入队列后立即返回；队列中尚未提交的快照达到 max_pending 时提交方等待（背压），
+    超过 timeout 秒仍没有空间时丢弃该快照并返回False
+    """
+
+    def __init__(self, manager, workers=2, max_pending=64, ordering=ORDERING_STRICT):
+        if ordering not in (ORDERING_STRICT, ORDERING_NONE):
+            raise ValueError(f"未知的提交顺序: {ordering}")
+        self.manager = manager
+        self.max_pending = max_pending
+        self.ordering = ordering
+
+        # 等待处理的快照: (序号, 快照)
+        self._jobs = deque()
+        # 处理完成、等待按顺序提交的结果: {序号: 待提交的内容}
+        self._ready = {}
+        self._next_seq = 0
+        self._next_commit = 0
+        # 已放入队列但尚未提交的快照数（包括正在处理的）
+        self._pending_count = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        # 提交给写入队列时持有，保证 previous_content 的比较和更新不会交错
+        self._commit_lock = threading.Lock()
+
+        # 统计：放入、提交、丢弃的快照数，最大队列长度，提交方因队列已满等待的次数和时间
+        self._submitted = 0
+        self._completed = 0
+        self._dropped = 0
+        self._max_depth = 0
+        self._blocked = 0
+        self._blocked_seconds = 0.0
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"ClipboardIngest-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        # 程序退出前处理完队列中剩余的快照
+        atexit.register(self.close)
+
+    def submit(self, snapshot, timeout=None):
+        """放入一个快照，队列已满时最多等待timeout秒（None为一直等待），超时丢弃并返回False"""
+        with self._condition:
+            if not self._closed and self._pending_count >= self.max_pending:
+                self._blocked += 1
+                print(f"⏳ 剪贴板处理队列已满（{self._pending_count} 个待处理），等待处理完成")
+                start = time.perf_counter()
+                has_room = self._condition.wait_for(
+                    lambda: self._closed or self._pending_count < self.max_pending, timeout)
+                self._blocked_seconds += time.perf_counter() - start
+                if not has_room:
+                    self._dropped += 1
+                    print("⚠️ 剪贴板处理队列已满，丢弃本次复制")
+                    return False
+
+            if not self._closed:
+                self._jobs.append((self._next_seq, snapshot))
+                self._next_seq += 1
+                self._pending_count += 1
+                self._submitted += 1
+                self._max_depth = max(self._max_depth, len(self._jobs))
+                self._condition.notify_all()
+                return True
+
+        # 线程池已关闭（程序正在退出），直接同步处理
+        self.manager.process_snapshot(snapshot)
+        return True
+
+    def flush(self, timeout=None):
+        """等待队列中的快照全部处理并提交，超时返回False"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending_count == 0, timeout)
+
+    def close(self, timeout=10):
+        """处理完剩余快照并停止工作线程"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def get_metrics(self):
+        """
+        队列统计：depth 等待处理的快照数，pending 尚未提交的快照数（包括正在处理的），
+        max_depth 最大等待数，submitted/completed/dropped 放入/提交/丢弃的快照数，
+        blocked/blocked_seconds 提交方因队列已满等待的次数和秒数
+        """
+        with self._condition:
+            return {
+                'depth': len(self._jobs),
+                'pending': self._pending_count,
+                'max_depth': self._max_depth,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'dropped': self._dropped,
+                'blocked': self._blocked,
+                'blocked_seconds': self._blocked_seconds,
+            }
+
+    def _run(self):
+        """工作线程主循环"""
+        while True:
+            with self._condition:
+                while not self._jobs and not self._closed:
+                    self._condition.wait()
+                if not self._jobs:
+                    return
+                seq, snapshot = self._jobs.popleft()
+
+            try:
+                items = self.manager.prepare_snapshot(snapshot)
+            except Exception as e:
+                print(f"处理剪贴板快照时出错: {e}")
+                items = []
+            self._commit(seq, items)
+
+    def _commit(self, seq, items):
+        """提交处理结果；按顺序提交时只提交序号连续的结果，之前的快照还在处理时留给处理它的线程提交"""
+        if self.ordering == ORDERING_NONE:
+            with self._commit_lock:
+                self._commit_items(items)
+            return
+
+        with self._condition:
+            self._ready[seq] = items
+        with self._commit_lock:
+            while True:
+                with self._condition:
+                    if self._next_commit not in self._ready:
+                        return
+                    items = self._ready.pop(self._next_commit)
+                    self._next_commit += 1
+                self._commit_items(items)
+
+    def _commit_items(self, items):
+        """把一个快照的处理结果交给写入队列（调用时持有 _commit_lock）"""
+        try:
+            self.manager.commit_snapshot(items)
+        except Exception as e:
+            print(f"提交剪贴板记录时出错: {e}")
+        with self._condition:
+            self._pending_count -= 1
+            self._completed += 1
+            self._condition.notify_all()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板数据库后台维护
+程序空闲（一段时间内没有保存剪贴板记录）时执行WAL检查点、清理旧的变更日志、增量清理空闲页、PRAGMA optimize 和 ANALYZE，
+每次维护有时间预算，分批执行，期间一旦有新的剪贴板记录保存就暂停，等下次空闲时继续；
+每项任务执行前后的空闲页和碎片情况记录在 maintenance_log 表中；
+旧数据库转换为增量清理需要一次无法分批的VACUUM，不在空闲维护中执行，由用户手动运行：
+    python clipboard_maintenance.py convert
+"""
+
+import argparse
+import atexit
+import threading
+import time
+
+from clipboard_db import ClipboardDatabase
+
+
+class DatabaseMaintainer:
+    """
+    后台数据库维护线程
+    每隔 check_interval 秒检查一次，距最近一次保存记录超过 idle_seconds 秒时执行一轮维护，
+    一轮维护最多占用 budget_ms 毫秒；background=False 时不启动线程，由调用方执行 run()
+    """
+
+    def __init__(self, db, idle_seconds=60, check_interval=30, budget_ms=500, vacuum_pages=256,
+                 analyze_interval=86400, change_log_size=10000, background=True):
+        self.db = db
+        self.idle_seconds = idle_seconds
+        self.check_interval = check_interval
+        self.budget = budget_ms / 1000
+        self.vacuum_pages = vacuum_pages
+        self.analyze_interval = analyze_interval
+        self.change_log_size = change_log_size
+
+        # 上一轮完整维护时对应的最近一次写入时间，之后没有新的记录时不重复维护
+        self._maintained_activity = None
+        # 当前一轮维护的截止时间、开始时的最近一次写入时间、是否不检查空闲
+        self._deadline = 0
+        self._activity = None
+        self._force = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="ClipboardMaintainer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout=10):
+        """停止维护线程（当前批次完成后退出）"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_idle(self):
+        """距最近一次保存剪贴板记录是否已超过空闲时间"""
+        return not self._closed and self.db.connections.idle_seconds() >= self.idle_seconds
+
+    def should_pause(self):
+        """预算用完，或本轮维护开始后保存过剪贴板记录时暂停"""
+        if self._closed or time.monotonic() >= self._deadline:
+            return True
+        if self._force:
+            return False
+        return self.db.connections.last_activity != self._activity or not self.is_idle()
+
+    def _run(self):
+        """维护线程主循环"""
+        while True:
+            with self._condition:
+                self._condition.wait(self.check_interval)
+                if self._closed:
+                    return
+            activity = self.db.connections.last_activity
+            if not self.is_idle() or activity == self._maintained_activity:
+                continue
+            try:
+                if self.run() is not None:
+                    self._maintained_activity = activity
+            except Exception as e:
+                print(f"维护数据库时出错: {e}")
+
+    def run(self, force=False):
+        """
+        执行一轮维护，返回执行了的任务名列表；预算用完或有新的剪贴板记录而中途暂停时返回None
+        force=True 时不检查是否空闲（时间预算仍然有效）
+        """
+        self._deadline = time.monotonic() + self.budget
+        self._activity = self.db.connections.last_activity
+        self._force = force
+        completed = []
+        for task in (self._checkpoint, self._prune_change_log, self._incremental_vacuum, self._optimize, self._analyze):
+            # 有新的剪贴板记录或预算用完时暂停，剩余的任务留到下次空闲时执行
+            if self.should_pause():
+                return None
+            name = task.__name__.lstrip('_')
+            before = self.db.get_storage_metrics()
+            start = time.perf_counter()
+            detail = task()
+            if detail is None:
+                continue
+            duration = (time.perf_counter() - start) * 1000
+            # 只有清理空闲页会改变页面布局，此时才统计碎片；统计碎片要读取整个数据库，暂停时跳过
+            fragmentation = name == 'incremental_vacuum' and not self.should_pause()
+            after = self.db.get_storage_metrics(fragmentation=fragmentation)
+            self.db.log_maintenance(name, duration, before, after, detail)
+            completed.append(name)
+        return completed
+
+    def _checkpoint(self):
+        """WAL模式下把日志写回数据库文件；日志已全部写回时截断WAL文件"""
+        if self.db.get_storage_metrics()['journal_mode'] != 'wal':
+            return None
+        with self.db.connections.writer() as conn:
+            busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            if not log_pages:
+                return None
+            if not busy and log_pages == checkpointed:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return f"wal={log_pages} checkpointed={checkpointed} busy={busy}"
+
+    def _prune_change_log(self):
+        """变更日志只保留最近的 change_log_size 条，界面落后更多时重新加载整个列表"""
+        deleted = self.db.prune_change_log(self.change_log_size)
+        return f"deleted={deleted}" if deleted else None
+
+    def convert_auto_vacuum(self):
+        """
+        把创建时没有启用增量清理的旧数据库转换为增量模式，之后空闲页可以由 run() 分批归还
+        需要执行一次VACUUM重写整个数据库，期间持有写锁、不受时间预算限制也不能暂停，
+        所以不在空闲维护中执行，只在用户手动要求时调用；已是增量模式时返回None
+        """
+        before = self.db.get_storage_metrics()
+        if before['auto_vacuum'] == 2:
+            return None
+        start = time.perf_counter()
+        with self.db.connections.writer() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        duration = (time.perf_counter() - start) * 1000
+        detail = f"bytes={before['page_count'] * before['page_size']}"
+        self.db.log_maintenance('convert_auto_vacuum', duration, before,
+                                self.db.get_storage_metrics(fragmentation=True), detail)
+        return detail
+
+    def _incremental_vacuum(self):
+        """每批归还 vacuum_pages 个空闲页，直到没有空闲页、预算用完或有新的剪贴板记录"""
+        metrics = self.db.get_storage_metrics()
+        if metrics['auto_vacuum'] != 2 or not metrics['freelist_count']:
+            return None
+        batches = 0
+        while not self.should_pause():
+            with self.db.connections.writer() as conn:
+                # executescript 会执行到语句结束；execute 只执行一步，每次只归还一页
+                conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+                remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            batches += 1
+            if not remaining:
+                break
+        return f"batches={batches}"
+
+    def _optimize(self):
+        """让SQLite按需更新查询规划器需要的统计信息（只分析统计信息过期的表）"""
+        with self.db.connections.writer() as conn:
+            conn.execute("PRAGMA optimize")
+        return ""
+
+    def _analyze(self):
+        """每隔 analyze_interval 秒执行一次有采样上限的ANALYZE"""
+        with self.db.connections.reader() as conn:
+            last_ts = conn.execute("SELECT MAX(ts) FROM maintenance_log WHERE task = 'analyze'").fetchone()[0]
+        if not self._force and last_ts is not None and time.time() - last_ts < self.analyze_interval:
+            return None
+        with self.db.connections.writer() as conn:
+            # 每个索引最多采样约1000行，大表上的耗时也有上限
+            conn.execute("PRAGMA analysis_limit = 1000")
+            conn.execute("ANALYZE")
+        return "analysis_limit=1000"
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="剪贴板数据库维护")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("convert", help="把旧数据库转换为增量清理模式（执行一次VACUUM，期间不能保存剪贴板记录）")
+    subparsers.add_parser("run", help="立即执行一轮维护")
+
+    args = parser.parse_args()
+    db = ClipboardDatabase()
+    maintainer = DatabaseMaintainer(db, background=False)
+    if args.command == "convert":
+        detail = maintainer.convert_auto_vacuum()
+        print("数据库已是增量清理模式" if detail is None else f"已转换为增量清理模式（{detail}）")
+    else:
+        completed = maintainer.run(force=True)
+        print("维护未完成，预算已用完" if completed is None else f"已执行: {', '.join(completed) or '无'}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
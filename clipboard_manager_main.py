@@ -10,28 +10,56 @@
 5. 提供GUI界面查询历史记录
 """
 
-import sqlite3
 import hashlib
 import os
+import shutil
+import tempfile
 import time
 import threading
+from collections import deque, namedtuple
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import win32clipboard
-import win32con
+from clipboard_backend import get_default_backend
+from clipboard_db import ClipboardDatabase
+from clipboard_writer import WriteBehindQueue
+from clipboard_sweeper import RetentionSweeper
+from clipboard_maintenance import DatabaseMaintainer
+from clipboard_ingest import IngestPool, ORDERING_STRICT
+from clipboard_hashing import choose_buffer_size, update_from_file
 
-def calculate_file_md5(file_path):
-    """计算文件的MD5值"""
+# 保留最近多少次读取剪贴板的占用时间
+HOLD_TIME_SAMPLES = 1000
+
+# 剪贴板内容的快照：文件路径元组、文本（没有该格式时为None）、剪贴板序列号、打开剪贴板到关闭的时间（秒）
+ClipboardSnapshot = namedtuple("ClipboardSnapshot", ["files", "text", "sequence", "hold_time"])
+
+def copy_file_with_md5(file_path, save_folder, buffer_size=None):
+    """
+    只读取一遍源文件：写入save_folder中的临时文件的同时计算MD5，返回 (临时文件路径, MD5, 文件大小)
+    临时文件与最终的保存路径在同一目录，调用方用 os.replace 原子地改名；出错时删除临时文件并抛出异常
+    buffer_size 为None时按文件大小选择，缓冲区在同一线程中复用
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".part", dir=save_folder)
     hash_md5 = hashlib.md5()
     try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    except Exception as e:
-        print(f"计算文件MD5时出错: {e}")
-        return None
+        with open(file_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            if buffer_size is None:
+                buffer_size = choose_buffer_size(os.fstat(src.fileno()).st_size)
+            file_size = update_from_file(hash_md5, src, buffer_size, dst)
+        # 与 shutil.copy2 一样保留修改时间等属性
+        shutil.copystat(file_path, temp_path)
+    except BaseException:
+        discard_file(temp_path)
+        raise
+    return temp_path, hash_md5.hexdigest(), file_size
+
+def discard_file(path):
+    """删除不再需要的临时文件"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 def get_file_type_category(filename):
     """根据文件扩展名确定文件类型分类"""
@@ -53,380 +81,6 @@ def get_file_type_category(filename):
     else:
         return 'others'
 
-class ClipboardDatabase:
-    def __init__(self, db_path=None):
-        # 如果没有指定数据库路径，则使用智能路径选择
-        if db_path is None:
-            db_path = self._get_appropriate_db_path()
-        
-        # 确保数据库路径存在
-        import os
-        db_dir = os.path.dirname(os.path.abspath(db_path))
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-        
-        self.db_path = db_path
-        self.init_database()
-    
-    def _get_appropriate_db_path(self):
-        """
-        获取适当的数据库路径
-        优先级：
-        1. 程序所在目录
-        2. 用户数据目录
-        3. 临时目录
-        """
-        import os
-        import sys
-        # 获取程序所在目录
-        if getattr(sys, 'frozen', False):
-            # 如果是打包后的exe文件
-            program_dir = os.path.dirname(sys.executable)
-        else:
-            # 如果是python脚本
-            program_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 尝试在程序目录创建数据库
-        db_path = os.path.join(program_dir, "clipboard_history.db")
-        if self._test_db_path(db_path):
-            return db_path
-        
-        # 尝试在用户数据目录创建
-        try:
-            import appdirs
-            user_data_dir = appdirs.user_data_dir("ClipboardManager", "ClipboardManager")
-            os.makedirs(user_data_dir, exist_ok=True)
-            db_path = os.path.join(user_data_dir, "clipboard_history.db")
-            if self._test_db_path(db_path):
-                return db_path
-        except ImportError:
-            pass
-        
-        # 尝试在AppData目录创建
-        appdata_dir = os.environ.get('APPDATA')
-        if appdata_dir:
-            clipboard_dir = os.path.join(appdata_dir, "ClipboardManager")
-            os.makedirs(clipboard_dir, exist_ok=True)
-            db_path = os.path.join(clipboard_dir, "clipboard_history.db")
-            if self._test_db_path(db_path):
-                return db_path
-        
-        # 尝试在临时目录创建
-        temp_dir = os.environ.get('TEMP', os.environ.get('TMP', '/tmp'))
-        clipboard_dir = os.path.join(temp_dir, "ClipboardManager")
-        os.makedirs(clipboard_dir, exist_ok=True)
-        db_path = os.path.join(clipboard_dir, "clipboard_history.db")
-        if self._test_db_path(db_path):
-            return db_path
-        
-        # 最后回退到程序目录
-        return os.path.join(program_dir, "clipboard_history.db")
-    
-    def _test_db_path(self, db_path):
-        """
-        测试数据库路径是否可用
-        """
-        try:
-            import sqlite3
-            conn = sqlite3.connect(db_path)
-            conn.close()
-            # 不要删除已存在的数据库文件
-            return True
-        except Exception as e:
-            print(f"测试数据库路径 {db_path} 失败: {e}")
-            return False
-    
-    def init_database(self):
-        """初始化数据库"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-        except sqlite3.OperationalError as e:
-            # 如果数据库文件无法创建，尝试在程序目录下创建
-            import os
-            program_dir_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clipboard_history.db")
-            print(f"无法在原路径创建数据库，尝试在程序目录创建: {program_dir_db}")
-            conn = sqlite3.connect(program_dir_db)
-            self.db_path = program_dir_db
-        cursor = conn.cursor()
-        
-        # 创建文本记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS text_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                char_count INTEGER,
-                md5_hash TEXT UNIQUE,
-                number INTEGER DEFAULT 1
-            )
-        ''')
-        
-        # 创建文件记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS file_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                original_path TEXT,
-                saved_path TEXT,
-                filename TEXT,
-                file_size INTEGER,
-                file_type TEXT,
-                md5_hash TEXT UNIQUE,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                number INTEGER DEFAULT 1
-            )
-        ''')
-        
-        # 创建设置表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                id INTEGER PRIMARY KEY CHECK (id = 1),
-                max_copy_size INTEGER DEFAULT 314572800,  -- 300MB in bytes
-                max_copy_count INTEGER DEFAULT 100,
-                unlimited_mode INTEGER DEFAULT 0  -- 0: limited, 1: unlimited
-            )
-        ''')
-        
-        # 插入默认设置（如果不存在）
-        cursor.execute('''
-            INSERT OR IGNORE INTO settings (id, max_copy_size, max_copy_count, unlimited_mode)
-            VALUES (1, 314572800, 100, 0)
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def save_text_record(self, content):
-        """保存文本记录到数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 计算文本内容的MD5值
-        md5_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-        
-        # 使用本地时间而不是UTC时间
-        local_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        try:
-            cursor.execute('''
-                INSERT INTO text_records (content, timestamp, char_count, md5_hash, number)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (content, local_time, len(content), md5_hash, 1))
-            
-            record_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return record_id
-        except sqlite3.IntegrityError:
-            # MD5已存在，更新记录并增加计数
-            cursor.execute('''
-                UPDATE text_records 
-                SET timestamp = ?, number = number + 1
-                WHERE md5_hash = ?
-            ''', (local_time, md5_hash))
-            
-            cursor.execute('SELECT id FROM text_records WHERE md5_hash = ?', (md5_hash,))
-            result = cursor.fetchone()
-            record_id = result[0] if result else None
-            conn.commit()
-            conn.close()
-            return record_id
-    
-    def save_file_record(self, original_path, saved_path, filename, file_size, file_type, md5_hash):
-        """保存文件记录到数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 使用本地时间而不是UTC时间
-        local_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        try:
-            cursor.execute('''
-                INSERT INTO file_records (original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (original_path, saved_path, filename, file_size, file_type, md5_hash, local_time, 1))
-            
-            record_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return record_id
-        except sqlite3.IntegrityError:
-            # MD5已存在，更新记录并增加计数
-            cursor.execute('''
-                UPDATE file_records 
-                SET original_path = ?, timestamp = ?, number = number + 1
-                WHERE md5_hash = ?
-            ''', (original_path, local_time, md5_hash))
-            
-            cursor.execute('SELECT id FROM file_records WHERE md5_hash = ?', (md5_hash,))
-            result = cursor.fetchone()
-            record_id = result[0] if result else None
-            conn.commit()
-            conn.close()
-            return record_id
-
-    def get_text_records(self, limit=30):
-        """获取文本记录，默认只显示30条"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, content, timestamp, char_count, md5_hash, number
-            FROM text_records
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        records = cursor.fetchall()
-        conn.close()
-        return records
-    
-    def get_file_records(self, limit=30):
-        """获取文件记录，默认只显示30条"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number
-            FROM file_records
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        records = cursor.fetchall()
-        conn.close()
-        return records
-    
-    def search_records(self, keyword="", record_type="all", start_date=None, end_date=None):
-        """搜索记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = ""
-        params = []
-        
-        if record_type == "text":
-            query = '''
-                SELECT 'text' as type, id, content as info, timestamp, char_count as size_md5
-                FROM text_records
-                WHERE content LIKE ?
-            '''
-            params.append(f"%{keyword}%")
-        elif record_type == "file":
-            query = '''
-                SELECT 'file' as type, id, filename as info, timestamp, md5_hash as size_md5
-                FROM file_records
-                WHERE filename LIKE ?
-            '''
-            params.append(f"%{keyword}%")
-        else:  # all
-            query = '''
-                SELECT 'text' as type, id, content as info, timestamp, char_count as size_md5
-                FROM text_records
-                WHERE content LIKE ?
-                UNION ALL
-                SELECT 'file' as type, id, filename as info, timestamp, md5_hash as size_md5
-                FROM file_records
-                WHERE filename LIKE ?
-            '''
-            params.extend([f"%{keyword}%", f"%{keyword}%"])
-        
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date)
-        
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date)
-        
-        query += " ORDER BY timestamp DESC LIMIT 30"
-        
-        cursor.execute(query, params)
-        records = cursor.fetchall()
-        conn.close()
-        return records
-    
-    def get_statistics(self):
-        """获取统计信息"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 获取文本记录数量
-        cursor.execute('SELECT COUNT(*) FROM text_records')
-        text_count = cursor.fetchone()[0]
-        
-        # 获取文件记录数量和总大小
-        cursor.execute('SELECT COUNT(*), SUM(file_size) FROM file_records')
-        file_result = cursor.fetchone()
-        file_count = file_result[0]
-        total_size = file_result[1] if file_result[1] else 0
-        
-        conn.close()
-        return text_count, file_count, total_size
-    
-    def delete_text_record(self, record_id):
-        """删除文本记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM text_records WHERE id = ?', (record_id,))
-        conn.commit()
-        conn.close()
-    
-    def delete_file_record(self, record_id):
-        """删除文件记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM file_records WHERE id = ?', (record_id,))
-        conn.commit()
-        conn.close()
-    
-    def clear_all_records(self):
-        """清除所有记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM text_records')
-        cursor.execute('DELETE FROM file_records')
-        conn.commit()
-        conn.close()
-    
-    def get_settings(self):
-        """获取设置"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT max_copy_size, max_copy_count, unlimited_mode FROM settings WHERE id = 1')
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return {
-                'max_copy_size': result[0],
-                'max_copy_count': result[1],
-                'unlimited_mode': bool(result[2])
-            }
-        else:
-            # 返回默认设置
-            return {
-                'max_copy_size': 314572800,  # 300MB
-                'max_copy_count': 100,
-                'unlimited_mode': False
-            }
-    
-    def update_settings(self, max_copy_size=None, max_copy_count=None, unlimited_mode=None):
-        """更新设置"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if max_copy_size is not None:
-            cursor.execute('UPDATE settings SET max_copy_size = ? WHERE id = 1', (max_copy_size,))
-        
-        if max_copy_count is not None:
-            cursor.execute('UPDATE settings SET max_copy_count = ? WHERE id = 1', (max_copy_count,))
-        
-        if unlimited_mode is not None:
-            cursor.execute('UPDATE settings SET unlimited_mode = ? WHERE id = 1', (int(unlimited_mode),))
-        
-        conn.commit()
-        conn.close()
-
 def format_file_size(size_bytes):
     """格式化文件大小"""
     if size_bytes < 1024:
@@ -439,11 +93,68 @@ def format_file_size(size_bytes):
         return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
 
 class ClipboardManager:
-    def __init__(self):
-        self.db = ClipboardDatabase()
+    def __init__(self, db=None, write_queue=None, backend=None, ingest_workers=2, ordering=ORDERING_STRICT):
+        # 允许与GUI共享同一个数据库实例（及其连接管理器）
+        self.db = db if db is not None else ClipboardDatabase()
+        # 自己创建的数据库在 close() 时关闭，传入的数据库由调用方关闭
+        self._owns_db = db is None
+        # 剪贴板后端：默认为系统剪贴板，测试和基准测试时可传入内存剪贴板
+        self.backend = backend if backend is not None else get_default_backend()
+        # 剪贴板记录交给后台写入线程提交，事件回调不等待磁盘写入
+        self.write_queue = write_queue if write_queue is not None else WriteBehindQueue(self.db)
+        # 按保留天数在后台分批清理过期记录
+        self.sweeper = RetentionSweeper(self.db)
+        # 空闲时在后台维护数据库（检查点、清理空闲页、更新统计信息）
+        self.maintainer = DatabaseMaintainer(self.db)
         self.previous_content = None
+        # 上一次读取快照时的剪贴板序列号，序列号不变时不再打开剪贴板
+        self.previous_sequence = None
+        # 最近每次读取快照时占用剪贴板的时间（秒）
+        self.hold_times = deque(maxlen=HOLD_TIME_SAMPLES)
         self.base_save_folder = "clipboard_files"
         os.makedirs(self.base_save_folder, exist_ok=True)
+        # 快照交给处理线程池，剪贴板事件线程不等待计算MD5和复制文件
+        self.ingest = IngestPool(self, workers=ingest_workers, ordering=ordering)
+    
+    def close(self):
+        """处理完剩余的快照、写完后台队列中剩余的记录，停止过期清理和数据库维护后关闭自己创建的数据库"""
+        self.ingest.close()
+        self.write_queue.close()
+        self.sweeper.close()
+        self.maintainer.close()
+        if self._owns_db:
+            self.db.close()
+    
+    def _report_saved_files(self, timestamp, file_batch, future):
+        """文件记录写入完成后输出结果（在写入线程中调用）"""
+        try:
+            record_ids = future.result()
+        except Exception as e:
+            print(f"[{timestamp}] 保存文件记录时出错: {e}")
+            return
+        
+        for record_id, file_info in zip(record_ids, file_batch):
+            file_path, saved_path, filename = file_info[:3]
+            if record_id:
+                print(f"[{timestamp}] 保存文件记录 (ID: {record_id}): {filename}")
+                if saved_path != file_path:
+                    print(f"    文件已保存到: {saved_path}")
+    
+    def _check_file_quota(self, file_batch, future):
+        """文件记录写入后检查涉及的存储配额，超出时由后台清理线程淘汰文件（在写入线程中调用）"""
+        if future.exception() is None and self.db.get_quota_excess({file_info[4] for file_info in file_batch}):
+            self.sweeper.trigger()
+    
+    def _report_saved_text(self, timestamp, char_count, future):
+        """文本记录写入完成后输出结果（在写入线程中调用）"""
+        try:
+            record_id = future.result()
+        except Exception as e:
+            print(f"[{timestamp}] 保存文本记录时出错: {e}")
+            return
+        
+        if record_id:
+            print(f"[{timestamp}] 保存文本记录 (ID: {record_id}), 字符数: {char_count}")
     
     def check_copy_limits(self, files):
         """检查复制限制"""
@@ -478,19 +189,74 @@ class ClipboardManager:
         
         return True, ""
     
+    def take_snapshot(self):
+        """
+        读取剪贴板内容的快照后立即关闭剪贴板，返回 ClipboardSnapshot；
+        剪贴板被其他程序占用，或序列号与上次相同（内容没有变化）时返回None
+        打开期间只读取格式和数据，计算MD5、复制文件等耗时操作都在关闭剪贴板之后进行
+        """
+        sequence = self.backend.sequence_number()
+        if sequence and sequence == self.previous_sequence:
+            return None
+        if not self.backend.open():
+            return None
+        
+        opened = time.perf_counter()
+        files = text = None
+        try:
+            try:
+                files = self.backend.get_files()
+            except Exception as e:
+                print(f"读取剪贴板文件列表时出错: {e}")
+            try:
+                text = self.backend.get_text()
+            except Exception as e:
+                print(f"读取剪贴板文本时出错: {e}")
+        finally:
+            self.backend.close()
+            hold_time = time.perf_counter() - opened
+            self.hold_times.append(hold_time)
+        
+        self.previous_sequence = sequence
+        return ClipboardSnapshot(files, text, sequence, hold_time)
+    
+    def get_capture_metrics(self):
+        """最近 HOLD_TIME_SAMPLES 次读取剪贴板时占用剪贴板的时间（毫秒）：次数、最近一次、平均、P99、最大"""
+        samples = sorted(self.hold_times)
+        if not samples:
+            return {'count': 0, 'last_ms': 0.0, 'avg_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': len(samples),
+            'last_ms': self.hold_times[-1] * 1000,
+            'avg_ms': sum(samples) / len(samples) * 1000,
+            'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            'max_ms': samples[-1] * 1000,
+        }
+    
     def process_clipboard_content(self):
-        """处理剪贴板内容"""
+        """读取剪贴板快照并放入处理队列（在剪贴板事件线程中调用，不等待处理完成）"""
+        snapshot = self.take_snapshot()
+        if snapshot is not None:
+            self.ingest.submit(snapshot)
+    
+    def process_snapshot(self, snapshot):
+        """同步处理剪贴板快照（此时剪贴板已关闭，其他程序可以正常使用剪贴板）"""
+        self.commit_snapshot(self.prepare_snapshot(snapshot))
+    
+    def prepare_snapshot(self, snapshot):
+        """
+        处理快照中耗时的部分（检查复制限制、计算MD5、复制文件），返回待提交的内容 [(类型, 内容标识, 数据, 时间)]
+        不修改 previous_content，可以在多个线程中同时执行
+        """
+        items = []
         try:
-            win32clipboard.OpenClipboard()
-            
             # 获取设置
             settings = self.db.get_settings()
             clipboard_type = settings.get('clipboard_type', 'all')  # 默认记录所有类型
             
-            # 检查是否有文件列表
-            has_file_list = win32clipboard.IsClipboardFormatAvailable(win32con.CF_HDROP)
-            # 检查是否有文本内容
-            has_text_content = win32clipboard.IsClipboardFormatAvailable(win32con.CF_UNICODETEXT)
+            # 是否有文件列表和文本内容
+            has_file_list = snapshot.files is not None
+            has_text_content = snapshot.text is not None
             
             # 处理文件列表
             if has_file_list:
@@ -500,31 +266,26 @@ class ClipboardManager:
                     pass
                 else:
                     try:
-                        files = win32clipboard.GetClipboardData(win32con.CF_HDROP)
+                        files = snapshot.files
                         if files:
                             # 检查复制限制
                             allowed, message = self.check_copy_limits(files)
                             if not allowed:
                                 print(f"🚫 复制限制: {message}")
-                                win32clipboard.CloseClipboard()
-                                return
+                                return items
                             
                             # 处理文件
                             current_content_key = f"files:{';'.join(sorted(files))}"
                             if current_content_key != self.previous_content:
                                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                                 
+                                # 先逐个复制文件，再在一个事务中保存整组文件记录
+                                file_batch = []
                                 for file_path in files:
                                     if os.path.exists(file_path):
                                         try:
-                                            # 计算文件MD5
-                                            md5_hash = calculate_file_md5(file_path)
-                                            if not md5_hash:
-                                                continue
-                                            
                                             # 获取文件信息
                                             filename = os.path.basename(file_path)
-                                            file_size = os.path.getsize(file_path)
                                             file_type = get_file_type_category(filename)
                                             
                                             # 构建保存路径
@@ -533,37 +294,39 @@ class ClipboardManager:
                                             save_folder = os.path.join(self.base_save_folder, type_folder, date_folder)
                                             os.makedirs(save_folder, exist_ok=True)
                                             
+                                            # 复制到临时文件的同时计算MD5（源文件只读取一遍）
+                                            temp_path, md5_hash, file_size = copy_file_with_md5(file_path, save_folder)
+                                            
                                             # 生成唯一文件名
                                             name, ext = os.path.splitext(filename)
                                             saved_filename = f"{name}_{md5_hash[:8]}{ext}"
                                             saved_path = os.path.join(save_folder, saved_filename)
                                             
-                                            # 如果文件不存在则复制
-                                            if not os.path.exists(saved_path):
-                                                import shutil
-                                                shutil.copy2(file_path, saved_path)
+                                            # 相同内容已经保存过时丢弃临时文件，否则改名为保存路径
+                                            existing_path = self.db.get_saved_file_path(md5_hash)
+                                            if existing_path and os.path.isfile(existing_path):
+                                                discard_file(temp_path)
+                                                saved_path = existing_path
+                                            elif os.path.exists(saved_path):
+                                                discard_file(temp_path)
+                                            else:
+                                                os.replace(temp_path, saved_path)
                                             
-                                            # 保存到数据库
-                                            record_id = self.db.save_file_record(
-                                                file_path, saved_path, filename, file_size, file_type, md5_hash
+                                            file_batch.append(
+                                                (file_path, saved_path, filename, file_size, file_type, md5_hash)
                                             )
-                                            
-                                            if record_id:
-                                                print(f"[{timestamp}] 保存文件记录 (ID: {record_id}): {filename}")
-                                                if saved_path != file_path:
-                                                    print(f"    文件已保存到: {saved_path}")
                                         except Exception as e:
                                             print(f"[{timestamp}] 处理文件 {file_path} 时出错: {e}")
                                 
-                                self.previous_content = current_content_key
+                                items.append(("files", current_content_key, file_batch, timestamp))
                     
                     except Exception as e:
-                        print(f"读取剪贴板文件列表时出错: {e}")
+                        print(f"处理剪贴板文件列表时出错: {e}")
             
             # 处理文本内容
             if has_text_content:
                 try:
-                    text_content = win32clipboard.GetClipboardData(win32con.CF_UNICODETEXT)
+                    text_content = snapshot.text
                     if text_content and text_content.strip():
                         # 计算文本内容的MD5值作为唯一标识
                         md5_hash = hashlib.md5(text_content.encode('utf-8')).hexdigest()
@@ -576,27 +339,37 @@ class ClipboardManager:
                             settings = self.db.get_settings()
                             if not settings['unlimited_mode'] and text_size > settings['max_copy_size']:
                                 print(f"🚫 文本大小({text_size}字节)超过了限制({settings['max_copy_size']}字节)")
-                                win32clipboard.CloseClipboard()
-                                return
-                            
-                            # 保存到数据库
-                            record_id = self.db.save_text_record(text_content)
-                            if record_id:
-                                print(f"[{timestamp}] 保存文本记录 (ID: {record_id}), 字符数: {len(text_content)}")
+                                return items
                             
-                            self.previous_content = current_content_key
+                            items.append(("text", current_content_key, text_content, timestamp))
                 
                 except Exception as e:
-                    print(f"读取剪贴板文本时出错: {e}")
+                    print(f"处理剪贴板文本时出错: {e}")
             
         except Exception as e:
-            if "OpenClipboard" not in str(e):
-                print(f"访问剪贴板时出错: {e}")
-        finally:
-            try:
-                win32clipboard.CloseClipboard()
-            except:
-                pass
+            print(f"处理剪贴板内容时出错: {e}")
+        return items
+    
+    def commit_snapshot(self, items):
+        """把 prepare_snapshot() 准备好的内容交给后台写入队列（按复制的顺序调用），与上一次提交的内容相同时跳过"""
+        for kind, content_key, payload, timestamp in items:
+            if content_key == self.previous_content:
+                continue
+            if kind == "files":
+                # 整组文件记为一次复制事件
+                future = self.write_queue.submit_files(payload)
+                future.add_done_callback(
+                    lambda f, batch=payload, ts=timestamp: self._report_saved_files(ts, batch, f)
+                )
+                future.add_done_callback(
+                    lambda f, batch=payload: self._check_file_quota(batch, f)
+                )
+            else:
+                future = self.write_queue.submit_text(payload)
+                future.add_done_callback(
+                    lambda f, count=len(payload), ts=timestamp: self._report_saved_text(ts, count, f)
+                )
+            self.previous_content = content_key
 
 class ClipboardGUIMain:
     def __init__(self, root, manager):
@@ -747,14 +520,10 @@ class ClipboardGUIMain:
                 full_text = values[1]
                 # 如果内容被截断，从数据库获取完整内容
                 record_id = values[0]
-                conn = sqlite3.connect(self.manager.db.db_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT content FROM text_records WHERE id = ?', (record_id,))
-                result = cursor.fetchone()
-                conn.close()
+                content = self.manager.db.get_text_content(record_id)
                 
-                if result:
-                    full_text = result[0]
+                if content is not None:
+                    full_text = content
                 
                 # 创建新窗口显示完整内容
                 text_window = tk.Toplevel(self.root)
@@ -775,15 +544,15 @@ class ClipboardGUIMain:
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
         
-        # 加载文本记录
-        text_records = self.manager.db.get_text_records()
+        # 加载文本记录（只显示最近30条）
+        text_records = self.manager.db.get_text_records(limit=30)
         for record in text_records:
             # 内容预览
             content_preview = record[1][:50] + "..." if len(record[1]) > 50 else record[1]
             self.text_tree.insert("", tk.END, values=(record[0], content_preview, record[2], record[3]))
         
-        # 加载文件记录
-        file_records = self.manager.db.get_file_records()
+        # 加载文件记录（只显示最近30条）
+        file_records = self.manager.db.get_file_records(limit=30)
         for record in file_records:
             # 文件大小格式化
             size_str = format_file_size(record[4])
@@ -830,7 +599,14 @@ def monitor_clipboard_loop(manager, interval=1):
             manager.process_clipboard_content()
             time.sleep(interval)
     except KeyboardInterrupt:
-        print("\n👋 剪贴板监控已停止")
+        manager.close()
+        metrics = manager.get_capture_metrics()
+        print(f"\n📊 读取剪贴板 {metrics['count']} 次，占用剪贴板平均 {metrics['avg_ms']:.2f} ms，"
+              f"P99 {metrics['p99_ms']:.2f} ms，最大 {metrics['max_ms']:.2f} ms")
+        metrics = manager.ingest.get_metrics()
+        print(f"📊 处理队列最大长度 {metrics['max_depth']}，队列已满等待 {metrics['blocked']} 次，"
+              f"丢弃 {metrics['dropped']} 次")
+        print("👋 剪贴板监控已停止")
 
 def main():
     """主函数"""
@@ -860,6 +636,7 @@ def main():
         
         # 启动GUI
         root.mainloop()
+        manager.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
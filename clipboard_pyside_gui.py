@@ -6,7 +6,6 @@
 
 import sys
 import os
-import sqlite3
 import hashlib
 import shutil
 import functools
@@ -19,13 +18,15 @@ from PySide6.QtWidgets import (
     QTabWidget, QTreeView, QAbstractItemView, QHeaderView, 
     QLineEdit, QLabel, QPushButton, QGroupBox, QRadioButton, 
     QCheckBox, QSpinBox, QScrollArea, QMessageBox, QFileDialog,
-    QSystemTrayIcon, QMenu, QTextEdit, QDialog, QFrame
+    QSystemTrayIcon, QMenu, QTextEdit, QDialog, QFrame, QComboBox
 )
 from PySide6.QtCore import Qt, QTimer, QModelIndex, Signal, QAbstractTableModel, QRect, QPoint
 from PySide6.QtGui import QIcon, QAction, QStandardItemModel, QStandardItem, QPixmap
 
 # Import our modules
 from clipboard_db import ClipboardDatabase
+from clipboard_sweeper import RetentionSweeper
+from clipboard_maintenance import DatabaseMaintainer
 from clipboard_content_detector import format_file_size
 
 # Try to import system tray icon support
@@ -51,71 +52,125 @@ def resource_path(relative_path):
 class ClipboardRecordModel(QAbstractTableModel):
     """剪贴板记录模型"""
     
+    PAGE_SIZE = 200  # 每次从时间线读取的记录数
+    
+    # 界面列与时间线排序字段的对应关系
+    SORT_KEYS = {
+        "名称或内容": "name",
+        "类型": "type",
+        "大小": "size",
+        "时间": "timestamp",
+        "次数": "number"
+    }
+    
     def __init__(self, db):
         super().__init__()
         self.db = db
         self.records = []
         self.headers = ["名称或内容", "类型", "大小", "时间"]  # 移除了"次数"
+        self.sort_by = "timestamp"
+        self.sort_reverse = True
+        self.page_cursor = None  # 最后一条已加载记录的分页游标
+        self.has_more = False
+        self.change_seq = 0  # 已应用到列表的变更序号
+        self.data_version = None  # 上次刷新时的 data_version
+        
+    def loadData(self, sort_column="时间", sort_reverse=True, keep_loaded=True):
+        """
+        加载数据
+        从时间线按排序读取第一页（刷新时读取与当前已加载行数相同的记录，保持滚动位置），
+        其余记录在滚动到底部时由fetchMore继续加载
+        """
+        self.sort_by = self.SORT_KEYS.get(sort_column, "timestamp")
+        self.sort_reverse = sort_reverse
+        count = max(len(self.records), self.PAGE_SIZE) if keep_loaded else self.PAGE_SIZE
+        # 在读取列表之前记录变更序号，读取期间的变化会在下次刷新时再应用一次
+        self.data_version = self.db.get_data_version()
+        self.change_seq = self.db.get_change_seq()
+        rows = self.db.get_timeline(limit=count, sort_by=self.sort_by, reverse=self.sort_reverse)
         
-    def loadData(self, sort_column="时间", sort_reverse=True):
-        """加载数据"""
-        # 清空现有记录
         self.beginResetModel()
-        self.records = []
+        self.records = [self.recordFromTimeline(row) for row in rows]
+        self.page_cursor = self.db.get_page_cursor(rows[-1], "timeline", self.sort_by) if rows else None
+        self.has_more = len(rows) == count
+        self.endResetModel()
+    
+    def refreshChanges(self):
+        """
+        把上次刷新之后的变化应用到已加载的记录：删除变化了的行，再把新增和更新的记录插入排序后的位置
+        数据库没有被修改时只比较一次 data_version；返回是否有变化，变化太多需要调用loadData重新加载时返回None
+        """
+        data_version = self.db.get_data_version()
+        if data_version == self.data_version:
+            return False
+        changes = self.db.changes_since(self.change_seq)
+        if changes is None:
+            return None
         
-        # 获取文本记录
-        text_records = self.db.get_text_records()
-        for record in text_records:
-            # 记录格式:(id, content, timestamp, char_count, md5_hash, number)
-            record_id, content, timestamp, char_count, md5_hash, number = record
-            content_preview = self.sanitizeText(content, 50)
-            self.records.append({
-                'name_or_content': content_preview,    # 名称或内容
+        changed = set(changes['inserted']) | set(changes['updated']) | set(changes['deleted'])
+        for row in range(len(self.records) - 1, -1, -1):
+            record = self.records[row]
+            if (record['record_type'], record['id']) in changed:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.records[row]
+                self.endRemoveRows()
+        
+        positions = self.db.get_timeline_positions(changes['inserted'] + changes['updated'],
+                                                   self.sort_by, self.sort_reverse)
+        for position, cursor, row in positions:
+            if self.has_more and self.page_cursor is not None:
+                if cursor[0] is None or self.page_cursor[0] is None:
+                    return None
+                # 排在已加载范围之后的记录留给fetchMore按游标读取
+                if (cursor < self.page_cursor) if self.sort_reverse else (cursor > self.page_cursor):
+                    continue
+            position = min(position, len(self.records))
+            self.beginInsertRows(QModelIndex(), position, position)
+            self.records.insert(position, self.recordFromTimeline(row))
+            self.endInsertRows()
+        
+        self.data_version = data_version
+        self.change_seq = changes['seq']
+        return bool(changed)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more
+    
+    def fetchMore(self, parent=QModelIndex()):
+        """滚动到底部时从上次的位置继续读取下一页"""
+        if parent.isValid() or not self.has_more:
+            return
+        rows = self.db.get_timeline(limit=self.PAGE_SIZE, sort_by=self.sort_by,
+                                    reverse=self.sort_reverse, after=self.page_cursor)
+        self.has_more = len(rows) == self.PAGE_SIZE
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.records), len(self.records) + len(rows) - 1)
+        self.records.extend(self.recordFromTimeline(row) for row in rows)
+        self.page_cursor = self.db.get_page_cursor(rows[-1], "timeline", self.sort_by)
+        self.endInsertRows()
+    
+    def recordFromTimeline(self, row):
+        """将时间线记录转换为显示用的字典"""
+        # 记录格式:(kind, record_id, name, type, size, timestamp, number)
+        kind, record_id, name, record_type, size, timestamp, number = row
+        if kind == 'text':
+            return {
+                'name_or_content': self.sanitizeText(name or "", 50),  # 名称或内容
                 'type': '文本',                        # 类型
                 'size': '-',                          # 大小
                 'timestamp': timestamp,               # 时间
                 'id': record_id,
                 'record_type': 'text'
-            })
-        
-        # 获取文件记录
-        file_records = self.db.get_file_records()
-        for record in file_records:
-            # 记录格式:(id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number)
-            record_id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number = record
-            size_str = format_file_size(file_size)
-            file_extension = file_type if file_type else "未知"
-            self.records.append({
-                'name_or_content': filename,          # 名称或内容
-                'type': file_extension,               # 类型
-                'size': size_str,                     # 大小
-                'timestamp': timestamp,               # 时间
-                'id': record_id,
-                'record_type': 'file'
-            })
-        
-        # 排序
-        sort_index = self.headers.index(sort_column) if sort_column in self.headers else 3  # 默认按时间排序
-        
-        def sort_key(record):
-            if sort_column == "大小":
-                # 特殊处理大小排序
-                size_str = record['size']
-                if size_str == "-":
-                    return 0
-                if "GB" in size_str:
-                    return float(size_str.replace("GB", "")) * 1024 * 1024 * 1024
-                elif "MB" in size_str:
-                    return float(size_str.replace("MB", "")) * 1024 * 1024
-                elif "KB" in size_str:
-                    return float(size_str.replace("KB", "")) * 1024
-                else:
-                    return float(size_str.replace("B", ""))
-            else:
-                return record[list(record.keys())[sort_index]]
-        
-        self.records.sort(key=sort_key, reverse=sort_reverse)
-        self.endResetModel()
+            }
+        return {
+            'name_or_content': name,              # 名称或内容
+            'type': record_type if record_type else "未知",  # 类型
+            'size': format_file_size(size or 0),  # 大小
+            'timestamp': timestamp,               # 时间
+            'id': record_id,
+            'record_type': 'file'
+        }
     
     def sanitizeText(self, text, max_length=100):
         """清理文本内容,移除换行符并截断过长内容"""
@@ -170,6 +225,8 @@ class RecordsTab(QWidget):
     
     recordDoubleClicked = Signal(str, int)  # record_type, record_id
     
+    SEARCH_LIMIT = 500  # 搜索结果最多显示的条数
+    
     def __init__(self, db):
         super().__init__()
         self.db = db
@@ -231,6 +288,14 @@ class RecordsTab(QWidget):
         self.model.loadData(self.sort_column, self.sort_reverse)
         self.updateStatistics()
         
+    def refreshData(self):
+        """定时刷新：只更新变化的记录，数据库没有变化时不读取记录"""
+        changed = self.model.refreshChanges()
+        if changed is None:
+            self.loadData()
+        elif changed:
+            self.updateStatistics()
+        
     def updateStatistics(self):
         """更新统计信息"""
         text_count, file_count, total_size = self.db.get_statistics()
@@ -271,18 +336,19 @@ class RecordsTab(QWidget):
             self.loadData()
             return
             
-        # 清空现有记录
+        # 清空现有记录（搜索结果一次性加载，不再分页）
         self.model.beginResetModel()
         self.model.records = []
-        
-        # 获取文本记录并筛选
-        text_records = self.db.get_text_records()
-        for record in text_records:
-            # 记录格式:(id, content, timestamp, char_count, md5_hash, number)
-            record_id, content, timestamp, char_count, md5_hash, number = record
-            # 检查搜索条件
-            if search_text.lower() in content.lower():
-                content_preview = self.model.sanitizeText(content, 50)
+        self.model.has_more = False
+        
+        # 使用数据库索引搜索（只取相关度最高的前SEARCH_LIMIT条）
+        records = self.db.search_records(search_text, limit=self.SEARCH_LIMIT)
+        for record in records:
+            # 记录格式:(type, id, info, timestamp, snippet, size, number, file_type)
+            record_type, record_id, info, timestamp, snippet, size, number, file_type = record
+            if record_type == 'text':
+                # 优先显示命中位置附近的摘要
+                content_preview = self.model.sanitizeText(snippet or info, 50)
                 self.model.records.append({
                     'name_or_content': content_preview,    # 名称或内容
                     'type': '文本',                        # 类型
@@ -291,19 +357,11 @@ class RecordsTab(QWidget):
                     'id': record_id,
                     'record_type': 'text'
                 })
-        
-        # 获取文件记录并筛选
-        file_records = self.db.get_file_records()
-        for record in file_records:
-            # 记录格式:(id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number)
-            record_id, original_path, saved_path, filename, file_size, file_type, md5_hash, timestamp, number = record
-            # 检查搜索条件
-            if (search_text.lower() in filename.lower() or 
-                search_text.lower() in original_path.lower()):
-                size_str = format_file_size(file_size)
+            else:
+                size_str = format_file_size(size or 0)
                 file_extension = file_type if file_type else "未知"
                 self.model.records.append({
-                    'name_or_content': filename,          # 名称或内容
+                    'name_or_content': info,              # 名称或内容
                     'type': file_extension,               # 类型
                     'size': size_str,                     # 大小
                     'timestamp': timestamp,               # 时间
@@ -359,7 +417,12 @@ class RecordsTab(QWidget):
                 self.sort_column = column_name
                 self.sort_reverse = True
             
-            # 直接对当前模型中的数据进行排序，而不是重新加载
+            if not self.search_edit.text().strip():
+                # 按新的排序从时间线重新读取第一页
+                self.model.loadData(self.sort_column, self.sort_reverse, keep_loaded=False)
+                return
+            
+            # 搜索结果已全部在模型中，直接排序
             self.model.beginResetModel()
             
             # 排序
@@ -397,12 +460,26 @@ class SettingsTab(QWidget):
     """设置标签页"""
     
     settingsChanged = Signal()  # 设置改变信号
+    settingsUpdated = Signal(object)  # 数据库设置变化通知（变化的设置项），排队到GUI线程处理
     
     def __init__(self, db):
         super().__init__()
         self.db = db
         self.setupUI()
         self.loadSettings()
+        # 订阅设置变化，不再在修改设置后重新查询
+        self.settingsUpdated.connect(self.onSettingsUpdated, Qt.QueuedConnection)
+        self.db.subscribe_settings(self.notifySettingsUpdated)
+        
+    def notifySettingsUpdated(self, settings, changed):
+        """设置变化通知（可能在其他线程中调用）"""
+        self.settingsUpdated.emit(changed)
+        
+    def onSettingsUpdated(self, changed):
+        """在GUI线程中应用变化的设置"""
+        self.loadSettings()
+        if changed & {'float_icon', 'opacity'}:
+            self.settingsChanged.emit()
         
     def setupUI(self):
         """设置UI界面"""
@@ -527,6 +604,21 @@ class SettingsTab(QWidget):
         opacity_note.setStyleSheet("color: #777777; font-size: 12px;")
         system_layout.addWidget(opacity_note)
         
+        # 数据库存储模式
+        profile_layout = QHBoxLayout()
+        profile_label = QLabel("💽 数据库存储模式")
+        profile_label.setStyleSheet("font-weight: bold;")
+        profile_layout.addWidget(profile_label)
+        
+        self.profile_combo = QComboBox()
+        self.profile_combo.setMinimumHeight(30)
+        for name, title in (("durable", "安全（每次保存都写入磁盘）"), ("balanced", "均衡（推荐）"),
+                            ("fast", "快速（断电可能丢失最近的记录）")):
+            self.profile_combo.addItem(title, name)
+        profile_layout.addWidget(self.profile_combo)
+        
+        system_layout.addLayout(profile_layout)
+        
         layout.addWidget(system_group)
         
         # 数据管理组
@@ -610,6 +702,9 @@ class SettingsTab(QWidget):
         else:
             self.text_only_radio.setChecked(True)
             
+        # 存储模式设置
+        self.profile_combo.setCurrentIndex(max(self.profile_combo.findData(settings['storage_profile']), 0))
+            
         # 更新控件状态
         self.onUnlimitedChanged()
         
@@ -669,15 +764,11 @@ class SettingsTab(QWidget):
                 auto_start=auto_start,
                 float_icon=float_icon,
                 opacity=opacity,
-                clipboard_type=clipboard_type
+                clipboard_type=clipboard_type,
+                storage_profile=self.profile_combo.currentData()
             )
             
-            # 如果设置了自定义天数,检查并删除过期记录
-            if retention_days > 0:
-                self.db.delete_expired_records()
-                
             QMessageBox.information(self, "提示", "设置已保存")
-            self.settingsChanged.emit()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"保存设置时出错: {str(e)}")
             
@@ -695,10 +786,9 @@ class SettingsTab(QWidget):
             clipboard_type='text_only'  # 默认仅记录文本类型
         )
         
-        # 更新界面显示
+        # 更新界面显示（悬浮图标由设置变化通知更新）
         self.loadSettings()
         QMessageBox.information(self, "提示", "已恢复默认设置")
-        self.settingsChanged.emit()
         
     def resetAllRecords(self):
         """重置所有记录"""
@@ -732,9 +822,15 @@ class SettingsTab(QWidget):
 class ClipboardManagerGUI(QMainWindow):
     """剪贴板管理器主窗口"""
     
-    def __init__(self):
+    def __init__(self, db=None):
         super().__init__()
-        self.db = ClipboardDatabase()
+        # 允许与剪贴板监控线程共享同一个数据库实例（及其连接管理器）
+        self.db = db if db is not None else ClipboardDatabase()
+        # 共享的数据库由剪贴板监控在写完后台队列后关闭，界面只关闭自己创建的数据库
+        self.owns_db = db is None
+        # 与剪贴板监控共享数据库时由监控方清理过期记录和维护数据库，单独运行界面时自己在后台执行
+        self.sweeper = RetentionSweeper(self.db) if db is None else None
+        self.maintainer = DatabaseMaintainer(self.db) if db is None else None
         self.tray_icon = None
         self.is_hidden = False
         self.update_timer = QTimer()
@@ -1277,14 +1373,9 @@ class ClipboardManagerGUI(QMainWindow):
         
         if record_type == "text":
             # 从数据库获取完整文本内容
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT content FROM text_records WHERE id = ?', (record_id,))
-            result = cursor.fetchone()
-            conn.close()
+            full_text = self.db.get_text_content(record_id)
             
-            if result:
-                full_text = result[0]
+            if full_text is not None:
                 clipboard.setText(full_text)
                 
                 # 更新图标为绿色对号
@@ -1298,14 +1389,10 @@ class ClipboardManagerGUI(QMainWindow):
                 """)
         else:
             # 对于文件类型，复制文件名
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT filename FROM file_records WHERE id = ?', (record_id,))
-            result = cursor.fetchone()
-            conn.close()
+            record = self.db.get_file_record(record_id)
             
-            if result:
-                filename = result[0]
+            if record:
+                filename = record[3]
                 clipboard.setText(filename)
                 
                 # 更新图标为绿色对号
@@ -1379,14 +1466,9 @@ class ClipboardManagerGUI(QMainWindow):
         
         if record_type == "text":
             # 从数据库获取完整文本内容
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT content FROM text_records WHERE id = ?', (record_id,))
-            result = cursor.fetchone()
-            conn.close()
+            full_text = self.db.get_text_content(record_id)
             
-            if result:
-                full_text = result[0]
+            if full_text is not None:
                 clipboard.setText(full_text)
                 
                 # 显示提示信息
@@ -1394,14 +1476,10 @@ class ClipboardManagerGUI(QMainWindow):
                 self.statusBar().showMessage(f'已复制："{display_text}"', 3000)
         else:
             # 对于文件类型，复制文件名
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT filename FROM file_records WHERE id = ?', (record_id,))
-            result = cursor.fetchone()
-            conn.close()
+            record = self.db.get_file_record(record_id)
             
-            if result:
-                filename = result[0]
+            if record:
+                filename = record[3]
                 clipboard.setText(filename)
                 
                 # 显示提示信息
@@ -1434,8 +1512,8 @@ class ClipboardManagerGUI(QMainWindow):
             QTimer.singleShot(1000, self.updateRecords)
             return
             
-        # 更新数据
-        self.records_tab.loadData()
+        # 只更新变化的记录
+        self.records_tab.refreshData()
         
     def onSettingsChanged(self):
         """设置改变事件"""
@@ -1460,7 +1538,7 @@ class ClipboardManagerGUI(QMainWindow):
         self.raise_()
         self.activateWindow()
         self.is_hidden = False
-        self.records_tab.loadData()
+        self.records_tab.refreshData()
         
     def toggleWindow(self):
         """切换窗口显示状态"""
@@ -1472,11 +1550,18 @@ class ClipboardManagerGUI(QMainWindow):
     def quitApplication(self):
         """退出应用程序"""
         self.update_timer.stop()
+        self.db.unsubscribe_settings(self.settings_tab.notifySettingsUpdated)
+        if self.sweeper:
+            self.sweeper.close()
+        if self.maintainer:
+            self.maintainer.close()
         if self.tray_icon:
             self.tray_icon.hide()
         if self.float_window:
             self.float_window.close()
         QApplication.quit()
+        if self.owns_db:
+            self.db.close()
         
     def closeEvent(self, event):
         """处理窗口关闭事件"""
@@ -1486,7 +1571,7 @@ class ClipboardManagerGUI(QMainWindow):
         event.ignore()  # 忽略关闭事件，防止程序退出
 
 
-def main():
+def main(db=None):
     """主函数"""
     app = QApplication(sys.argv)
     
@@ -1499,7 +1584,7 @@ def main():
     app.setApplicationVersion("1.0")
     
     # 创建并显示主窗口
-    window = ClipboardManagerGUI()
+    window = ClipboardManagerGUI(db)
     window.show()
     
     # 运行应用程序
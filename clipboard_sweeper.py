@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板记录后台过期清理
+按保留天数设置定期删除过期记录，并在保存的文件超出存储配额时按淘汰策略删除文件记录：
+记录分批在短事务中删除，每批持有写锁的时间有上限，
+不会阻塞剪贴板记录的写入；保存的文件由线程池在事务之外删除，程序中途退出后下次清理会继续
+"""
+
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clipboard_db import remove_saved_file
+
+
+class RetentionSweeper:
+    """
+    后台过期清理线程
+    启动后先清理一次，之后每隔 interval 秒清理一次；保留天数或配额设置改变、调用 trigger() 时立即清理
+    on_progress(progress) 在清理线程中调用，progress 的内容同 get_progress()
+    background=False 时不启动清理线程，由调用方执行 sweep()
+    """
+
+    def __init__(self, db, interval=3600, chunk_size=500, max_lock_ms=10, workers=4, on_progress=None,
+                 background=True):
+        self.db = db
+        self.interval = interval
+        self.max_chunk_size = chunk_size
+        self.max_lock = max_lock_ms / 1000
+        self.on_progress = on_progress
+
+        # 每批删除的记录数，从较小的批开始，根据上一批持有写锁的时间调整
+        self.chunk_size = min(chunk_size, 32)
+        self._progress = {
+            'running': False,
+            'text_deleted': 0,
+            'file_records_deleted': 0,
+            'file_records_evicted': 0,
+            'files_removed': 0,
+            'files_failed': 0,
+            'pending_files': 0,
+            'last_sweep': None,
+        }
+        self._triggered = True
+        self._closed = False
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ClipboardSweeperIO")
+
+        self._thread = None
+        if background:
+            self.db.subscribe_settings(self._on_settings_changed)
+            self._thread = threading.Thread(target=self._run, name="ClipboardSweeper", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def trigger(self):
+        """立即开始一次清理（不等待清理完成）"""
+        with self._condition:
+            self._triggered = True
+            self._condition.notify_all()
+
+    def get_progress(self):
+        """返回清理进度：是否正在清理、本次已删除的记录数和文件数、待删除文件数、上次清理完成的时间"""
+        with self._condition:
+            return dict(self._progress)
+
+    def close(self, timeout=10):
+        """停止清理线程（当前批次完成后退出，未删除的文件留到下次启动）"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self.db.unsubscribe_settings(self._on_settings_changed)
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    def _on_settings_changed(self, settings, changed):
+        """保留天数或配额改变后立即清理"""
+        if changed & {'retention_days', 'quota_bytes', 'eviction_policy', 'file_type_quotas'}:
+            self.trigger()
+
+    def _run(self):
+        """清理线程主循环"""
+        while True:
+            with self._condition:
+                if not self._triggered and not self._closed:
+                    self._condition.wait(self.interval)
+                if self._closed:
+                    return
+                self._triggered = False
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"清理过期记录时出错: {e}")
+                self._update_progress(running=False)
+
+    def sweep(self):
+        """执行一次完整的清理：先分批删除过期记录，再淘汰超出配额的文件记录，最后删除登记的文件"""
+        self._update_progress(running=True, text_deleted=0, file_records_deleted=0, file_records_evicted=0,
+                              files_removed=0, files_failed=0)
+        expired_ts = self.db.get_expired_ts()
+        # 永久保存（0天）时不删除记录，只继续删除上次未删完的文件
+        while expired_ts is not None and not self._closed:
+            start = time.perf_counter()
+            text_count, file_count = self.db.delete_expired_chunk(expired_ts, self.chunk_size)
+            self._adjust_chunk_size(time.perf_counter() - start)
+            if not text_count and not file_count:
+                break
+            self._update_progress(text_deleted=self._progress['text_deleted'] + text_count,
+                                  file_records_deleted=self._progress['file_records_deleted'] + file_count)
+            # 让出写锁，等待中的剪贴板记录写入可以先提交
+            time.sleep(0.001)
+
+        while not self._closed:
+            start = time.perf_counter()
+            evicted = self.db.evict_over_quota_chunk(self.chunk_size)
+            self._adjust_chunk_size(time.perf_counter() - start)
+            if not evicted:
+                break
+            self._update_progress(file_records_evicted=self._progress['file_records_evicted'] + evicted)
+            time.sleep(0.001)
+
+        self._remove_pending_files()
+        self._update_progress(running=False, pending_files=self.db.count_pending_file_deletes(),
+                              last_sweep=time.time())
+        return self.get_progress()
+
+    def _adjust_chunk_size(self, elapsed):
+        """上一批持有写锁超过上限时减半，明显低于上限时逐步增大，不超过初始的批大小"""
+        if elapsed > self.max_lock:
+            self.chunk_size = max(self.chunk_size // 2, 1)
+        elif elapsed < self.max_lock / 2:
+            self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+
+    def _remove_pending_files(self):
+        """由线程池删除登记的文件，每批删除完成后移出日志"""
+        after = ""
+        while after is not None and not self._closed:
+            paths, after = self.db.take_pending_file_deletes(after, self.max_chunk_size)
+            if not paths:
+                continue
+            results = list(self._pool.map(remove_saved_file, paths))
+            removed = [path for path, ok in zip(paths, results) if ok]
+            self.db.finish_pending_file_deletes(removed)
+            self._update_progress(files_removed=self._progress['files_removed'] + len(removed),
+                                  files_failed=self._progress['files_failed'] + len(paths) - len(removed))
+
+    def _update_progress(self, **values):
+        """更新进度并通知回调"""
+        with self._condition:
+            self._progress.update(values)
+            progress = dict(self._progress)
+        if self.on_progress is not None:
+            try:
+                self.on_progress(progress)
+            except Exception as e:
+                print(f"报告清理进度时出错: {e}")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板历史记录的导出和导入
+导出为 JSON Lines 或 CSV，可选打包为zip并附带保存的文件；导入时分批在短事务中写入，按md5_hash去重。
+两个方向都逐条流式处理，内存占用与历史记录的总大小无关
+用法：
+    python clipboard_transfer.py export 备份.zip [--format jsonl|csv] [--files]
+    python clipboard_transfer.py import 备份.zip [--files-dir 文件保存目录]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+from clipboard_db import ClipboardDatabase, TIMESTAMP_FORMAT
+
+FORMATS = ("jsonl", "csv")
+
+# CSV的列；JSON Lines 中每行只包含该类型记录用到的字段
+FIELDS = ["kind", "ts", "timestamp", "number", "md5_hash", "content",
+          "filename", "original_path", "saved_path", "file_size", "file_type", "blob"]
+
+# 压缩包中的记录文件名前缀和附带文件的目录
+HISTORY_NAME = "history"
+BLOB_DIR = "files"
+
+# 文件类型作为保存目录名，只允许单个普通目录名
+FILE_TYPE_PATTERN = re.compile(r"^[\w\-]+$")
+
+# 单条文本记录可能很长，放宽CSV字段的长度限制（Windows上C long为32位）
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+def new_stats():
+    """创建导出/导入的统计：记录数、附带的文件数、处理的字节数（文本内容和文件大小）、耗时"""
+    return {
+        'text': 0,
+        'file': 0,
+        'blobs': 0,
+        'bytes': 0,
+        'added': 0,
+        'merged': 0,
+        'skipped': 0,
+        'seconds': 0.0,
+    }
+
+
+def format_throughput(stats):
+    """将统计格式化为一行吞吐量说明"""
+    records = stats['text'] + stats['file']
+    seconds = max(stats['seconds'], 1e-9)
+    return (f"{records} 条记录（文本 {stats['text']}，文件 {stats['file']}，附带文件 {stats['blobs']}），"
+            f"{stats['bytes'] / 1024 / 1024:.1f} MB，用时 {stats['seconds']:.1f} 秒，"
+            f"{records / seconds:.0f} 条/秒，{stats['bytes'] / 1024 / 1024 / seconds:.1f} MB/秒")
+
+
+def blob_name(file_id, filename, md5_hash):
+    """附带文件在压缩包中的路径：按内容的MD5命名，相同内容只保存一份"""
+    ext = os.path.splitext(filename or "")[1]
+    return f"{BLOB_DIR}/{md5_hash or f'id-{file_id}'}{ext}"
+
+
+def export_history(db, path, fmt="jsonl", include_files=False, batch_size=500, on_progress=None):
+    """
+    导出全部记录到path，返回统计（同 new_stats()）
+    path 以.zip结尾或 include_files=True 时写入zip压缩包：记录保存在 history.jsonl/history.csv 中，
+    include_files=True 时保存的文件原样存入 files/ 目录
+    on_progress(stats) 每处理 batch_size 条记录调用一次
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"未知的导出格式: {fmt}")
+    stats = new_stats()
+    start = time.perf_counter()
+
+    def progress():
+        stats['seconds'] = time.perf_counter() - start
+        if on_progress is not None:
+            on_progress(dict(stats))
+
+    if include_files or path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f"{HISTORY_NAME}.{fmt}", "w", force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8", newline="") as out:
+                    _write_records(db, out, fmt, include_files, batch_size, stats, progress)
+            if include_files:
+                # 记录写完后再逐个写入文件（压缩包同一时间只能写一个成员），图片、压缩包等通常已压缩，原样存储
+                written = set()
+                for file_id, _, saved_path, filename, file_size, _, md5_hash, _, _ in db.iter_file_records_for_export(batch_size):
+                    name = blob_name(file_id, filename, md5_hash)
+                    if name in written or not saved_path or not os.path.isfile(saved_path):
+                        continue
+                    archive.write(saved_path, name, compress_type=zipfile.ZIP_STORED)
+                    written.add(name)
+                    stats['blobs'] += 1
+                    stats['bytes'] += os.path.getsize(saved_path)
+                    if stats['blobs'] % batch_size == 0:
+                        progress()
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            _write_records(db, out, fmt, include_files, batch_size, stats, progress)
+
+    progress()
+    return stats
+
+
+def _write_records(db, out, fmt, include_files, batch_size, stats, progress):
+    """逐条写入文本记录和文件记录"""
+    writer = csv.DictWriter(out, FIELDS) if fmt == "csv" else None
+    if writer is not None:
+        writer.writeheader()
+
+    def write(record):
+        if writer is not None:
+            writer.writerow(record)
+        else:
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write("\n")
+        if (stats['text'] + stats['file']) % batch_size == 0:
+            progress()
+
+    for _, content, md5_hash, ts, number in db.iter_text_records_for_export(batch_size):
+        if content is None:
+            continue
+        stats['text'] += 1
+        stats['bytes'] += len(content.encode("utf-8"))
+        write({
+            'kind': 'text',
+            'ts': ts,
+            'timestamp': _format_ts(ts),
+            'number': number,
+            'md5_hash': md5_hash,
+            'content': content,
+        })
+
+    for file_id, original_path, saved_path, filename, file_size, file_type, md5_hash, ts, number in \
+            db.iter_file_records_for_export(batch_size):
+        record = {
+            'kind': 'file',
+            'ts': ts,
+            'timestamp': _format_ts(ts),
+            'number': number,
+            'md5_hash': md5_hash,
+            'filename': filename,
+            'original_path': original_path,
+            'saved_path': saved_path,
+            'file_size': file_size,
+            'file_type': file_type,
+        }
+        if include_files and saved_path and os.path.isfile(saved_path):
+            record['blob'] = blob_name(file_id, filename, md5_hash)
+        stats['file'] += 1
+        write(record)
+
+
+def _format_ts(ts):
+    """导出文件中附带的本地时间，便于直接阅读（导入时只使用ts）"""
+    return datetime.fromtimestamp(ts).strftime(TIMESTAMP_FORMAT) if ts is not None else None
+
+
+def import_history(db, path, files_dir="clipboard_files", batch_size=500, on_progress=None):
+    """
+    从 export_history() 导出的文件导入记录，返回统计（同 new_stats()，added/merged 为新增和合并的记录数）
+    每 batch_size 条记录在一个事务中写入，md5_hash 已存在的记录合并（见 ClipboardDatabase.import_records）；
+    压缩包中附带的文件按与剪贴板监控相同的目录结构解压到files_dir，没有附带文件时沿用原来的保存路径（文件仍存在时）
+    """
+    stats = new_stats()
+    start = time.perf_counter()
+
+    def progress():
+        stats['seconds'] = time.perf_counter() - start
+        if on_progress is not None:
+            on_progress(dict(stats))
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if name.startswith(f"{HISTORY_NAME}.")]
+            if not names:
+                raise ValueError(f"压缩包中没有记录文件: {path}")
+            fmt = names[0].rsplit(".", 1)[1]
+            with archive.open(names[0]) as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8", newline="") as source:
+                    _load_records(db, _read_records(source, fmt), archive, files_dir, batch_size, stats, progress)
+    else:
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+        with open(path, encoding="utf-8", newline="") as source:
+            _load_records(db, _read_records(source, fmt), None, files_dir, batch_size, stats, progress)
+
+    progress()
+    return stats
+
+
+def _read_records(source, fmt):
+    """逐条读取记录（字典），空行跳过，无法解析的行生成None"""
+    if fmt == "csv":
+        for row in csv.DictReader(source):
+            yield {key: value for key, value in row.items() if value != ""}
+        return
+    for line_number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            print(f"第 {line_number} 行无法解析: {e}")
+            yield None
+
+
+def _load_records(db, records, archive, files_dir, batch_size, stats, progress):
+    """按批写入读取到的记录"""
+    texts, files = [], []
+
+    def flush():
+        if texts or files:
+            added, merged = db.import_records(texts, files)
+            stats['added'] += added
+            stats['merged'] += merged
+            texts.clear()
+            files.clear()
+        progress()
+
+    for record in records:
+        try:
+            kind = record.get('kind') if record else None
+            ts = int(record['ts']) if record and record.get('ts') is not None else int(time.time())
+            number = int(record['number']) if record and record.get('number') is not None else 1
+            if kind == 'text' and record.get('content') is not None:
+                content = record['content']
+                texts.append((content, ts, number))
+                stats['text'] += 1
+                stats['bytes'] += len(content.encode("utf-8"))
+            elif kind == 'file' and record.get('filename'):
+                file_size = int(record['file_size']) if record.get('file_size') is not None else None
+                saved_path = _restore_file(record, ts, archive, files_dir, stats)
+                files.append((record.get('original_path'), saved_path, record['filename'], file_size,
+                              record.get('file_type'), record.get('md5_hash'), ts, number))
+                stats['file'] += 1
+            else:
+                stats['skipped'] += 1
+                continue
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            print(f"导入记录时出错: {e}")
+            stats['skipped'] += 1
+            continue
+        if len(texts) + len(files) >= batch_size:
+            flush()
+    flush()
+
+
+def _restore_file(record, ts, archive, files_dir, stats):
+    """解压记录附带的文件，返回保存路径；没有附带文件时原来的保存路径仍存在则沿用，否则返回None"""
+    blob = record.get('blob')
+    if archive is None or not blob:
+        saved_path = record.get('saved_path')
+        return saved_path if saved_path and os.path.isfile(saved_path) else None
+
+    # 与剪贴板监控保存文件的目录结构相同：类型/日期/文件名_MD5前8位.扩展名；
+    # 文件名和类型来自导入的文件，只取文件名本身，类型不是普通目录名时归入others，不允许写到files_dir之外
+    filename = os.path.basename(record['filename'].replace("\\", "/"))
+    if filename in ("", ".", ".."):
+        raise ValueError(f"无效的文件名: {record['filename']!r}")
+    file_type = record.get('file_type') or "others"
+    if not FILE_TYPE_PATTERN.match(file_type):
+        file_type = "others"
+    name, ext = os.path.splitext(filename)
+    md5_hash = re.sub(r"[^0-9a-fA-F]", "", record.get('md5_hash') or "")
+    folder = os.path.join(files_dir, file_type, datetime.fromtimestamp(ts).strftime("%Y-%m-%d"))
+    saved_path = os.path.join(folder, f"{name}_{md5_hash[:8]}{ext}")
+    root = os.path.realpath(files_dir)
+    if os.path.commonpath([root, os.path.realpath(saved_path)]) != root:
+        raise ValueError(f"文件保存路径不在 {files_dir} 中: {record['filename']!r}")
+    if not os.path.exists(saved_path):
+        os.makedirs(folder, exist_ok=True)
+        # 先写入临时文件，中途退出不会留下不完整的文件
+        partial = saved_path + ".part"
+        with archive.open(blob) as src, open(partial, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial, saved_path)
+    stats['blobs'] += 1
+    stats['bytes'] += os.path.getsize(saved_path)
+    return saved_path
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="导出或导入剪贴板历史记录")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_export = subparsers.add_parser("export", help="导出历史记录")
+    parser_export.add_argument("path")
+    parser_export.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser_export.add_argument("--files", action="store_true", help="打包为zip并附带保存的文件")
+
+    parser_import = subparsers.add_parser("import", help="导入历史记录")
+    parser_import.add_argument("path")
+    parser_import.add_argument("--files-dir", default="clipboard_files")
+
+    args = parser.parse_args()
+    db = ClipboardDatabase()
+
+    def report(stats):
+        print(f"\r{format_throughput(stats)}", end="", flush=True)
+
+    if args.command == "export":
+        stats = export_history(db, args.path, args.format, args.files, on_progress=report)
+    else:
+        stats = import_history(db, args.path, args.files_dir, on_progress=report)
+        print(f"\n新增 {stats['added']} 条，合并 {stats['merged']} 条，跳过 {stats['skipped']} 条", end="")
+    print()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板记录后台写入队列
+剪贴板事件回调只把记录放入队列，由独立的写入线程批量提交（组提交），
+回调的耗时不再受磁盘同步（fsync）的影响
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# 持久化策略
+DURABILITY_EVENT = "event"        # 有记录就立即提交（提交期间到达的记录合并到下一次提交）
+DURABILITY_INTERVAL = "interval"  # 每隔 interval_ms 毫秒提交一次
+
+
+class WriteBehindQueue:
+    """
+    后台写入队列
+    submit_text()/submit_files() 立即返回 Future，写入提交后得到记录ID；
+    队列按记录条数和字节数限制内存占用，达到上限时提交方等待写入线程腾出空间
+    """
+
+    def __init__(self, db, durability=DURABILITY_EVENT, interval_ms=50,
+                 max_pending=1000, max_pending_bytes=64 * 1024 * 1024):
+        if durability not in (DURABILITY_EVENT, DURABILITY_INTERVAL):
+            raise ValueError(f"未知的持久化策略: {durability}")
+        self.db = db
+        self.durability = durability
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.max_pending_bytes = max_pending_bytes
+
+        # 待写入的记录: (类型, 内容, Future, 字节数)
+        self._items = deque()
+        # 已提交给队列但尚未写入完成的记录数和字节数（包括正在写入的批次）
+        self._pending_count = 0
+        self._pending_bytes = 0
+        self._flush_requested = False
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name="ClipboardWriter", daemon=True)
+        self._thread.start()
+        # 程序退出前写完队列中剩余的记录
+        atexit.register(self.close)
+
+    def submit_text(self, content):
+        """提交一条文本记录，返回结果为记录ID的Future"""
+        return self._submit("text", content, len(content.encode('utf-8')))
+
+    def submit_files(self, files):
+        """提交一次复制的多个文件（参数同 save_file_records_many），返回结果为记录ID列表的Future"""
+        files = list(files)
+        size = sum(len(str(value)) for file_info in files for value in file_info)
+        return self._submit("files", files, size)
+
+    def _submit(self, kind, payload, size):
+        """将记录放入队列，队列已满时等待"""
+        future = Future()
+        with self._condition:
+            # 单条记录超过字节上限时，只要队列为空也允许放入
+            while not self._closed and self._pending_count and (
+                    self._pending_count >= self.max_pending or
+                    self._pending_bytes + size > self.max_pending_bytes):
+                self._condition.wait()
+
+            if not self._closed:
+                self._items.append((kind, payload, future, size))
+                self._pending_count += 1
+                self._pending_bytes += size
+                self._condition.notify_all()
+                return future
+
+        # 队列已关闭（程序正在退出），直接同步写入
+        self._write_batch([(kind, payload, future, size)])
+        return future
+
+    def flush(self, timeout=None):
+        """立即提交队列中的记录并等待写入完成，超时返回False"""
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: self._pending_count == 0, timeout)
+
+    def close(self, timeout=10):
+        """写完剩余记录并停止写入线程"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            with self._condition:
+                while not self._items and not self._closed:
+                    self._condition.wait()
+                if not self._items:
+                    return
+
+                if self.durability == DURABILITY_INTERVAL:
+                    # 等待一个提交周期，期间到达的记录合并到同一次提交；队列满、要求刷新或关闭时提前提交
+                    deadline = time.monotonic() + self.interval
+                    while not (self._closed or self._flush_requested or self._pending_count >= self.max_pending):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+
+                batch = list(self._items)
+                self._items.clear()
+                self._flush_requested = False
+
+            self._write_batch(batch)
+
+            with self._condition:
+                self._pending_count -= len(batch)
+                self._pending_bytes -= sum(item[3] for item in batch)
+                self._condition.notify_all()
+
+    def _write_batch(self, batch):
+        """在一个事务中写入一批记录，每条记录使用独立的保存点，单条失败不影响其他记录"""
+        results = []
+        try:
+            with self.db.connections.writer() as conn:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                for kind, payload, future, size in batch:
+                    conn.execute("SAVEPOINT write_behind_item")
+                    try:
+                        if kind == "text":
+                            result = self.db.save_text_record(payload)
+                        else:
+                            result = self.db.save_file_records_many(payload)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_behind_item")
+                        results.append((future, None, e))
+                    else:
+                        results.append((future, result, None))
+                    conn.execute("RELEASE write_behind_item")
+        except Exception as e:
+            # 提交失败，整批记录都没有写入
+            print(f"后台写入剪贴板记录时出错: {e}")
+            for kind, payload, future, size in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
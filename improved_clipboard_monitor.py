@@ -174,7 +174,11 @@ def main():
     manager = ClipboardManager()
     
     # 使用事件驱动方式监控剪贴板
-    monitor_clipboard_with_events(manager)
+    try:
+        monitor_clipboard_with_events(manager)
+    finally:
+        # 写完后台队列中剩余的记录
+        manager.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -67,8 +67,12 @@ def main():
     print("🖥️  剪贴板管理器已在系统托盘运行")
     print("点击系统托盘图标显示界面，或按 Alt+C")
     
-    # 直接调用PySide6 GUI主函数
-    gui_main()
+    # 直接调用PySide6 GUI主函数，与监控线程共享同一个数据库连接管理器
+    try:
+        gui_main(manager.db)
+    finally:
+        # GUI退出时写完后台队列中剩余的剪贴板记录，之后关闭共享的数据库
+        manager.close()
     
     print("👋 应用已退出")
 